@@ -2,14 +2,21 @@ from flask import Flask, render_template, request, redirect, url_for, session, f
 from functools import wraps
 from datetime import datetime
 from config import Config
-from modules import database, auth, semantic_search
+from modules import database, auth, authz, semantic_search, inference_broker, document_listing, content_store, access_log
+from modules import structured_logging, metrics, health, profiling
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import magic
 from werkzeug.security import generate_password_hash
-from modules.upload_handler import handle_file_upload
+from modules.upload_handler import handle_file_upload, handle_archive_upload
 from flask import session, request, render_template
 from datetime import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SECONDS = metrics.histogram('search_seconds', 'Search request time per step', labelnames=('step',),
+                                   buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
 
 
 def login_required(f):
@@ -27,53 +34,33 @@ BROAD_TO_DETAILED = {
     'Legal': 'Contract',
     'Technical': 'Technical_Manual',
 }
-ROLE_TO_CATEGORIES = {
-    'admin': None,  # Admin sees all documents
-    'hr': ['Resume'],  
-    'finance': ['Invoice', 'Contract'],  
-    # Add other roles and their categories here
-}
-
 
-def init_db():
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS document_corrections (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        document_id INTEGER,
-        old_category TEXT,
-        corrected_category TEXT,
-        corrected_by INTEGER,
-        correction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    conn.commit()
-    conn.close()
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    structured_logging.configure_logging()
+    structured_logging.init_app(app)
+    profiling.init_app(app)
 
+    # Counters fall back to process memory while the storage is unreachable
     limiter = Limiter(
-        app,
-        key_func=get_remote_address,
-        storage_uri="redis://localhost:6379",
+        get_remote_address,
+        app=app,
+        storage_uri=Config.RATELIMIT_STORAGE_URI,
+        in_memory_fallback_enabled=True,
         default_limits=["200 per day", "50 per hour"]
     )
+    # A disabled limiter is not registered on the app, and the route decorators
+    # only hold a weak reference to it
+    app.limiter = limiter
+    database.init_app(app)
     database.init_db()
-    init_db()
     
-    def allowed_file_magic(stream):
-        file_start = stream.read(2048)
-        stream.seek(0)
-        mime = magic.from_buffer(file_start, mime=True)
-        allowed_mimes = {
-            'application/pdf',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',  # DOCX MIME
-            'text/plain'
-        }
-        return mime in allowed_mimes
+    @app.errorhandler(413)
+    def request_too_large(e):
+        flash('The upload exceeds the maximum allowed size.', 'danger')
+        return redirect(url_for('upload'))
 
 
     @app.route('/')
@@ -83,37 +70,68 @@ def create_app():
         else:
             return redirect(url_for('login'))
 
+    if Config.WARM_UP_ON_START:
+        health.warm_up()
+
     @app.route("/status")
-    def health():
-        return jsonify({"status": "healthy"}), 200
+    @limiter.exempt
+    def status():
+        ready, checks = health.readiness()
+        return jsonify({"status": "ready" if ready else "starting", "checks": checks}), 200 if ready else 503
+
+    @app.route("/metrics")
+    @limiter.exempt
+    def metrics_endpoint():
+        token = Config.METRICS_TOKEN
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+        return app.response_class(metrics.render_merged(Config.METRICS_DIR), mimetype='text/plain; version=0.0.4')
 
     @app.route('/upload', methods=['GET', 'POST'])
     @login_required
     @limiter.limit("10/minute")
     def upload():
         if request.method == 'POST':
-            uploaded_file = request.files.get('document')
-            if not uploaded_file or uploaded_file.filename == '':
+            uploaded_files = [f for f in request.files.getlist('document') if f and f.filename]
+            if not uploaded_files:
                 flash('No file selected', 'warning')
                 return redirect(request.url)
 
-            if not allowed_file_magic(uploaded_file.stream):
-                flash('Disallowed file type detected.', 'danger')
-                return redirect(request.url)
-
-            try:
-                doc_id = handle_file_upload(uploaded_file, app.config['UPLOAD_FOLDER'], session['user_id'])
-                flash('File uploaded and processed successfully', 'success')
+            # Each file is streamed to disk with its hash and MIME sniff computed in the same pass;
+            # ZIP archives are fanned out into the processing queue member by member
+            uploaded, queued = 0, 0
+            for uploaded_file in uploaded_files:
+                try:
+                    if uploaded_file.filename.lower().endswith('.zip'):
+                        doc_ids, skipped = handle_archive_upload(uploaded_file, app.config['UPLOAD_FOLDER'], session['user_id'])
+                        for doc_id in doc_ids:
+                            access_log.log(session['user_id'], 'upload', document_id=doc_id)
+                        queued += len(doc_ids)
+                        for member_name, reason in skipped:
+                            flash(f'{member_name}: {reason}', 'warning')
+                    else:
+                        doc_id = handle_file_upload(uploaded_file, app.config['UPLOAD_FOLDER'], session['user_id'])
+                        access_log.log(session['user_id'], 'upload', document_id=doc_id)
+                        uploaded += 1
+
+                except ValueError as ve:
+                    flash(f'{uploaded_file.filename}: {ve}' if len(uploaded_files) > 1 else str(ve), 'danger')
+
+                except Exception:
+                    logger.exception("Upload failed", extra={'upload_filename': uploaded_file.filename})
+                    flash('An unexpected error occurred during upload.', 'danger')
+
+            if uploaded:
+                flash('File uploaded and processed successfully' if uploaded == 1 else f'{uploaded} files uploaded and processed successfully', 'success')
+            if queued:
+                flash(f'{queued} documents from the archive were queued for processing', 'success')
+                if not authz.filter_for_user(session['user_id']).unrestricted:
+                    # Archive members are classified after the upload, so the category check happens then
+                    flash('Archive documents classified outside your categories will be discarded during '
+                          'processing.', 'info')
+            if uploaded or queued:
                 return redirect(url_for('dashboard'))
-
-            except ValueError as ve:
-                flash(str(ve), 'danger')
-                return redirect(request.url)
-
-            except Exception as e:
-                # Log exception details here as needed
-                flash('An unexpected error occurred during upload.', 'danger')
-                return redirect(request.url)
+            return redirect(request.url)
 
         return render_template('upload.html')
     
@@ -150,6 +168,7 @@ def create_app():
             )
             conn.commit()
             conn.close()
+            authz.invalidate_user(username=username)
 
             flash('Account created successfully! Please login.', 'success')
             return redirect(url_for('login'))
@@ -169,6 +188,7 @@ def create_app():
                 session['role'] = user['role'].lower().strip()
                 return redirect(url_for('dashboard'))
             else:
+                logger.warning("Failed login", extra={'username': username, 'ip': request.remote_addr})
                 flash('Invalid username or password', 'danger')
 
         return render_template('login.html')
@@ -182,7 +202,6 @@ def create_app():
     @login_required
     def document(document_id):
         user_role = session.get('role', '').lower()
-        allowed_categories = ROLE_TO_CATEGORIES.get(user_role)
 
         conn = database.get_db_connection()
         cursor = conn.cursor()
@@ -193,20 +212,24 @@ def create_app():
             conn.close()
             abort(404)
 
-        if user_role != 'admin':
-            # Deny access if document category not allowed for user role
-            if allowed_categories is None or doc['category'] not in allowed_categories:
-                conn.close()
-                abort(403)
+        # Deny access if document category not allowed for user role
+        if not authz.request_filter().allows(doc['category']):
+            conn.close()
+            abort(403)
 
         conn.close()
 
+        # The summary lives in its own table and is only read on this page
+        summary = content_store.get_document_summary(document_id)
+        access_log.log(session['user_id'], 'view', document_id=document_id)
+
     # Pass the user role to template for role-based UI
-        return render_template('document.html', document=doc, role=user_role)
+        return render_template('document.html', document=doc, summary=summary, role=user_role)
 
 
 
     SIMILARITY_THRESHOLD = 0.85  # Set your desired cutoff value
+    SEARCH_RESTRICTED_K = 100
 
     @app.route('/search', methods=['GET', 'POST'])
     @login_required
@@ -215,13 +238,21 @@ def create_app():
         if request.method == 'POST':
             query = request.form.get('query', '').strip()
             if query:
+                search_started = time.perf_counter()
                 try:
-                # Get embedding model and generate query embedding
-                    model = semantic_search.get_embedding_model()
-                    query_embedding = semantic_search.generate_embedding(query, model)
+                # Generate query embedding, batched with concurrent searches
+                # Encoded with the model the active index generation was built with
+                    generation = semantic_search.active_generation()
+                    with SEARCH_SECONDS.labels(step='encode').time():
+                        query_embedding = inference_broker.encode(query, generation['model_version'])
 
                 # Perform vector similarity search
-                    search_results = semantic_search.search_index(query_embedding, k=20)
+                # Restricted roles lose candidates to the category filter, so ask for more
+                    category_filter = authz.request_filter()
+                    with SEARCH_SECONDS.labels(step='index_search').time():
+                        search_results = semantic_search.search_index(
+                            query_embedding, k=20 if category_filter.unrestricted else SEARCH_RESTRICTED_K,
+                            generation=generation)
 
                     if not search_results:
                         flash("No documents found matching the query.", "warning")
@@ -229,13 +260,19 @@ def create_app():
 
                     doc_ids = [doc_id for doc_id, _ in search_results]
 
-                # Fetch documents from DB in batch
-                    conn = database.get_db_connection()
-                    cursor = conn.cursor()
-                    format_strings = ','.join('?' * len(doc_ids))
-                    cursor.execute(f"SELECT * FROM documents WHERE id IN ({format_strings})", tuple(doc_ids))
-                    docs = {row['id']: row for row in cursor.fetchall()}
-                    conn.close()
+                # Fetch listing columns of the candidates the user may see, plus their summaries for the keyword filter
+                    with SEARCH_SECONDS.labels(step='db_fetch').time():
+                        conn = database.get_db_connection()
+                        cursor = conn.cursor()
+                        format_strings = ','.join('?' * len(doc_ids))
+                        category_sql, category_params = category_filter.where()
+                        cursor.execute(f"SELECT {document_listing.LISTING_COLUMNS} FROM documents "
+                                       f"WHERE id IN ({format_strings}) AND {category_sql}",
+                                       tuple(doc_ids) + category_params)
+                        rows = cursor.fetchall()
+                        conn.close()
+                        summaries = content_store.get_document_summaries(row['id'] for row in rows)
+                        docs = {row['id']: dict(row, summary=summaries.get(row['id'])) for row in rows}
 
                 # Prepare (doc, score) list for filtering
                     doc_score_list = [(docs[doc_id], score) for doc_id, score in search_results if doc_id in docs]
@@ -244,19 +281,21 @@ def create_app():
                 # from modules.semantic_search import keyword_filter
 
                 # Apply keyword filter to improve relevance
-                    results = semantic_search.keyword_filter(doc_score_list, query)
+                    with SEARCH_SECONDS.labels(step='filter').time():
+                        results = semantic_search.keyword_filter(doc_score_list, query)
 
                 # Limit results count if needed
                     results = results[:10]
+                    access_log.log(session['user_id'], 'search', detail=query)
 
-                # Debug prints (optional)
-                    print(f"Raw search count: {len(doc_score_list)}")
-                    print(f"Filtered search count: {len(results)}")
+                    logger.debug("Search counts", extra={'raw': len(doc_score_list), 'filtered': len(results)})
 
-                except Exception as e:
-                    print(f"Search error: {e}")
+                except Exception:
+                    logger.exception("Search failed")
                     flash("An error occurred during search. Please try again.", "danger")
                     results = []
+                finally:
+                    SEARCH_SECONDS.labels(step='total').observe(time.perf_counter() - search_started)
 
         return render_template('search.html', results=results)
 
@@ -274,20 +313,11 @@ def create_app():
             flash('Invalid category selected.', 'danger')
             return redirect(url_for('document', document_id=document_id))
 
-    # Optional: Check if logged-in user role permits changing to this category
-        user_role = session.get('role', '').lower()
-        ROLE_TO_CATEGORIES = {
-            'admin': None,
-            'hr': ['Resume'],
-            'finance': ['Invoice', 'Contract'],
-         }
-
-    # Admin can update to any category, others must be restricted
-        if user_role != 'admin':
-            allowed_for_role = ROLE_TO_CATEGORIES.get(user_role, [])
-            if allowed_for_role and new_category not in allowed_for_role:
-                flash('You are not authorized to set this category.', 'danger')
-                return redirect(url_for('document', document_id=document_id))
+    # Admin can update to any category, others only to their own categories
+        category_filter = authz.request_filter()
+        if not category_filter.allows(new_category):
+            flash('You are not authorized to set this category.', 'danger')
+            return redirect(url_for('document', document_id=document_id))
 
         conn = database.get_db_connection()
         cursor = conn.cursor()
@@ -296,6 +326,9 @@ def create_app():
         cursor.execute('SELECT category FROM documents WHERE id = ?', (document_id,))
         row = cursor.fetchone()
         old_category = row['category'] if row else None
+        if row and not category_filter.allows(old_category):
+            conn.close()
+            abort(403)
 
     # Update with normalized category
         def normalize_category(cat):
@@ -320,28 +353,85 @@ def create_app():
         return redirect(url_for('document', document_id=document_id))
 
 
+    def dashboard_categories():
+        """Categories the current user may list, narrowed by ?category=; None means all."""
+        category_filter = authz.request_filter()
+        selected = request.args.get('category')
+        if selected:
+            return [selected] if category_filter.allows(selected) else []
+        return category_filter.category_list()
+
+    def dashboard_page():
+        try:
+            return document_listing.list_documents(
+                categories=dashboard_categories(),
+                cursor=request.args.get('cursor'),
+                month=request.args.get('month') or None,
+                limit=request.args.get('limit', document_listing.PAGE_SIZE, type=int),
+            )
+        except ValueError:
+            abort(400)
+
     @app.route('/dashboard')
     @login_required
     def dashboard():
         user_role = session.get('role', '').lower()
-        allowed_categories = ROLE_TO_CATEGORIES.get(user_role)
-
-        conn = database.get_db_connection()
-        cursor = conn.cursor()
+        documents, next_cursor = dashboard_page()
+        access_log.log(session['user_id'], 'list')
+        facets = document_listing.facet_counts(authz.request_filter())
 
-        if user_role == 'admin' or allowed_categories is None:
-            cursor.execute('SELECT * FROM documents ORDER BY upload_date DESC')
-        else:
-        # Normalize categories for query
-            categories_norm = [cat.strip() for cat in allowed_categories]
-            placeholders = ','.join('?' * len(categories_norm))
-            query = f'SELECT * FROM documents WHERE category IN ({placeholders}) ORDER BY upload_date DESC'
-            cursor.execute(query, tuple(categories_norm))
-
-        documents = cursor.fetchall()
-        conn.close()
+        return render_template('dashboard.html', documents=documents, next_cursor=next_cursor, facets=facets,
+                               selected_category=request.args.get('category', ''),
+                               selected_month=request.args.get('month', ''),
+                               role=user_role, username=session.get('username'))
 
-        return render_template('dashboard.html', documents=documents, role=user_role, username=session.get('username'))
+    @app.route('/api/documents')
+    @login_required
+    def api_documents():
+        # Further dashboard pages, fetched by the "Load more" button
+        documents, next_cursor = dashboard_page()
+        return jsonify({
+            'documents': [document_listing.row_to_dict(row) for row in documents],
+            'next_cursor': next_cursor,
+        })
+
+    @app.route('/api/access_logs')
+    @login_required
+    def api_access_logs():
+        if not authz.is_admin(session.get('user_id')):
+            abort(403)
+        before = None
+        if request.args.get('before_timestamp') and request.args.get('before_id'):
+            before = (request.args['before_timestamp'], request.args.get('before_id', type=int))
+        rows = access_log.query_logs(
+            user_id=request.args.get('user_id', type=int),
+            document_id=request.args.get('document_id', type=int),
+            action=request.args.get('action'),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            before=before,
+            limit=request.args.get('limit', 100, type=int),
+        )
+        return jsonify({'logs': [dict(row) for row in rows]})
+
+    @app.route('/admin/profiles')
+    @login_required
+    def admin_profiles():
+        if not authz.is_admin(session.get('user_id')):
+            abort(403)
+        kind = request.args.get('kind') or None
+        profiles = profiling.recent(limit=request.args.get('limit', 50, type=int), kind=kind)
+        return render_template('profiles.html', profiles=profiles, kind=kind)
+
+    @app.route('/admin/profiles/<profile_id>')
+    @login_required
+    def admin_profile(profile_id):
+        if not authz.is_admin(session.get('user_id')):
+            abort(403)
+        profile = profiling.load(profile_id)
+        if profile is None:
+            abort(404)
+        return render_template('profiles.html', profile=profile)
 
 
     return app
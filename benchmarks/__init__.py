@@ -0,0 +1,12 @@
+# benchmarks/__init__.py
+"""
+End-to-end benchmarks over a synthetic corpus.
+
+    python -m benchmarks.run --scales 1000,10000 --offline --report bench.json
+    python -m benchmarks.run --scales 1000 --offline --baseline bench.json
+
+corpus.py writes invoice / resume / contract / manual documents as PDF,
+DOCX and TXT from the config/category_keywords.py vocabularies;
+standins.py builds tiny randomly initialised models so a run needs no
+downloads; run.py times each stage and writes the JSON report.
+"""
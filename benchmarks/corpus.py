@@ -0,0 +1,121 @@
+# benchmarks/corpus.py
+"""
+Synthetic documents for benchmarks. Document i depends only on the seed and
+i, so the 1k corpus is the first thousand files of the 10k one and an
+existing corpus directory can be reused and extended.
+"""
+import json
+import os
+import random
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from modules.category_classifier import CATEGORY_KEYWORDS
+
+FORMATS = ('pdf', 'docx', 'txt')
+FILLER = ('the', 'of', 'and', 'for', 'with', 'this', 'is', 'on', 'by', 'to', 'as', 'per', 'our', 'your')
+FIRST_NAMES = ('Alice', 'Ravi', 'Maria', 'John', 'Priya', 'Chen', 'Fatima', 'Lukas', 'Sofia', 'David')
+LAST_NAMES = ('Sharma', 'Smith', 'Garcia', 'Okafor', 'Müller', 'Tanaka', 'Rossi', 'Khan', 'Novak', 'Brown')
+COMPANIES = ('Acme Corp', 'Globex Ltd', 'Initech', 'Umbrella Industries', 'Stark Systems', 'Wayne Logistics')
+
+MANIFEST = 'manifest.jsonl'
+
+
+def _sentence(keywords, rng):
+    words = [rng.choice(keywords) if rng.random() < 0.3 else rng.choice(FILLER)
+             for _ in range(rng.randint(8, 20))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def synthetic_text(category, words, rng):
+    """Roughly `words` words of text for a category, with the fields metadata extraction looks for."""
+    keywords = CATEGORY_KEYWORDS[category]
+    person = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    lines = [
+        f"{category.replace('_', ' ')} {rng.getrandbits(32):08x} prepared for {rng.choice(COMPANIES)}.",
+        f"Author: {person}",
+        f"Date: {rng.randint(2015, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        f"Contact {person.split()[0].lower()}@example.com about the amount of ${rng.randint(100, 99999):,}.",
+    ]
+    count = sum(len(line.split()) for line in lines)
+    while count < words:
+        paragraph = ' '.join(_sentence(keywords, rng) for _ in range(rng.randint(3, 6)))
+        lines.append(paragraph)
+        count += len(paragraph.split())
+    return '\n'.join(lines) + '\n'
+
+
+def write_txt(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def write_docx(path, text):
+    import docx
+    document = docx.Document()
+    for line in text.splitlines():
+        document.add_paragraph(line)
+    document.save(path)
+
+
+def write_pdf(path, text, lines_per_page=60):
+    import fitz
+    wrapped = [row for line in text.splitlines() for row in (textwrap.wrap(line, 95) or [''])]
+    with fitz.open() as pdf:
+        for start in range(0, len(wrapped), lines_per_page):
+            page = pdf.new_page()
+            page.insert_text((50, 60), '\n'.join(wrapped[start:start + lines_per_page]), fontsize=9)
+        pdf.save(path)
+
+
+WRITERS = {'pdf': write_pdf, 'docx': write_docx, 'txt': write_txt}
+
+
+def document_spec(i, seed=0, formats=FORMATS):
+    """(rng, category, file_type) for document i."""
+    rng = random.Random(seed * 1_000_003 + i)
+    categories = sorted(CATEGORY_KEYWORDS)
+    return rng, categories[i % len(categories)], formats[(i // len(categories)) % len(formats)]
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_document(i, directory, seed=0, words=400, formats=FORMATS):
+    """Write document i into directory; returns its manifest entry."""
+    rng, category, file_type = document_spec(i, seed, formats)
+    filename = f'doc_{i:06d}_{category.lower()}.{file_type}'
+    WRITERS[file_type](os.path.join(directory, filename), synthetic_text(category, words, rng))
+    return {'path': filename, 'file_type': file_type, 'category': category, 'seed': seed, 'words': words}
+
+
+def generate_corpus(directory, count, seed=0, words=400, formats=FORMATS, workers=None):
+    """
+    Make sure `directory` holds at least `count` documents, writing the
+    missing ones in a process pool; returns the first `count` manifest
+    entries ({'path', 'file_type', 'category', ...}) with absolute paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    entries = read_manifest(directory)
+    if entries and (entries[0].get('seed'), entries[0].get('words')) != (seed, words):
+        raise ValueError(f"{directory} holds a corpus made with other settings; use another directory")
+    if len(entries) < count:
+        write = partial(write_document, directory=directory, seed=seed, words=words, formats=formats)
+        with ProcessPoolExecutor(workers) as pool, open(os.path.join(directory, MANIFEST), 'a') as manifest:
+            # map keeps document order, so the manifest stays a prefix-stable list
+            for entry in pool.map(write, range(len(entries), count), chunksize=64):
+                manifest.write(json.dumps(entry) + '\n')
+                entries.append(entry)
+    return [dict(entry, path=os.path.join(directory, entry['path'])) for entry in entries[:count]]
+
+
+def search_queries(count, seed=0):
+    """Short keyword queries, as users type them."""
+    rng = random.Random(seed + 7)
+    categories = sorted(CATEGORY_KEYWORDS)
+    return [' '.join(rng.sample(CATEGORY_KEYWORDS[rng.choice(categories)], 2)) for _ in range(count)]
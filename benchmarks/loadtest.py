@@ -0,0 +1,309 @@
+# benchmarks/loadtest.py
+"""
+HTTP load test for the Flask routes, with nothing external running.
+
+create_app() is served by a threaded werkzeug server on a free local port,
+with its database, uploads and FAISS index in a temporary directory, rate
+limiting off (or kept in memory with --rate-limits) and uploads processed
+on the eager or thread task backend. One user per role is seeded, the
+synthetic corpus is bulk-ingested, and virtual users replay a weighted mix
+of requests at each concurrency level for --duration seconds.
+
+    python -m benchmarks.loadtest --offline --docs 2000 --concurrency 1,8,32
+    python -m benchmarks.loadtest --offline --scenario search_during_ingest --ingest-clients 4
+    python -m benchmarks.loadtest --offline --report load.json
+
+Per route it reports throughput, p50 / p95 / p99 latency and the error
+rate (5xx and connection failures); other status codes are listed as
+counts. Redirects are not followed, so an upload is timed up to its 302.
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import http.cookiejar
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict
+
+from benchmarks import corpus, standins
+from benchmarks.run import percentile
+
+ROLES = ('admin', 'hr', 'finance')
+PASSWORD = 'load-test'
+
+# Route -> relative weight of each request a virtual user picks
+SCENARIOS = {
+    'browse': {'dashboard': 5, 'api_documents': 3, 'document': 2},
+    'search': {'search': 1},
+    'mixed': {'dashboard': 4, 'api_documents': 2, 'document': 2, 'search': 4, 'upload': 1},
+    # Searches while --ingest-clients users keep uploading
+    'search_during_ingest': {'search': 1},
+}
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _multipart(field, filename, body):
+    boundary = uuid.uuid4().hex
+    payload = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+               f'Content-Type: application/octet-stream\r\n\r\n').encode() + body + f'\r\n--{boundary}--\r\n'.encode()
+    return payload, f'multipart/form-data; boundary={boundary}'
+
+
+class VirtualUser:
+    """One logged-in browser session."""
+
+    def __init__(self, base_url, role, document_count, seed):
+        self.base_url = base_url
+        self.role = role
+        self.document_count = document_count
+        self.rng = random.Random(seed)
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+        self.queries = corpus.search_queries(200, seed)
+
+    def request(self, path, data=None, content_type=None, timeout=60):
+        """(status, seconds); status is None when the connection failed."""
+        req = urllib.request.Request(self.base_url + path, data=data)
+        if content_type:
+            req.add_header('Content-Type', content_type)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        except (OSError, urllib.error.URLError):
+            status = None
+        return status, time.perf_counter() - started
+
+    def login(self):
+        status, _ = self.request('/login', urllib.parse.urlencode(
+            {'username': f'load-{self.role}', 'password': PASSWORD}).encode())
+        if status != 302:
+            raise RuntimeError(f"Login as load-{self.role} failed with status {status}")
+
+    def dashboard(self):
+        return self.request('/dashboard')
+
+    def api_documents(self):
+        return self.request('/api/documents?limit=50')
+
+    def document(self):
+        # Other roles' documents answer 403, which is counted but not an error
+        return self.request(f'/document/{self.rng.randint(1, max(1, self.document_count))}')
+
+    def search(self):
+        return self.request('/search', urllib.parse.urlencode({'query': self.rng.choice(self.queries)}).encode())
+
+    def upload(self):
+        category = self.rng.choice(sorted(corpus.CATEGORY_KEYWORDS))
+        body = corpus.synthetic_text(category, 300, self.rng).encode('utf-8')
+        payload, content_type = _multipart('document', f'load_{uuid.uuid4().hex[:12]}.txt', body)
+        return self.request('/upload', payload, content_type)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route, status, seconds):
+        with self.lock:
+            self.samples[route].append(seconds)
+            self.statuses[route][str(status)] += 1
+
+    def summary(self, wall_seconds):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            statuses = dict(self.statuses[route])
+            errors = sum(count for status, count in statuses.items() if status == 'None' or status.startswith('5'))
+            routes[route] = {
+                'requests': len(samples),
+                'rps': round(len(samples) / wall_seconds, 2),
+                'p50_ms': round(percentile(samples, 50) * 1000, 2),
+                'p95_ms': round(percentile(samples, 95) * 1000, 2),
+                'p99_ms': round(percentile(samples, 99) * 1000, 2),
+                'error_rate': round(errors / len(samples), 4),
+                'statuses': statuses,
+            }
+        return routes
+
+
+def run_level(base_url, args, concurrency, document_count):
+    """Drive the scenario with `concurrency` virtual users; returns the per-route summary."""
+    weights = SCENARIOS[args.scenario]
+    routes, cumulative = list(weights), []
+    total = 0
+    for route in routes:
+        total += weights[route]
+        cumulative.append(total)
+
+    recorder = Recorder()
+    stop = threading.Event()
+    measuring = threading.Event()
+
+    def drive(user, pick):
+        while not stop.is_set():
+            route = pick(user)
+            status, seconds = getattr(user, route)()
+            if measuring.is_set():
+                recorder.record(route, status, seconds)
+            if args.think_ms:
+                time.sleep(user.rng.expovariate(1000.0 / args.think_ms))
+
+    def weighted(user):
+        point = user.rng.uniform(0, total)
+        return next(route for route, bound in zip(routes, cumulative) if point <= bound)
+
+    users = [(VirtualUser(base_url, ROLES[i % len(ROLES)], document_count, args.seed + i), weighted)
+             for i in range(concurrency)]
+    ingest_clients = args.ingest_clients if args.scenario == 'search_during_ingest' else 0
+    users += [(VirtualUser(base_url, 'admin', document_count, args.seed + 1000 + i), lambda user: 'upload')
+              for i in range(ingest_clients)]
+    for user, _ in users:
+        user.login()
+
+    threads = [threading.Thread(target=drive, args=user, daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    measuring.clear()
+    wall = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=120)
+    return recorder.summary(wall)
+
+
+def setup(workdir, args):
+    """Point the app at workdir, seed users and the corpus; returns (app, document count)."""
+    from werkzeug.security import generate_password_hash
+    from config import Config
+    from modules import database, semantic_search, task_backend
+
+    Config.UPLOAD_FOLDER = os.path.join(workdir, 'uploads')
+    Config.LOG_FILE = os.path.join(workdir, 'app.log')
+    Config.LOG_LEVEL = 'WARNING'
+    Config.PROFILE_DIR = os.path.join(workdir, 'profiles')
+    Config.RATELIMIT_STORAGE_URI = 'memory://'
+    Config.RATELIMIT_ENABLED = args.rate_limits
+    os.makedirs(Config.UPLOAD_FOLDER)
+    database.DB_PATH = os.path.join(workdir, 'load.db')
+    semantic_search.FAISS_INDEX_PATH = os.path.join(workdir, 'faiss_index.index')
+    semantic_search.IDX_MAP_PATH = os.path.join(workdir, 'faiss_id_map.json')
+    task_backend.set_backend(args.backend, workers=args.task_workers)
+
+    database.init_db()
+    conn = database.get_db_connection()
+    user_ids = {}
+    for role in ROLES:
+        cursor = conn.execute('INSERT INTO users (username, password, role) VALUES (?, ?, ?)',
+                              (f'load-{role}', generate_password_hash(PASSWORD), role))
+        user_ids[role] = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    if args.docs:
+        from scripts.bulk_ingest import bulk_ingest, parse_args
+        corpus_dir = args.corpus_dir or os.path.join(workdir, 'corpus')
+        entries = corpus.generate_corpus(corpus_dir, args.docs, seed=args.seed)
+        # bulk_ingest walks the directory, so ingest a folder holding just the first --docs files
+        ingest_dir = os.path.join(workdir, 'ingest')
+        os.makedirs(ingest_dir)
+        for entry in entries:
+            os.symlink(entry['path'], os.path.join(ingest_dir, os.path.basename(entry['path'])))
+        bulk_ingest(parse_args([ingest_dir, '--user-id', str(user_ids['admin']), '--summary-mode', 'tfidf']))
+
+    from app import create_app
+    return create_app(), args.docs
+
+
+def serve(app):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    return server
+
+
+def print_level(concurrency, routes):
+    print(f"\n{concurrency} concurrent users")
+    print(f"  {'route':14} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}  statuses")
+    for route, result in routes.items():
+        statuses = ' '.join(f'{status}:{count}' for status, count in sorted(result['statuses'].items()))
+        print(f"  {route:14} {result['requests']:9d} {result['rps']:8.1f} {result['p50_ms']:9.1f} "
+              f"{result['p95_ms']:9.1f} {result['p99_ms']:9.1f} {result['error_rate']:7.1%}  {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Flask routes against a local, self-contained app")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--concurrency', default='1,4,16', help="Comma-separated virtual user counts to run in turn")
+    parser.add_argument('--duration', type=float, default=20, help="Measured seconds per concurrency level")
+    parser.add_argument('--warmup', type=float, default=3, help="Unmeasured seconds before each level")
+    parser.add_argument('--think-ms', type=float, default=0, help="Mean pause between a user's requests")
+    parser.add_argument('--ingest-clients', type=int, default=2, help="Uploaders running beside search_during_ingest")
+    parser.add_argument('--docs', type=int, default=1000, help="Synthetic documents ingested before the run")
+    parser.add_argument('--corpus-dir', help="Reuse a generated corpus (see benchmarks.run)")
+    parser.add_argument('--backend', choices=('eager', 'thread'), default='eager',
+                        help="Where uploads are processed: inside the request, or on background threads")
+    parser.add_argument('--task-workers', type=int, default=2)
+    parser.add_argument('--offline', action='store_true', help="Use tiny stand-in models instead of the real ones")
+    parser.add_argument('--rate-limits', action='store_true', help="Keep the app's rate limits (in-memory storage)")
+    parser.add_argument('--report', help="Write the JSON report here")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    if args.offline:
+        standins.offline_environment()
+    workdir = tempfile.mkdtemp(prefix='load-test-')
+    server = None
+    try:
+        if args.offline:
+            standins.install(workdir, seed=args.seed)
+        app, document_count = setup(workdir, args)
+        server = serve(app)
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        print(f"Serving {base_url} with {document_count} documents, scenario {args.scenario}")
+
+        report = {'scenario': args.scenario, 'backend': args.backend, 'documents': document_count,
+                  'offline': args.offline, 'duration': args.duration, 'levels': {}}
+        for concurrency in levels:
+            routes = run_level(base_url, args, concurrency, document_count)
+            report['levels'][str(concurrency)] = routes
+            print_level(concurrency, routes)
+    finally:
+        if server is not None:
+            server.shutdown()
+        from modules import structured_logging
+        structured_logging.stop_logging()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
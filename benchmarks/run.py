@@ -0,0 +1,236 @@
+# benchmarks/run.py
+"""
+Time every processing stage over the synthetic corpus at one or more scales
+and write a JSON report.
+
+    python -m benchmarks.run --scales 1000,10000,100000 --offline --report bench.json
+    python -m benchmarks.run --offline --baseline bench.json   # exit 1 on a p50/p99 regression
+
+Extraction and embedding cover every document at a scale (the index needs
+every vector); keyword and transformer classification, NER and
+summarisation run on the first --sample documents, since their per-document
+cost does not depend on corpus size. Search latency is measured against the
+index built at that scale.
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks import corpus, standins
+
+# Stages whose p50 / p99 are compared against a baseline report
+COMPARED = ('p50_ms', 'p99_ms')
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def stats(seconds, items_per_call=1):
+    """Latency summary of per-call timings; docs_per_s counts items_per_call items per call."""
+    total = sum(seconds)
+    return {
+        'calls': len(seconds),
+        'p50_ms': round(percentile(seconds, 50) * 1000, 3),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 3),
+        'mean_ms': round(total / len(seconds) * 1000, 3) if seconds else None,
+        'total_s': round(total, 3),
+        'docs_per_s': round(len(seconds) * items_per_call / total, 1) if total else None,
+    }
+
+
+def timed(fn, items):
+    """(results, per-call seconds) of fn over items."""
+    results, seconds = [], []
+    for item in items:
+        started = time.perf_counter()
+        results.append(fn(item))
+        seconds.append(time.perf_counter() - started)
+    return results, seconds
+
+
+def batches(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def run_scale(entries, args, workdir):
+    from modules import category_classifier, document_processor, semantic_search
+    from modules.text_extraction import extract_text
+
+    report = {}
+    texts, seconds = timed(lambda entry: extract_text(entry['path'], entry['file_type']), entries)
+    report['extract'] = stats(seconds)
+    for file_type in corpus.FORMATS:
+        per_type = [s for s, entry in zip(seconds, entries) if entry['file_type'] == file_type]
+        if per_type:
+            report[f'extract_{file_type}'] = stats(per_type)
+
+    sample = texts[:args.sample]
+    truth = [entry['category'] for entry in entries[:args.sample]]
+    predicted, seconds = timed(category_classifier.classify_document, sample)
+    report['classify_keywords'] = dict(stats(seconds), accuracy=round(
+        sum(p == t for p, t in zip(predicted, truth)) / len(truth), 3))
+
+    if document_processor.model_cls is None:
+        report['classify_transformer'] = {'skipped': 'classifier not loaded'}
+    else:
+        _, seconds = timed(document_processor.classify_documents, batches(sample, args.batch_size))
+        report['classify_transformer'] = stats(seconds, args.batch_size)
+
+    if document_processor.ner_pipeline is None:
+        report['ner'] = {'skipped': 'NER pipeline not loaded'}
+    else:
+        _, seconds = timed(lambda text: document_processor.extract_entities_batch([text]), sample)
+        report['ner'] = stats(seconds)
+
+    for mode in args.summary_modes:
+        _, seconds = timed(lambda text: document_processor.summarize(text, mode=mode), sample)
+        report[f'summarize_{mode}'] = stats(seconds)
+
+    model = semantic_search.get_embedding_model()
+    matrices, seconds = timed(lambda batch: semantic_search.generate_embeddings(batch, model, args.batch_size),
+                              batches(texts, args.batch_size))
+    report['embed'] = stats(seconds, args.batch_size)
+
+    semantic_search.FAISS_INDEX_PATH = os.path.join(workdir, 'faiss_index.index')
+    semantic_search.IDX_MAP_PATH = os.path.join(workdir, 'faiss_id_map.json')
+    document_ids = list(range(1, len(texts) + 1))
+    started = time.perf_counter()
+    semantic_search.build_index(document_ids, np.vstack(matrices))
+    report['index_build'] = stats([time.perf_counter() - started], len(texts))
+
+    # What /search does per query, with documents as the DB would return them
+    documents = {doc_id: {'id': doc_id, 'title': text.split('\n', 1)[0], 'summary': text[:500]}
+                 for doc_id, text in zip(document_ids, texts)}
+    steps = {'encode': [], 'index_search': [], 'filter': [], 'total': []}
+    semantic_search.load_index()
+    for query in corpus.search_queries(args.queries, args.seed):
+        started = time.perf_counter()
+        embedding = semantic_search.generate_embedding(query, model)
+        encoded = time.perf_counter()
+        hits = semantic_search.search_index(embedding, k=5)
+        searched = time.perf_counter()
+        semantic_search.keyword_filter([(documents[doc_id], dist) for doc_id, dist in hits], query)
+        done = time.perf_counter()
+        steps['encode'].append(encoded - started)
+        steps['index_search'].append(searched - encoded)
+        steps['filter'].append(done - searched)
+        steps['total'].append(done - started)
+    for step, values in steps.items():
+        report[f'search_{step}'] = stats(values)
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Lines describing stages that got slower than baseline by more than tolerance (a fraction)."""
+    regressions = []
+    for scale, stages in report['scales'].items():
+        for stage, result in stages.items():
+            before = baseline.get('scales', {}).get(scale, {}).get(stage, {})
+            for key in COMPARED:
+                old, new = before.get(key), result.get(key)
+                if old and new and new > old * (1 + tolerance):
+                    regressions.append(f"{scale} {stage} {key}: {old:.3f} -> {new:.3f} ms (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_report(report):
+    for scale, stages in report['scales'].items():
+        print(f"\n{scale} documents")
+        for stage, result in stages.items():
+            if 'skipped' in result:
+                print(f"  {stage:24} skipped: {result['skipped']}")
+                continue
+            extra = f"   accuracy {result['accuracy']:.3f}" if 'accuracy' in result else ''
+            print(f"  {stage:24} p50 {result['p50_ms']:10.2f} ms   p99 {result['p99_ms']:10.2f} ms   "
+                  f"{result['docs_per_s'] or 0:10.1f} docs/s{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the document pipeline on a synthetic corpus")
+    parser.add_argument('--scales', default='1000', help="Comma-separated corpus sizes, e.g. 1000,10000,100000")
+    parser.add_argument('--offline', action='store_true', help="Use tiny stand-in models instead of the real ones")
+    parser.add_argument('--corpus-dir', help="Keep and reuse the generated corpus here (default: a temp dir)")
+    parser.add_argument('--sample', type=int, default=200, help="Documents per scale for the per-document model stages")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--words', type=int, default=400, help="Words per synthetic document")
+    parser.add_argument('--summary-modes', default='tfidf,textrank',
+                        help="Summary modes to time; add 'abstractive' when the real models are available")
+    parser.add_argument('--report', help="Write the JSON report here")
+    parser.add_argument('--baseline', help="Earlier report to compare p50 / p99 against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown before a stage counts as regressed")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    args.summary_modes = [mode for mode in args.summary_modes.split(',') if mode]
+    scales = sorted(int(scale) for scale in args.scales.split(','))
+
+    if args.offline:
+        standins.offline_environment()
+    workdir = tempfile.mkdtemp(prefix='pipeline-bench-')
+    try:
+        models = {}
+        if args.offline:
+            models = standins.install(workdir, seed=args.seed)
+        corpus_dir = args.corpus_dir or os.path.join(workdir, 'corpus')
+        started = time.perf_counter()
+        entries = corpus.generate_corpus(corpus_dir, scales[-1], seed=args.seed, words=args.words)
+        print(f"Corpus of {len(entries)} documents ready in {time.perf_counter() - started:.1f}s ({corpus_dir})")
+
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'offline': args.offline,
+            'models': models,
+            'settings': {'sample': args.sample, 'queries': args.queries, 'batch_size': args.batch_size,
+                         'words': args.words, 'seed': args.seed},
+            'scales': {},
+        }
+        for scale in scales:
+            report['scales'][str(scale)] = run_scale(entries[:scale], args, workdir)
+        print_report(report)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.report}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/standins.py
+"""
+Tiny, randomly initialised stand-ins for the classifier, NER and embedding
+models, built from a vocabulary of the corpus words. Their predictions are
+meaningless; they keep the same code paths (tokenizer, batching, pipeline
+aggregation, pooling) so a benchmark measures the repo's overhead without
+downloading weights. Real models cost far more per token, so compare
+offline numbers only with other offline runs.
+"""
+import os
+import re
+from benchmarks.corpus import FILLER, FIRST_NAMES, LAST_NAMES, COMPANIES
+from modules.category_classifier import CATEGORY_KEYWORDS
+
+SPECIAL_TOKENS = ('[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]')
+NER_LABELS = ('O', 'B-PER', 'I-PER', 'B-ORG', 'I-ORG')
+
+
+def offline_environment():
+    """Make transformers fail fast instead of trying the network (call before importing the models)."""
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+
+def write_vocab(path):
+    words = set(FILLER) | {name.lower() for name in FIRST_NAMES + LAST_NAMES}
+    for phrase in COMPANIES:
+        words.update(phrase.lower().split())
+    for keywords in CATEGORY_KEYWORDS.values():
+        for phrase in keywords:
+            words.update(re.findall(r'\w+', phrase.lower()))
+    words.update('0123456789.,:;-$@/')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(SPECIAL_TOKENS + tuple(sorted(words))) + '\n')
+
+
+def _tokenizer(directory):
+    from transformers import BertTokenizerFast
+    vocab_path = os.path.join(directory, 'vocab.txt')
+    write_vocab(vocab_path)
+    tokenizer = BertTokenizerFast(vocab_file=vocab_path, do_lower_case=True)
+    tokenizer.save_pretrained(directory)
+    return tokenizer
+
+
+def _config(tokenizer, hidden_size, **extra):
+    from transformers import BertConfig
+    return BertConfig(vocab_size=len(tokenizer), hidden_size=hidden_size, num_hidden_layers=2,
+                      num_attention_heads=2, intermediate_size=hidden_size * 2, max_position_embeddings=512,
+                      **extra)
+
+
+def install(workdir, hidden_size=64, seed=0):
+    """
+    Put stand-in models into document_processor and semantic_search.
+    Returns {model: description} for the report.
+    """
+    import torch
+    from transformers import BertForSequenceClassification, BertForTokenClassification, BertModel, pipeline
+    from sentence_transformers import SentenceTransformer, models
+    from modules import document_processor, semantic_search
+
+    torch.manual_seed(seed)
+    directory = os.path.join(workdir, 'standin-models')
+    os.makedirs(directory, exist_ok=True)
+    tokenizer = _tokenizer(directory)
+
+    labels = document_processor.LABEL_LIST
+    classifier = BertForSequenceClassification(_config(
+        tokenizer, hidden_size, num_labels=len(labels),
+        id2label=dict(enumerate(labels)), label2id={label: i for i, label in enumerate(labels)}))
+    document_processor.tokenizer_cls, document_processor.model_cls = tokenizer, classifier.eval()
+
+    ner_model = BertForTokenClassification(_config(
+        tokenizer, hidden_size, num_labels=len(NER_LABELS),
+        id2label=dict(enumerate(NER_LABELS)), label2id={label: i for i, label in enumerate(NER_LABELS)}))
+    document_processor.ner_pipeline = pipeline('token-classification', model=ner_model.eval(), tokenizer=tokenizer,
+                                               aggregation_strategy='simple')
+
+    embedding_dir = os.path.join(directory, 'embedding')
+    BertModel(_config(tokenizer, hidden_size)).save_pretrained(embedding_dir)
+    tokenizer.save_pretrained(embedding_dir)
+    encoder = models.Transformer(embedding_dir, max_seq_length=256)
+    semantic_search._embedding_models[semantic_search.get_model_version()] = SentenceTransformer(
+        modules=[encoder, models.Pooling(encoder.get_word_embedding_dimension())])
+
+    description = f'random BERT, 2 layers, hidden {hidden_size}, vocab {len(tokenizer)}'
+    return {'classifier': description, 'ner': description, 'embedding': description}
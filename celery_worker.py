@@ -1,5 +1,8 @@
 # celery_worker.py
 from celery import Celery
+from celery.signals import (before_task_publish, setup_logging, task_postrun, task_prerun, worker_init,
+                            worker_process_init, worker_process_shutdown)
+from kombu import Queue
 from config import Config
 import os
 
@@ -7,12 +10,108 @@ celery_app = Celery(
     'ai_document_indexer',
     broker=os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
     backend=os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0'),
+    include=['modules.tasks'],
 )
 
+# Pipeline stage -> queue. Each queue gets its own worker so stages scale independently.
+STAGE_QUEUES = {
+    'modules.tasks.extract_stage': 'extract',
+    'modules.tasks.classify_stage': 'classify',
+    'modules.tasks.summarize_stage': 'summarize',
+    'modules.tasks.index_stage': 'index',
+    'modules.tasks.process_document_async': 'extract',
+}
+QUEUE_SETTINGS = Config.CELERY_QUEUES
+
 celery_app.conf.update(
     task_serializer='json',
     accept_content=['json'],
     result_serializer='json',
     timezone='Asia/Kolkata',
     enable_utc=True,
+    task_queues=[Queue(name) for name in QUEUE_SETTINGS],
+    task_default_queue='extract',
+    task_routes={task: {'queue': queue} for task, queue in STAGE_QUEUES.items()},
+    # Per-stage time limits; concurrency and prefetch are per worker (scripts/run_workers.py)
+    task_annotations={
+        task: {'soft_time_limit': QUEUE_SETTINGS[queue]['soft_time_limit'],
+               'time_limit': QUEUE_SETTINGS[queue]['time_limit']}
+        for task, queue in STAGE_QUEUES.items()
+    },
+    # Message priorities on Redis: 0 (small documents) is delivered before higher numbers
+    broker_transport_options={'priority_steps': list(range(10)), 'sep': ':', 'queue_order_strategy': 'priority'},
+    task_default_priority=5,
+    # Logging is configured by modules.structured_logging (setup_logging below)
+    worker_hijack_root_logger=False,
 )
+
+
+@setup_logging.connect
+def configure_worker_logging(**kwargs):
+    # Connecting this signal stops Celery from installing its own handlers
+    from modules import structured_logging
+    structured_logging.configure_logging()
+
+
+@before_task_publish.connect
+def attach_request_id(headers=None, **kwargs):
+    # Carry the web request's (or parent task's) id to the task that gets queued
+    from modules import structured_logging
+    request_id = structured_logging.get_request_id()
+    if request_id and headers is not None:
+        headers.setdefault('request_id', request_id)
+
+
+@task_prerun.connect
+def bind_request_id(task=None, **kwargs):
+    from modules import structured_logging
+    if task is None:
+        return
+    request_id = getattr(task.request, 'request_id', None) or task.request.id
+    task.request._request_id_token = structured_logging.set_request_id(request_id)
+
+
+_pool = {'name': 'prefork', 'concurrency': 1}
+
+
+@worker_init.connect
+def preload_worker_models(sender=None, **kwargs):
+    # Runs in the parent before the pool forks: children share the weights copy-on-write
+    from modules import worker_bootstrap
+    _pool['name'] = worker_bootstrap.pool_name(getattr(sender, 'pool_cls', 'prefork'))
+    _pool['concurrency'] = getattr(sender, 'concurrency', None) or 1
+    if Config.PRELOAD_MODELS:
+        queues = list(sender.app.amqp.queues.consume_from) if sender is not None else None
+        worker_bootstrap.preload_models(queues)
+    if _pool['name'] != 'prefork':
+        # Threads and solo pools never fork, so configure this process directly
+        worker_bootstrap.configure_torch(worker_bootstrap.torch_threads(_pool['name'], _pool['concurrency']))
+    worker_bootstrap.report_memory('Worker parent')
+
+
+@worker_process_init.connect
+def configure_worker_process(**kwargs):
+    from modules import metrics, structured_logging, worker_bootstrap
+    # The parent's listener thread did not survive the fork
+    structured_logging.configure_logging()
+    # Stage timings of this child reach the web app's /metrics through METRICS_DIR
+    metrics.start_exporter(Config.METRICS_DIR, Config.METRICS_EXPORT_INTERVAL)
+    worker_bootstrap.configure_torch(worker_bootstrap.torch_threads(_pool['name'], _pool['concurrency']))
+    worker_bootstrap.report_memory('Worker child')
+
+
+@worker_process_shutdown.connect
+def flush_worker_metrics(**kwargs):
+    # Prefork children exit without running atexit handlers
+    from modules import metrics
+    metrics.flush()
+
+
+@task_postrun.connect
+def release_db_connection(task=None, **kwargs):
+    # Hand the task thread's pooled SQLite connection back after every task
+    from modules import database, structured_logging
+    database.release_thread_connection()
+    token = getattr(task.request, '_request_id_token', None) if task is not None else None
+    if token is not None:
+        structured_logging.reset_request_id(token)
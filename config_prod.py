@@ -8,3 +8,89 @@ class Config:
     MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join(os.path.abspath(os.path.dirname(__file__)), 'models', 'distilbert-base-uncased'))
     EMBEDDING_MODEL_NAME = os.environ.get('EMBEDDING_MODEL_NAME', 'sentence-transformers/all-MiniLM-L6-v2')
     DEBUG = False
+
+    # Micro-batching per model: larger batches/waits favour throughput, smaller favour latency
+    # timeout_seconds: how long a caller waits for its result before giving up
+    INFERENCE_BATCHING = {
+        'classifier': {'max_batch_size': 16, 'max_wait_ms': 20, 'timeout_seconds': 120},
+        'ner': {'max_batch_size': 8, 'max_wait_ms': 20, 'timeout_seconds': 120},
+        'embedding': {'max_batch_size': 64, 'max_wait_ms': 5, 'timeout_seconds': 120},
+    }
+
+    # Metadata extraction: characters scanned per document, NER chunk size and batch size
+    METADATA_CHAR_BUDGET = 20000
+    NER_CHUNK_CHARS = 2000
+    NER_BATCH_SIZE = 16
+
+    # Classify from the document embedding when the centroid model (scripts/train_centroid_classifier.py)
+    # is at least this confident; the fine-tuned transformer handles the rest
+    CENTROID_CLASSIFIER = os.environ.get('CENTROID_CLASSIFIER', '1') == '1'
+    CENTROID_MIN_CONFIDENCE = float(os.environ.get('CENTROID_MIN_CONFIDENCE', 0.6))
+
+    SUMMARY_MODE = os.environ.get('SUMMARY_MODE', 'abstractive')
+
+    # Uploads are streamed to disk in chunks; requests above MAX_CONTENT_LENGTH are rejected by Flask
+    MAX_CONTENT_LENGTH = 512 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE = 64 * 1024
+    MAX_UPLOAD_FILE_BYTES = 50 * 1024 * 1024
+    MAX_ARCHIVE_BYTES = 500 * 1024 * 1024
+    MAX_ARCHIVE_UNCOMPRESSED_BYTES = 1024 * 1024 * 1024
+    MAX_ARCHIVE_MEMBERS = 500
+
+    # Access logs are queued in memory and written in batches by a background thread
+    ACCESS_LOG = {'queue_size': 10000, 'flush_every': 200, 'flush_interval_ms': 500}
+
+    # Seconds a cached user record (role) is trusted before it is re-read
+    USER_CACHE_TTL = 60
+
+    # One Celery queue per pipeline stage, each served by its own worker
+    # (scripts/run_workers.py). Time limits are in seconds.
+    CELERY_QUEUES = {
+        'extract': {'concurrency': 4, 'pool': 'prefork', 'prefetch_multiplier': 4, 'soft_time_limit': 120, 'time_limit': 180},
+        'classify': {'concurrency': 8, 'pool': 'threads', 'prefetch_multiplier': 4, 'soft_time_limit': 60, 'time_limit': 90},
+        'summarize': {'concurrency': 2, 'pool': 'prefork', 'prefetch_multiplier': 1, 'soft_time_limit': 600, 'time_limit': 660},
+        'index': {'concurrency': 8, 'pool': 'threads', 'prefetch_multiplier': 4, 'soft_time_limit': 60, 'time_limit': 90},
+    }
+    # Documents up to this size are queued with a higher priority
+    SMALL_DOCUMENT_BYTES = 1024 * 1024
+    # Load models in the worker parent before forking so prefork children share them
+    PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '1') == '1'
+    # Torch intra-op threads per worker process; None splits the cores across prefork children
+    WORKER_TORCH_THREADS = None
+
+    # Where queued processing runs: 'celery' (needs Redis), 'thread' or
+    # 'process' (in-process bounded queue) or 'eager' (inline, for tests)
+    TASK_BACKEND = os.environ.get('TASK_BACKEND', 'celery')
+    TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 4))
+    TASK_QUEUE_SIZE = 1000
+    # Flask-Limiter storage; in-process memory when there is no Redis for Celery either
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI') or (
+        'redis://localhost:6379' if TASK_BACKEND == 'celery' else 'memory://')
+    # Off for load tests that would otherwise hit the per-IP limits
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+
+    # JSON logs to stderr and LOG_FILE, written by a background thread. Every process
+    # appends to LOG_FILE; rotate it with logrotate (README), not from the app
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    # Per-logger levels, e.g. {'modules.semantic_search': 'DEBUG'}
+    LOG_LEVELS = {'werkzeug': 'WARNING', 'celery': 'INFO'}
+    LOG_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'logs', 'app.log')
+    LOG_QUEUE_SIZE = 10000
+    # Fraction of DEBUG records kept when DEBUG is enabled
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
+
+    # Load the embedding model and FAISS index when the web app starts; /status is 503 until then
+    WARM_UP_ON_START = os.environ.get('WARM_UP_ON_START', '1') == '1'
+    # /status stays 503 until the fine-tuned classifier weights are loaded (the fallback does not count)
+    READINESS_REQUIRE_CLASSIFIER = os.environ.get('READINESS_REQUIRE_CLASSIFIER', '0') == '1'
+    # Bearer token required by /metrics when set
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Worker processes write their metrics here and /metrics merges them; empty disables
+    METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(os.path.abspath(os.path.dirname(__file__)), 'logs', 'metrics'))
+    METRICS_EXPORT_INTERVAL = 5.0
+
+    # cProfile a fraction of searches, uploads and pipeline stages (admins can also send X-Profile: 1)
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+    PROFILE_TOP_N = 25
+    PROFILE_KEEP = 200
+    PROFILE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'logs', 'profiles')
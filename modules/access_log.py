@@ -0,0 +1,184 @@
+# modules/access_log.py
+"""
+Buffered access-log writer.
+
+Requests call log() which only puts the event on a bounded in-memory queue;
+a background thread writes queued events with one executemany + commit every
+flush_every events or flush_interval_ms, whichever comes first. When the queue
+is full the event is dropped and counted rather than slowing the request down.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from config import Config
+from modules import database, metrics
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ('view', 'download', 'search', 'list', 'upload', 'process')
+
+EVENTS = metrics.counter('access_log_events_total', 'Access-log events by outcome', labelnames=('outcome',))
+FLUSH_BATCH_SIZE = metrics.histogram('access_log_flush_batch_size', 'Events written per flush',
+                                     buckets=(1, 10, 50, 100, 200, 500, 1000))
+FLUSH_SECONDS = metrics.histogram('access_log_flush_seconds', 'Time spent writing one batch of access-log events')
+
+DEFAULT_SETTINGS = {'queue_size': 10000, 'flush_every': 200, 'flush_interval_ms': 500}
+
+INSERT_SQL = '''
+    INSERT INTO access_logs (user_id, document_id, action, timestamp, detail)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+
+class AccessLogWriter:
+    def __init__(self, queue_size=10000, flush_every=200, flush_interval_ms=500):
+        self.flush_every = max(1, int(flush_every))
+        self.flush_interval = max(0.001, flush_interval_ms / 1000.0)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Same fork handling as the inference broker: a prefork child starts its own thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='access-log-writer', daemon=True)
+            self._thread.start()
+
+    def log(self, user_id, action, document_id=None, detail=None):
+        """Queue one event; returns False if it was dropped because the queue is full."""
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown access-log action: {action}")
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((user_id, document_id, action, datetime.now(), detail))
+        except queue.Full:
+            EVENTS.labels(outcome='dropped').inc()
+            return False
+        EVENTS.labels(outcome='queued').inc()
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        # Block for the first event, then gather until flush_every events or the interval ends
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.flush_interval
+        while len(batch) < self.flush_every:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.flush_every:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            database.run_with_retry(self._insert, batch)
+            EVENTS.labels(outcome='written').inc(len(batch))
+        except Exception as e:
+            EVENTS.labels(outcome='failed').inc(len(batch))
+            logger.error("Access log flush failed, %d events lost: %s", len(batch), e)
+        finally:
+            FLUSH_BATCH_SIZE.observe(len(batch))
+            FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+    @staticmethod
+    def _insert(batch):
+        conn = database.get_db_connection()
+        conn.executemany(INSERT_SQL, batch)
+        conn.commit()
+        conn.close()
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self._flush_lock:
+                self._write(batch)
+
+    def flush(self):
+        """Write everything queued so far from the calling thread (shutdown, scripts)."""
+        with self._flush_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                self._write(batch)
+
+
+def _settings():
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(getattr(Config, 'ACCESS_LOG', {}))
+    return settings
+
+
+writer = AccessLogWriter(**_settings())
+atexit.register(writer.flush)
+
+metrics.gauge('access_log_queue_depth', 'Access-log events waiting to be written').set_function(writer.pending)
+
+
+def log(user_id, action, document_id=None, detail=None):
+    """Record an access event without blocking the caller on SQLite."""
+    return writer.log(user_id, action, document_id=document_id, detail=detail)
+
+
+def flush():
+    writer.flush()
+
+
+def query_logs(user_id=None, document_id=None, action=None, since=None, until=None, before=None, limit=100):
+    """
+    Access-log rows, newest first, filtered by any combination of user, document,
+    action and time range. For the next page pass the last row's
+    (timestamp, id) as before. Per-user and per-document filters use the
+    (user_id, timestamp) and (document_id, timestamp) indexes.
+    """
+    clauses, params = [], []
+    for column, value in (('user_id', user_id), ('document_id', document_id), ('action', action)):
+        if value is not None:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    if since is not None:
+        clauses.append('timestamp >= ?')
+        params.append(since)
+    if until is not None:
+        clauses.append('timestamp < ?')
+        params.append(until)
+    if before is not None:
+        clauses.append('(timestamp, id) < (?, ?)')
+        params.extend(before)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    conn = database.get_db_connection()
+    rows = conn.execute(f'''
+        SELECT id, user_id, document_id, action, timestamp, detail FROM access_logs {where}
+        ORDER BY timestamp DESC, id DESC LIMIT ?
+    ''', params + [max(1, min(int(limit), 1000))]).fetchall()
+    conn.close()
+    return rows
@@ -3,6 +3,7 @@ import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask import current_app
 from modules.database import get_db_connection
+from modules import authz
 
 def hash_password(password):
     return generate_password_hash(password)
@@ -11,12 +12,8 @@ def verify_password(hashed_password, password):
     return check_password_hash(hashed_password, password)
 
 def get_user_by_username(username):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    # Served from the authz user cache
+    return authz.get_user_by_username(username)
 
 def create_user(username, password, role):
     conn = get_db_connection()
@@ -30,4 +27,5 @@ def create_user(username, password, role):
         conn.close()
         return False  # Username already exists
     conn.close()
+    authz.invalidate_user(username=username)
     return True
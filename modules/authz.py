@@ -0,0 +1,194 @@
+# modules/authz.py
+"""
+Role-based category authorization.
+
+The role -> categories policy lives here only. Each policy version is
+compiled once into CategoryFilter objects holding the SQL fragment and a
+frozenset for membership checks, so routes never rebuild placeholders. User
+records are cached for USER_CACHE_TTL seconds and invalidated on signup and
+role changes; request_filter() resolves the current user's filter once per
+request and keeps it on flask.g.
+"""
+import threading
+import time
+from flask import g, has_request_context, session
+from config import Config
+from modules import database, metrics
+
+# None = every category
+DEFAULT_POLICY = {
+    'admin': None,
+    'hr': ['Resume'],
+    'finance': ['Invoice', 'Contract'],
+}
+
+USER_CACHE_TTL = getattr(Config, 'USER_CACHE_TTL', 60)
+USER_CACHE_MAX = 10000
+
+USER_CACHE = metrics.counter('authz_user_cache_total', 'User record lookups by cache outcome', labelnames=('outcome',))
+metrics.gauge('cache_hit_ratio', 'Hit ratio per cache', labelnames=('cache',)).labels(cache='authz_user').set_function(
+    metrics.hit_ratio(USER_CACHE))
+
+
+class CategoryFilter:
+    """Compiled view of one role's allowed categories."""
+
+    def __init__(self, role, categories):
+        self.role = role
+        self.categories = None if categories is None else frozenset(c.strip() for c in categories)
+        if self.categories is None:
+            self.sql, self.params = '1', ()
+        elif not self.categories:
+            self.sql, self.params = '0', ()
+        else:
+            ordered = tuple(sorted(self.categories))
+            self.sql = f"category IN ({','.join('?' * len(ordered))})"
+            self.params = ordered
+
+    @property
+    def unrestricted(self):
+        return self.categories is None
+
+    def allows(self, category):
+        return self.categories is None or category in self.categories
+
+    def category_list(self):
+        """Categories for per-category queries; None when unrestricted."""
+        return None if self.categories is None else sorted(self.categories)
+
+    def where(self, alias=None):
+        """(sql, params) to AND into a documents query."""
+        if alias and self.categories:
+            return self.sql.replace('category', f'{alias}.category', 1), self.params
+        return self.sql, self.params
+
+
+NO_ACCESS = CategoryFilter(None, [])
+
+
+class Policy:
+    def __init__(self, role_to_categories, version=1):
+        self.version = version
+        self.role_to_categories = {role: (None if cats is None else list(cats))
+                                   for role, cats in role_to_categories.items()}
+        self.filters = {role: CategoryFilter(role, cats) for role, cats in self.role_to_categories.items()}
+
+    def filter_for(self, role):
+        return self.filters.get((role or '').lower().strip(), NO_ACCESS)
+
+
+_policy = Policy(DEFAULT_POLICY)
+_policy_lock = threading.Lock()
+
+
+def get_policy():
+    return _policy
+
+
+def set_policy(role_to_categories):
+    """Swap in a new policy; compiled filters are rebuilt once and the version bumps."""
+    global _policy
+    with _policy_lock:
+        _policy = Policy(role_to_categories, version=_policy.version + 1)
+    return _policy
+
+
+def filter_for_role(role):
+    return _policy.filter_for(role)
+
+
+# --- user cache ---------------------------------------------------------------
+
+_users_by_id = {}
+_users_by_name = {}
+_cache_lock = threading.Lock()
+
+
+def _cache_put(user):
+    expires = time.monotonic() + USER_CACHE_TTL
+    with _cache_lock:
+        if len(_users_by_id) >= USER_CACHE_MAX:
+            _users_by_id.clear()
+            _users_by_name.clear()
+        _users_by_id[user['id']] = (expires, user)
+        _users_by_name[user['username']] = (expires, user)
+
+
+def _cache_get(cache, key):
+    entry = cache.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        USER_CACHE.labels(outcome='miss').inc()
+        return None
+    USER_CACHE.labels(outcome='hit').inc()
+    return entry[1]
+
+
+def _load_user(column, value):
+    conn = database.get_db_connection()
+    row = conn.execute(f'SELECT id, username, password, role FROM users WHERE {column} = ?', (value,)).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    user = dict(row)
+    user['role'] = (user['role'] or '').lower().strip()
+    _cache_put(user)
+    return user
+
+
+def get_user(user_id):
+    """User record as a dict (id, username, password, role), or None."""
+    if user_id is None:
+        return None
+    return _cache_get(_users_by_id, user_id) or _load_user('id', user_id)
+
+
+def get_user_by_username(username):
+    if not username:
+        return None
+    return _cache_get(_users_by_name, username) or _load_user('username', username)
+
+
+def get_user_role(user_id):
+    user = get_user(user_id)
+    return user['role'] if user else None
+
+
+def invalidate_user(user_id=None, username=None):
+    with _cache_lock:
+        entry = _users_by_id.pop(user_id, None) if user_id is not None else None
+        if entry is not None:
+            _users_by_name.pop(entry[1]['username'], None)
+        entry = _users_by_name.pop(username, None) if username is not None else None
+        if entry is not None:
+            _users_by_id.pop(entry[1]['id'], None)
+
+
+def set_user_role(user_id, role):
+    """Change a user's role and drop the cached record."""
+    conn = database.get_db_connection()
+    conn.execute('UPDATE users SET role = ? WHERE id = ?', (role, user_id))
+    conn.commit()
+    conn.close()
+    invalidate_user(user_id=user_id)
+
+
+# --- per-request --------------------------------------------------------------
+
+def filter_for_user(user_id):
+    return filter_for_role(get_user_role(user_id))
+
+
+def is_admin(user_id):
+    """From the stored role, so a demotion takes effect without logging out."""
+    return (get_user_role(user_id) or '').lower().strip() == 'admin'
+
+
+def request_filter():
+    """The logged-in user's CategoryFilter, resolved at most once per request."""
+    if not has_request_context():
+        return NO_ACCESS
+    cached = g.get('_category_filter')
+    if cached is None or cached[0] != _policy.version:
+        user_id = session.get('user_id')
+        cached = g._category_filter = (_policy.version, filter_for_user(user_id) if user_id else NO_ACCESS)
+    return cached[1]
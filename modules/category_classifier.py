@@ -1,5 +1,11 @@
+import os
 import re
-from config.category_keywords import CATEGORY_KEYWORDS
+import runpy
+
+# config.py shadows the config/ directory on sys.path, so the keyword
+# vocabularies are read from their file rather than imported
+CATEGORY_KEYWORDS = runpy.run_path(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'config',
+                                                'category_keywords.py'))['CATEGORY_KEYWORDS']
 
 def preprocess_text(text):
     text = text.lower()
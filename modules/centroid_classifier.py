@@ -0,0 +1,175 @@
+# modules/centroid_classifier.py
+"""
+Category from the document embedding: one centroid per category, learned
+from labelled examples (scripts/dataset.csv, training_data.jsonl and the
+latest document_corrections entry of each corrected document), so
+classification costs one matrix-vector product against the vector the
+index stage needs anyway.
+
+Confidence is a softmax over the cosine similarities to each centroid.
+Below Config.CENTROID_MIN_CONFIDENCE, or when no model for the active
+generation's embedding model exists, callers fall back to the fine-tuned transformer.
+Train with scripts/train_centroid_classifier.py; compare with the
+transformer with scripts/evaluate_classifier.py.
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+import numpy as np
+from config import Config
+from modules import database, metrics
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = getattr(Config, 'CENTROID_CLASSIFIER_PATH', None) or os.path.join(
+    os.path.abspath(os.path.dirname(__file__)), '..', 'models', 'centroid_classifier.npz')
+# Softmax temperature over cosine similarities: lower is more decisive
+TEMPERATURE = 0.05
+
+PREDICTIONS = metrics.counter('centroid_classifier_total', 'Documents the centroid classifier kept or passed on',
+                              labelnames=('outcome',))
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype='float32')
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class CentroidModel:
+    def __init__(self, labels, centroids, model_version, counts=None, temperature=TEMPERATURE, trained_at=None):
+        self.labels = list(labels)
+        self.centroids = normalize_rows(centroids)
+        self.model_version = model_version
+        self.counts = list(counts) if counts is not None else [0] * len(self.labels)
+        self.temperature = float(temperature)
+        self.trained_at = trained_at
+
+    @property
+    def dimension(self):
+        return self.centroids.shape[1]
+
+    def probabilities(self, embeddings):
+        """(n, categories) softmax over cosine similarity to each centroid."""
+        scores = normalize_rows(embeddings) @ self.centroids.T / self.temperature
+        scores -= scores.max(axis=1, keepdims=True)
+        weights = np.exp(scores)
+        return weights / weights.sum(axis=1, keepdims=True)
+
+    def predict_batch(self, embeddings):
+        """[(label, confidence)] for a (n, dim) matrix."""
+        probabilities = self.probabilities(embeddings)
+        best = probabilities.argmax(axis=1)
+        return [(self.labels[i], float(probabilities[row, i])) for row, i in enumerate(best)]
+
+    def predict(self, embedding):
+        return self.predict_batch(embedding)[0]
+
+    def save(self, path=None):
+        """Write the model next to its final name, then rename it into place."""
+        path = path or MODEL_PATH
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, labels=np.array(self.labels), centroids=self.centroids, counts=np.array(self.counts),
+                     model_version=np.array(self.model_version), temperature=np.array(self.temperature),
+                     trained_at=np.array(self.trained_at or datetime.now().isoformat(timespec='seconds')))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def read(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['labels'].tolist(), data['centroids'], str(data['model_version']),
+                       counts=data['counts'].tolist(), temperature=float(data['temperature']),
+                       trained_at=str(data['trained_at']))
+
+
+def fit(embeddings, labels, model_version, temperature=TEMPERATURE):
+    """Centroid of the normalised embeddings of each label."""
+    embeddings = normalize_rows(embeddings)
+    labels = list(labels)
+    names = sorted(set(labels))
+    label_index = np.array([names.index(label) for label in labels])
+    centroids = np.stack([embeddings[label_index == i].mean(axis=0) for i in range(len(names))])
+    counts = [int((label_index == i).sum()) for i in range(len(names))]
+    return CentroidModel(names, centroids, model_version, counts=counts, temperature=temperature)
+
+
+# The model as last read from disk, keyed by file stamp like the FAISS index
+_loaded = {'key': None, 'model': None}
+_load_lock = threading.Lock()
+
+
+def load(path=None):
+    """The trained model, or None when there is none; re-read only after the file changes."""
+    path = path or MODEL_PATH
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if _loaded['key'] != key:
+        with _load_lock:
+            if _loaded['key'] != key:
+                try:
+                    model = CentroidModel.read(path)
+                except Exception as e:
+                    logger.warning("Could not read centroid classifier %s: %s", path, e)
+                    model = None
+                _loaded.update(key=key, model=model)
+    return _loaded['model']
+
+
+def active_model():
+    """
+    The model when enabled and trained on the embedding model of the active
+    index generation, else None.
+    """
+    if not getattr(Config, 'CENTROID_CLASSIFIER', True):
+        return None
+    model = load()
+    if model is None:
+        return None
+    from modules import semantic_search
+    if model.model_version != semantic_search.get_model_version():
+        return None
+    return model
+
+
+def classify(embedding, min_confidence=None):
+    """
+    Category for an embedding when the centroid model is confident, else
+    None (no usable model, or confidence below the threshold).
+    """
+    model = active_model()
+    if model is None:
+        PREDICTIONS.labels(outcome='unavailable').inc()
+        return None
+    if min_confidence is None:
+        min_confidence = getattr(Config, 'CENTROID_MIN_CONFIDENCE', 0.6)
+    label, confidence = model.predict(embedding)
+    if confidence < min_confidence:
+        PREDICTIONS.labels(outcome='fallback').inc()
+        return None
+    PREDICTIONS.labels(outcome='accepted').inc()
+    return label
+
+
+def corrected_labels(conn=None):
+    """{document_id: category} from the most recent correction of each corrected document."""
+    own_conn = conn is None
+    if own_conn:
+        conn = database.get_db_connection()
+    rows = conn.execute('''
+        SELECT c.document_id, c.corrected_category FROM document_corrections c
+        WHERE c.id = (SELECT c2.id FROM document_corrections c2 WHERE c2.document_id = c.document_id
+                      ORDER BY c2.correction_date DESC, c2.id DESC LIMIT 1)
+          AND c.corrected_category IS NOT NULL
+    ''').fetchall()
+    if own_conn:
+        conn.close()
+    return {row['document_id']: row['corrected_category'] for row in rows}
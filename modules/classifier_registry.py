@@ -0,0 +1,134 @@
+# modules/classifier_registry.py
+"""
+Published versions of the fine-tuned category classifier.
+
+scripts/fine_tune_classifier.py saves each trained model to
+models/finetuned_classifier/versions/<version>/ (written under a temporary
+name and renamed into place) and then replaces the CURRENT pointer file
+next to versions/ with the new version name. A rename is atomic, so
+readers see either the old version or the new one, never a half-written
+model. document_processor checks the pointer's file stamp before each
+batch and loads the new version when it changes, so web and worker
+processes pick up a publish without a restart.
+
+Without a pointer the classifier is loaded from models/finetuned_classifier
+itself, as before versions existed.
+"""
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'models', 'finetuned_classifier')
+VERSIONS_DIR = os.path.join(MODEL_DIR, 'versions')
+POINTER_PATH = os.path.join(MODEL_DIR, 'CURRENT')
+# Training details saved with every version
+METADATA_FILE = 'training.json'
+
+
+def current_version():
+    """Name of the published version, or None when nothing was published."""
+    try:
+        with open(POINTER_PATH, encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def version_dir(version):
+    return os.path.join(VERSIONS_DIR, version)
+
+
+def current_dir():
+    """Directory to load the classifier from: the published version, else MODEL_DIR."""
+    version = current_version()
+    if version and os.path.isdir(version_dir(version)):
+        return version_dir(version)
+    return MODEL_DIR
+
+
+def pointer_stamp():
+    """Changes whenever a version is published; None without a pointer."""
+    try:
+        stat = os.stat(POINTER_PATH)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_metadata(version=None):
+    version = version or current_version()
+    if not version:
+        return {}
+    try:
+        with open(os.path.join(version_dir(version), METADATA_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def new_version_name():
+    return datetime.now().strftime('%Y%m%d-%H%M%S')
+
+
+def _write_pointer(version):
+    tmp_path = f'{POINTER_PATH}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, POINTER_PATH)
+
+
+def publish(model, tokenizer, metadata, version=None, activate=True):
+    """
+    Save model and tokenizer as a new version and, when activate, point
+    CURRENT at it. Returns the version name.
+    """
+    version = version or new_version_name()
+    final_dir = version_dir(version)
+    if os.path.exists(final_dir):
+        raise FileExistsError(f"Classifier version {version} already exists")
+    tmp_dir = os.path.join(VERSIONS_DIR, f'.{version}.{os.getpid()}.tmp')
+    os.makedirs(tmp_dir)
+    try:
+        model.save_pretrained(tmp_dir)
+        tokenizer.save_pretrained(tmp_dir)
+        with open(os.path.join(tmp_dir, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump(dict(metadata, version=version), f, indent=2)
+        os.rename(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    if activate:
+        _write_pointer(version)
+        logger.info("Published classifier version %s", version)
+    return version
+
+
+def activate(version):
+    """Point CURRENT at an existing version (also how a bad publish is rolled back)."""
+    if not os.path.isdir(version_dir(version)):
+        raise FileNotFoundError(f"No classifier version {version}")
+    _write_pointer(version)
+
+
+def list_versions():
+    """Published version names, oldest first."""
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    return sorted(name for name in os.listdir(VERSIONS_DIR)
+                  if not name.startswith('.') and os.path.isdir(version_dir(name)))
+
+
+def prune(keep):
+    """Delete all but the newest keep versions, never the current one. Returns the removed names."""
+    current = current_version()
+    versions = list_versions()
+    removed = [name for name in versions[:max(0, len(versions) - keep)] if name != current]
+    for name in removed:
+        shutil.rmtree(version_dir(name), ignore_errors=True)
+    return removed
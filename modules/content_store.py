@@ -0,0 +1,220 @@
+# modules/content_store.py
+import zlib
+from datetime import datetime
+import numpy as np
+from modules import database
+
+# Extracted text is stored zlib-compressed; level 6 is the usual size/speed trade-off
+TEXT_COMPRESSION_LEVEL = 6
+
+
+def compress_text(text):
+    return zlib.compress((text or '').encode('utf-8'), TEXT_COMPRESSION_LEVEL)
+
+
+def decompress_text(blob):
+    if blob is None:
+        return None
+    return zlib.decompress(blob).decode('utf-8')
+
+
+@database.retry_on_busy
+def save_document_text(document_id, text, conn=None):
+    """Store (or replace) the extracted text of a document."""
+    own_conn = conn is None
+    if own_conn:
+        conn = database.get_db_connection()
+    conn.execute('''
+        INSERT OR REPLACE INTO document_content (document_id, text_z, char_count, extracted_at)
+        VALUES (?, ?, ?, ?)
+    ''', (document_id, compress_text(text), len(text or ''), datetime.now()))
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+
+@database.retry_on_busy
+def save_document_texts(items, conn=None):
+    """Bulk variant of save_document_text for (document_id, text) pairs."""
+    now = datetime.now()
+    rows = [(doc_id, compress_text(text), len(text or ''), now) for doc_id, text in items]
+    own_conn = conn is None
+    if own_conn:
+        conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT OR REPLACE INTO document_content (document_id, text_z, char_count, extracted_at)
+        VALUES (?, ?, ?, ?)
+    ''', rows)
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+
+def get_document_text(document_id):
+    """Return the stored text of a document, or None if it was never extracted."""
+    conn = database.get_db_connection()
+    row = conn.execute('SELECT text_z FROM document_content WHERE document_id = ?', (document_id,)).fetchone()
+    conn.close()
+    return decompress_text(row['text_z']) if row else None
+
+
+def iter_document_texts(document_ids=None, batch_size=500):
+    """
+    Yield (document_id, text) pairs from the store in id order.
+    Rows are fetched in pages so large corpora are never loaded at once.
+    """
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    if document_ids is not None:
+        document_ids = list(document_ids)
+        for start in range(0, len(document_ids), batch_size):
+            chunk = document_ids[start:start + batch_size]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'SELECT document_id, text_z FROM document_content WHERE document_id IN ({placeholders})',
+                           tuple(chunk))
+            for row in cursor.fetchall():
+                yield row['document_id'], decompress_text(row['text_z'])
+    else:
+        last_id = 0
+        while True:
+            cursor.execute('''
+                SELECT document_id, text_z FROM document_content
+                WHERE document_id > ? ORDER BY document_id LIMIT ?
+            ''', (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for row in rows:
+                yield row['document_id'], decompress_text(row['text_z'])
+            last_id = rows[-1]['document_id']
+    conn.close()
+
+
+def save_document_summary(document_id, summary, conn=None):
+    """Store (or replace) a document summary; None removes it."""
+    save_document_summaries([(document_id, summary)], conn=conn)
+
+
+@database.retry_on_busy
+def save_document_summaries(items, conn=None):
+    """Bulk variant of save_document_summary for (document_id, summary) pairs."""
+    items = list(items)
+    own_conn = conn is None
+    if own_conn:
+        conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT OR REPLACE INTO document_summaries (document_id, summary) VALUES (?, ?)
+    ''', [(doc_id, summary) for doc_id, summary in items if summary])
+    conn.executemany('DELETE FROM document_summaries WHERE document_id = ?',
+                     [(doc_id,) for doc_id, summary in items if not summary])
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+
+def get_document_summary(document_id):
+    conn = database.get_db_connection()
+    row = conn.execute('SELECT summary FROM document_summaries WHERE document_id = ?', (document_id,)).fetchone()
+    conn.close()
+    return row['summary'] if row else None
+
+
+def get_document_summaries(document_ids):
+    """{document_id: summary} for the given ids; ids without a summary are left out."""
+    document_ids = list(document_ids)
+    if not document_ids:
+        return {}
+    conn = database.get_db_connection()
+    placeholders = ','.join('?' * len(document_ids))
+    rows = conn.execute(f'SELECT document_id, summary FROM document_summaries WHERE document_id IN ({placeholders})',
+                        tuple(document_ids)).fetchall()
+    conn.close()
+    return {row['document_id']: row['summary'] for row in rows}
+
+
+def save_embedding(document_id, model_version, embedding, conn=None):
+    """Store (or replace) a document embedding for a given embedding model version."""
+    save_embeddings([document_id], model_version, np.expand_dims(embedding, axis=0), conn=conn)
+
+
+@database.retry_on_busy
+def save_embeddings(document_ids, model_version, matrix, conn=None):
+    """Store a (n, dim) matrix of embeddings, one row per document id."""
+    matrix = np.ascontiguousarray(matrix, dtype='float32')
+    dimension = matrix.shape[1]
+    now = datetime.now()
+    rows = [(doc_id, model_version, dimension, matrix[i].tobytes(), now)
+            for i, doc_id in enumerate(document_ids)]
+    own_conn = conn is None
+    if own_conn:
+        conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT OR REPLACE INTO document_embeddings (document_id, model_version, dimension, vector, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+
+def get_embedding(document_id, model_version):
+    conn = database.get_db_connection()
+    row = conn.execute('''
+        SELECT vector FROM document_embeddings WHERE document_id = ? AND model_version = ?
+    ''', (document_id, model_version)).fetchone()
+    conn.close()
+    return np.frombuffer(row['vector'], dtype='float32') if row else None
+
+
+def get_embeddings(document_ids, model_version):
+    """{document_id: vector} for the given documents that have a stored vector for model_version."""
+    document_ids = list(document_ids)
+    if not document_ids:
+        return {}
+    conn = database.get_db_connection()
+    placeholders = ','.join('?' * len(document_ids))
+    rows = conn.execute(f'''
+        SELECT document_id, vector FROM document_embeddings
+        WHERE model_version = ? AND document_id IN ({placeholders})
+    ''', (model_version, *document_ids)).fetchall()
+    conn.close()
+    return {row['document_id']: np.frombuffer(row['vector'], dtype='float32') for row in rows}
+
+
+def load_embeddings(model_version):
+    """
+    Load every stored embedding for a model version, of documents that still exist.
+    Returns (document_ids, matrix) where matrix is a float32 array of shape (n, dim).
+    """
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT e.document_id, e.dimension, e.vector FROM document_embeddings e
+        JOIN documents d ON d.id = e.document_id
+        WHERE e.model_version = ? ORDER BY e.document_id
+    ''', (model_version,))
+    rows = cursor.fetchall()
+    conn.close()
+    if not rows:
+        return [], np.zeros((0, 0), dtype='float32')
+
+    dimension = rows[0]['dimension']
+    document_ids = [row['document_id'] for row in rows]
+    # One contiguous buffer -> one reshape, instead of n small arrays
+    matrix = np.frombuffer(b''.join(row['vector'] for row in rows), dtype='float32').reshape(len(rows), dimension)
+    return document_ids, matrix
+
+
+def missing_embedding_ids(model_version):
+    """Ids of documents that have no stored embedding for the given model version."""
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT d.id FROM documents d
+        LEFT JOIN document_embeddings e ON e.document_id = d.id AND e.model_version = ?
+        WHERE e.document_id IS NULL
+        ORDER BY d.id
+    ''', (model_version,))
+    ids = [row['id'] for row in cursor.fetchall()]
+    conn.close()
+    return ids
@@ -1,69 +1,219 @@
 import sqlite3
-from datetime import datetime
-from flask import current_app
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, has_app_context
+from config import Config
+from modules import metrics, migrations
 import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-DB_PATH = os.path.join(BASE_DIR, 'instance', 'app.db')
+
+
+def _resolve_db_path(uri):
+    # config_prod uses a SQLAlchemy-style URI, config.py a plain path
+    if uri.startswith('sqlite:///'):
+        uri = uri[len('sqlite:///'):]
+    return uri if os.path.isabs(uri) else os.path.join(BASE_DIR, uri)
+
+
+DB_PATH = _resolve_db_path(getattr(Config, 'DATABASE_URI', os.path.join(BASE_DIR, 'instance', 'app.db')))
+
+# Applied to every new connection. WAL lets readers run while a Celery worker writes;
+# synchronous=NORMAL is durable across application crashes in WAL mode.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -64 * 1024),  # negative = KiB, i.e. 64 MB per connection
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 10000),
+)
+STATEMENT_CACHE_SIZE = 256
+POOL_SIZE = getattr(Config, 'DB_POOL_SIZE', 16)
+
+BUSY_RETRIES = metrics.counter('sqlite_busy_retries_total', 'Statements retried after SQLITE_BUSY / database is locked')
+LOCK_WAIT_SECONDS = metrics.histogram('sqlite_lock_wait_seconds', 'Time spent backing off on a locked database')
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Connection owned by the current request (flask.g) or thread.
+    close() is a no-op so existing open/close call sites keep working;
+    the owner hands it back to the pool with release_connection().
+    """
+
+    def close(self):
+        pass
+
+    def close_for_real(self):
+        super().close()
+
+
+class ConnectionPool:
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                               factory=PooledConnection, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS:
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def acquire(self):
+        if self.pid != os.getpid():
+            # Forked child (Celery prefork, multiprocessing): never reuse the parent's handles
+            self.pid = os.getpid()
+            self._idle = queue.LifoQueue(maxsize=self.size)
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close_for_real()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close_for_real()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_thread_state = threading.local()
+
+
+def get_pool(path=None):
+    path = path or DB_PATH
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
 
 def get_db_connection():
-    # Ensure instance directory exists
-    instance_dir = os.path.dirname(DB_PATH)
-    if not os.path.exists(instance_dir):
-        os.makedirs(instance_dir)
+    """
+    Return the pooled connection for the current Flask request, or for the
+    current thread outside a request (Celery tasks, scripts).
+    """
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None or g.get('_db_path') != DB_PATH:
+            conn = g._db_conn = get_pool().acquire()
+            g._db_path = DB_PATH
+        return conn
 
-    conn = sqlite3.connect(DB_PATH, timeout=10, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
+    conn = getattr(_thread_state, 'conn', None)
+    if conn is None or _thread_state.path != DB_PATH or _thread_state.pid != os.getpid():
+        conn = _thread_state.conn = get_pool().acquire()
+        _thread_state.path = DB_PATH
+        _thread_state.pid = os.getpid()
     return conn
 
+
+def release_connection(exception=None):
+    """Return the request's connection to the pool (Flask teardown)."""
+    conn = g.pop('_db_conn', None)
+    path = g.pop('_db_path', None)
+    if conn is not None:
+        get_pool(path).release(conn)
+
+
+def release_thread_connection():
+    """Return the current thread's connection to the pool (end of a Celery task)."""
+    conn = getattr(_thread_state, 'conn', None)
+    if conn is not None and _thread_state.pid == os.getpid():
+        get_pool(_thread_state.path).release(conn)
+    _thread_state.conn = None
+
+
+def init_app(app):
+    app.teardown_appcontext(release_connection)
+
+
+class TransientDBError(Exception):
+    """SQLite reported the database busy or locked; the whole operation can be retried."""
+
+
+def _is_busy_error(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+@contextmanager
+def busy_as_transient():
+    """Re-raise busy/locked OperationalErrors as TransientDBError; other errors pass through."""
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if _is_busy_error(e):
+            raise TransientDBError(str(e)) from e
+        raise
+
+
+def run_with_retry(fn, *args, retries=5, base_delay=0.05, **kwargs):
+    """
+    Call fn, retrying with exponential backoff and jitter while SQLite reports
+    the database as locked. busy_timeout already waits inside SQLite; this
+    covers the cases where SQLite returns SQLITE_BUSY immediately (e.g. a
+    read transaction upgrading to a write under WAL).
+
+    fn shares the request's (or thread's) pooled connection. Only a
+    transaction fn itself opened is rolled back before a retry; when the
+    caller already had one open, the error is raised so the caller's
+    uncommitted writes are never discarded behind its back.
+    """
+    conn = get_db_connection()
+    for attempt in range(retries + 1):
+        callers_transaction = conn.in_transaction
+        try:
+            return fn(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if attempt == retries or not _is_busy_error(e) or callers_transaction:
+                raise
+            if conn.in_transaction:
+                conn.rollback()
+            delay = base_delay * (2 ** attempt) * (0.5 + random.random())
+            BUSY_RETRIES.inc()
+            LOCK_WAIT_SECONDS.observe(delay)
+            time.sleep(delay)
+
+
+def retry_on_busy(fn):
+    """
+    Decorator form of run_with_retry for write helpers that own their transaction.
+    When the caller passes conn=..., the write is part of the caller's transaction
+    and is not retried on its own.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if kwargs.get('conn') is not None:
+            return fn(*args, **kwargs)
+        return run_with_retry(fn, *args, **kwargs)
+    return wrapper
+
 def init_db():
+    """Create or upgrade the schema to the latest migration."""
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT CHECK(role IN ('admin', 'hr', 'finance')) NOT NULL
-        )
-    ''')
-
-    # documents table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS documents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            original_filename TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            file_type TEXT NOT NULL,
-            upload_date DATETIME NOT NULL,
-            uploaded_by INTEGER NOT NULL,
-            category TEXT,
-            title TEXT,
-            author TEXT,
-            date_created TEXT,
-            summary TEXT,
-            FOREIGN KEY(uploaded_by) REFERENCES users(id)
-        )
-    ''')
-
-    # After updating the documents table
-    
-
-    # access_logs table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS access_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            document_id INTEGER,
-            action TEXT CHECK(action IN ('view', 'download', 'search')),
-            timestamp DATETIME NOT NULL,
-            FOREIGN KEY(user_id) REFERENCES users(id),
-            FOREIGN KEY(document_id) REFERENCES documents(id)
-        )
-    ''')
-
-    conn.commit()
+    migrations.migrate(conn)
     conn.close()
@@ -0,0 +1,130 @@
+# modules/document_listing.py
+"""
+Dashboard listing with keyset (seek) pagination on (upload_date, id).
+
+Pages are fetched with "WHERE (upload_date, id) < (?, ?) ORDER BY upload_date
+DESC, id DESC LIMIT n", which the documents(upload_date) and
+documents(category, upload_date) indexes answer without sorting or skipping
+rows, so page 1000 costs the same as page 1. Only the narrow listing
+columns are selected; summaries and text stay out of the listing.
+"""
+import base64
+import heapq
+from datetime import datetime
+from modules import database
+
+LISTING_COLUMNS = 'id, title, filename, category, author, upload_date'
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just after row."""
+    raw = f"{row['upload_date']}|{row['id']}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(token):
+    """(upload_date, id) from a cursor; raises ValueError on a malformed token."""
+    try:
+        upload_date, doc_id = base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return upload_date, int(doc_id)
+    except Exception:
+        raise ValueError("Invalid page cursor")
+
+
+def month_range(month):
+    """'YYYY-MM' -> (start, end) upload_date bounds; raises ValueError if malformed."""
+    start = datetime.strptime(month, '%Y-%m')
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return str(start), str(end)
+
+
+def _page_query(category, after, month, limit):
+    clauses, params = [], []
+    if category is not None:
+        clauses.append('category = ?')
+        params.append(category)
+    if month:
+        start, end = month_range(month)
+        clauses.append('upload_date >= ? AND upload_date < ?')
+        params.extend((start, end))
+    if after:
+        clauses.append('(upload_date, id) < (?, ?)')
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    sql = f'SELECT {LISTING_COLUMNS} FROM documents {where} ORDER BY upload_date DESC, id DESC LIMIT ?'
+    return sql, params + [limit]
+
+
+def list_documents(categories=None, cursor=None, month=None, limit=PAGE_SIZE):
+    """
+    One page of documents, newest first.
+    categories=None lists everything; otherwise only those categories.
+    Returns (rows, next_cursor), next_cursor is None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+
+    conn = database.get_db_connection()
+    if categories is None:
+        rows = conn.execute(*_page_query(None, after, month, limit + 1)).fetchall()
+    else:
+        # One index seek per category, merged here: "category IN (...)" would
+        # read every matching row into a temp b-tree to sort it
+        per_category = [conn.execute(*_page_query(category, after, month, limit + 1)).fetchall()
+                        for category in categories]
+        rows = list(heapq.merge(*per_category, key=lambda r: (r['upload_date'], r['id']), reverse=True))[:limit + 1]
+    conn.close()
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def facet_counts(category_filter=None):
+    """
+    Document counts per category and per upload month, for the dashboard filters.
+    category_filter is an authz.CategoryFilter (None counts everything).
+    Both are answered from covering index scans, never from the table rows.
+    """
+    conn = database.get_db_connection()
+    if category_filter is None or category_filter.unrestricted:
+        category_where, params = '', ()
+    else:
+        sql, params = category_filter.where()
+        category_where = f'WHERE {sql}'
+
+    by_category = conn.execute(f'''
+        SELECT category, COUNT(*) AS count FROM documents {category_where}
+        GROUP BY category ORDER BY count DESC
+    ''', params).fetchall()
+    by_month = conn.execute(f'''
+        SELECT substr(upload_date, 1, 7) AS month, COUNT(*) AS count FROM documents {category_where}
+        GROUP BY month ORDER BY month DESC
+    ''', params).fetchall()
+    conn.close()
+    return {
+        'categories': [(row['category'], row['count']) for row in by_category],
+        'months': [(row['month'], row['count']) for row in by_month],
+    }
+
+
+def find_by_hash(content_hash, category_filter=None, user_id=None):
+    """
+    Id of a document with this content hash that the user may see: its
+    category passes category_filter (an authz.CategoryFilter; None sees
+    everything) or user_id uploaded it. None when there is none.
+    """
+    sql, params = 'SELECT id FROM documents WHERE content_hash = ?', (content_hash,)
+    if category_filter is not None and not category_filter.unrestricted:
+        category_sql, category_params = category_filter.where()
+        sql += f' AND ({category_sql} OR uploaded_by = ?)'
+        params += (*category_params, user_id)
+    conn = database.get_db_connection()
+    row = conn.execute(sql, params).fetchone()
+    conn.close()
+    return row['id'] if row else None
+
+
+def row_to_dict(row):
+    return {column: row[column] for column in row.keys()}
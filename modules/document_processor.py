@@ -1,68 +1,103 @@
-import os
 import re
 import random
+import logging
+import time
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
-import numpy as np
-import fitz  # PyMuPDF for PDFs
-import docx  # python-docx for DOCX docs
+from config import Config
+import threading
+from modules import summarizer, metrics, centroid_classifier, classifier_registry
+from modules.text_extraction import extract_text
+
+logger = logging.getLogger(__name__)
+
+MODEL_LOAD_SECONDS = metrics.gauge('model_load_seconds', 'Time taken to load each model in this process',
+                                   labelnames=('model',))
+MODEL_LOADED = metrics.gauge('model_loaded', '1 if the model is loaded in this process, 0 if loading failed',
+                             labelnames=('model',))
+
+
+def _record_load(model, started, loaded):
+    MODEL_LOAD_SECONDS.labels(model=model).set(time.perf_counter() - started)
+    MODEL_LOADED.labels(model=model).set(1 if loaded else 0)
+
 
 # NLP libraries with graceful fallbacks
+_started = time.perf_counter()
 try:
     import spacy
     nlp = spacy.load('en_core_web_sm')
 except (ImportError, OSError):
     nlp = None
-
-try:
-    import nltk
-    nltk.data.find('tokenizers/punkt')
-except (ImportError, LookupError):
-    nltk = None
+_record_load('spacy', _started, nlp is not None)
 
 # --- Document Processing Functions ---
 
-def extract_text(file_path, file_type):
-    """Extract text from PDF, DOCX, or TXT files."""
-    text = ""
-    file_type = file_type.lower()
-    if file_type == 'pdf':
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                text += page.get_text()
-    elif file_type == 'docx':
-        doc = docx.Document(file_path)
-        paragraphs = [para.text for para in doc.paragraphs]
-        text = "\n".join(paragraphs)
-    elif file_type == 'txt':
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-    else:
-        raise ValueError(f"Unsupported file_type: {file_type}")
-    return text
+# extract_text lives in modules.text_extraction and is re-exported here
 
 # Load your fine-tuned model and tokenizer once globally
-MODEL_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'models', 'finetuned_classifier')
+MODEL_DIR = classifier_registry.MODEL_DIR
 LABEL_LIST = ['Finance', 'HR', 'Legal', 'Technical']  # Broad categories (update as per your labels)
 
-try:
-    tokenizer_cls = AutoTokenizer.from_pretrained(MODEL_DIR)
-    model_cls = AutoModelForSequenceClassification.from_pretrained(MODEL_DIR)
-    model_cls.eval()
-except Exception:
-    tokenizer_cls = None
-    model_cls = None
+
+def _load_classifier():
+    """(tokenizer, model, version) of the published classifier; None for both when it cannot load."""
+    version = classifier_registry.current_version()
+    path = classifier_registry.current_dir()
+    started = time.perf_counter()
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        model = AutoModelForSequenceClassification.from_pretrained(path)
+        model.eval()
+    except Exception as e:
+        logger.warning("Classifier failed to load from %s: %s", path, e)
+        tokenizer, model = None, None
+    _record_load('classifier', started, model is not None)
+    return tokenizer, model, version
+
+
+tokenizer_cls, model_cls, classifier_version = _load_classifier()
+_classifier_stamp = classifier_registry.pointer_stamp()
+_classifier_lock = threading.Lock()
+
+
+def reload_classifier_if_published():
+    """
+    Swap in a newly published classifier version (see
+    modules/classifier_registry.py). Costs one stat() when nothing changed;
+    a version that fails to load leaves the current model in place.
+    """
+    global tokenizer_cls, model_cls, classifier_version, _classifier_stamp
+    stamp = classifier_registry.pointer_stamp()
+    if stamp == _classifier_stamp:
+        return False
+    with _classifier_lock:
+        if stamp == _classifier_stamp:
+            return False
+        _classifier_stamp = stamp
+        tokenizer, model, version = _load_classifier()
+        if model is None:
+            return False
+        tokenizer_cls, model_cls, classifier_version = tokenizer, model, version
+    logger.info("Switched to classifier version %s", version)
+    return True
 
 def classify_document(text):
     """Classify text into broad categories using fine-tuned transformer."""
-    if not tokenizer_cls or not model_cls:
-        return random.choice(LABEL_LIST)
-    inputs = tokenizer_cls(text, return_tensors='pt', truncation=True, max_length=512)
+    return classify_documents([text])[0]
+
+def classify_documents(texts):
+    """Classify a batch of texts in one forward pass, padded to the longest text."""
+    reload_classifier_if_published()
+    tokenizer, model = tokenizer_cls, model_cls
+    if not tokenizer or not model:
+        return [random.choice(LABEL_LIST) for _ in texts]
+    inputs = tokenizer(list(texts), return_tensors='pt', truncation=True, max_length=512, padding=True)
     with torch.no_grad():
-        outputs = model_cls(**inputs)
+        outputs = model(**inputs)
     logits = outputs.logits
-    pred = torch.argmax(logits, dim=1).item()
-    return LABEL_LIST[pred]
+    preds = torch.argmax(logits, dim=1).tolist()
+    return [LABEL_LIST[pred] for pred in preds]
 
 # Map broad categories to detailed ones (update with your taxonomy)
 BROAD_TO_DETAILED = {
@@ -72,70 +107,177 @@ BROAD_TO_DETAILED = {
     'Technical': 'Technical_Manual',
 }
 
-def classify_document_detailed(text):
-    """Returns detailed category by first classifying into broad then mapping."""
+def classify_document_detailed(text, embedding=None):
+    """
+    Returns detailed category by first classifying into broad then mapping.
+    Given the document embedding, a confident centroid classifier answers
+    instead and the transformer does not run.
+    """
+    if embedding is not None:
+        category = centroid_classifier.classify(embedding)
+        if category:
+            return category
     broad_cat = classify_document(text)
     detailed_cat = BROAD_TO_DETAILED.get(broad_cat, 'Non_Relevant')
     return detailed_cat
 
+def normalize_category(cat):
+    if not cat:
+        return None
+    # Replace underscores with spaces and capitalize each word
+    return ' '.join(word.capitalize() for word in cat.strip().replace('_', ' ').split())
+
 # Initialize NER pipeline with fallback and safe exception handling
 ner_pipeline = None
+_started = time.perf_counter()
 try:
     ner_pipeline = pipeline('token-classification', model='dslim/bert-base-NER', aggregation_strategy="simple")
 except Exception as e:
     ner_pipeline = None
-    print(f"NER pipeline failed to load: {e}")
+    logger.warning("NER pipeline failed to load: %s", e)
+_record_load('ner', _started, ner_pipeline is not None)
 
-def extract_metadata(text):
-    global ner_pipeline  # <-- Must be first line inside the function
+# --- Metadata Extraction ---
 
+# Characters of each document scanned for title, author and entities
+METADATA_CHAR_BUDGET = getattr(Config, 'METADATA_CHAR_BUDGET', 20000)
+# Chunk size fed to the transformer NER model (stays under its 512-token window)
+NER_CHUNK_CHARS = getattr(Config, 'NER_CHUNK_CHARS', 2000)
+NER_BATCH_SIZE = getattr(Config, 'NER_BATCH_SIZE', 16)
+
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+AUTHOR_PATTERNS = [
+    re.compile(r'Author:\s*(.+)', re.IGNORECASE),
+    re.compile(r'By:\s*(.+)', re.IGNORECASE),
+    re.compile(r'([\w\.-]+@[\w\.-]+\.\w+)', re.IGNORECASE),
+]
+DATE_PATTERNS = [
+    re.compile(r'(\d{4}-\d{2}-\d{2})'),
+    re.compile(r'(\d{2}/\d{2}/\d{4})'),
+    re.compile(r'(\d{1,2} [A-Za-z]+ \d{4})'),
+    re.compile(r'([A-Za-z]+ \d{1,2}, \d{4})'),
+]
+EMAIL_RE = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
+# dslim/bert-base-NER uses CoNLL labels; spaCy already uses PERSON/ORG/MONEY
+NER_LABEL_MAP = {'PER': 'PERSON', 'PERSON': 'PERSON', 'ORG': 'ORG', 'MONEY': 'MONEY'}
+
+def _empty_entities():
+    return {'PERSON': [], 'ORG': [], 'MONEY': []}
+
+def _add_entity(entities, label, word):
+    label = NER_LABEL_MAP.get(label)
+    word = (word or '').strip()
+    if label and word and word not in entities[label]:
+        entities[label].append(word)
+
+def _chunk_text(text, chunk_chars=NER_CHUNK_CHARS):
+    """Split text into chunks of at most chunk_chars, preferring whitespace boundaries."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            split_at = text.rfind(' ', start, end)
+            if split_at > start:
+                end = split_at
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
+    return chunks
+
+def extract_entities_batch(texts, char_budget=METADATA_CHAR_BUDGET):
     """
-    Extract metadata including title, author, date, and key entities.
-    Uses transformer NER if available, spaCy fallback, and regex as last resort.
+    Run the transformer NER pipeline over a batch of texts.
+    Each text is cut to char_budget and split into model-sized chunks; chunks
+    from every text go through the pipeline together, then are regrouped.
+    Returns one {'PERSON': [...], 'ORG': [...], 'MONEY': [...]} dict per text,
+    or None per text when the pipeline is unavailable.
     """
+    if not ner_pipeline:
+        return [None for _ in texts]
+
+    chunks, owners = [], []
+    for i, text in enumerate(texts):
+        for chunk in _chunk_text((text or '')[:char_budget]):
+            chunks.append(chunk)
+            owners.append(i)
+
+    all_entities = [_empty_entities() for _ in texts]
+    if not chunks:
+        return all_entities
+    batch_results = ner_pipeline(chunks, batch_size=NER_BATCH_SIZE)
+    for owner, ner_res in zip(owners, batch_results):
+        for ent in ner_res:
+            _add_entity(all_entities[owner], ent.get('entity_group'), ent.get('word'))
+    return all_entities
+
+def _spacy_entities_batch(texts, char_budget=METADATA_CHAR_BUDGET):
+    """spaCy fallback: only the ner component runs, over at most char_budget chars per text."""
+    all_entities = [_empty_entities() for _ in texts]
+    other_pipes = [name for name in nlp.pipe_names if name != 'ner']
+    docs = nlp.pipe(((text or '')[:char_budget] for text in texts), batch_size=NER_BATCH_SIZE, disable=other_pipes)
+    for entities, doc in zip(all_entities, docs):
+        for ent in doc.ents:
+            _add_entity(entities, ent.label_, ent.text)
+    return all_entities
+
+def _regex_entities(text):
+    entities = _empty_entities()
+    entities['PERSON'].extend(list(set(EMAIL_RE.findall(text))))
+    return entities
+
+def _extract_fields(text, char_budget=METADATA_CHAR_BUDGET):
+    """Title, author and date from precompiled patterns over the budgeted prefix."""
+    window = text[:char_budget].strip()
+
     # Title extraction: first sufficiently long sentence or first line
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-    title = next((s for s in sentences if len(s.split()) > 5 and s.endswith('.')), text.strip().split('\n')[0])
+    sentences = SENTENCE_SPLIT_RE.split(window)
+    title = next((s for s in sentences if len(s.split()) > 5 and s.endswith('.')), window.split('\n')[0])
 
     # Author extraction heuristics
     author = None
-    for pattern in [r'Author:\s*(.+)', r'By:\s*(.+)', r'([\w\.-]+@[\w\.-]+\.\w+)']:
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in AUTHOR_PATTERNS:
+        match = pattern.search(window)
         if match:
             author = match.group(1) if match.lastindex else match.group(0)
             break
 
     # Date extraction with common date patterns from first 200 chars
     date_created = None
-    for pat in [r'(\d{4}-\d{2}-\d{2})', r'(\d{2}/\d{2}/\d{4})', r'(\d{1,2} [A-Za-z]+ \d{4})', r'([A-Za-z]+ \d{1,2}, \d{4})']:
-        m = re.search(pat, text[:200])
+    for pattern in DATE_PATTERNS:
+        m = pattern.search(text, 0, 200)
         if m:
             date_created = m.group(1)
             break
 
-    # Entities extraction with NER pipeline or spaCy fallback
-    entities = {'PERSON': [], 'ORG': [], 'MONEY': []}
+    return title, author, date_created
+
+def extract_metadata_batch(texts, char_budget=METADATA_CHAR_BUDGET):
+    """
+    Extract metadata for many documents in one call (bulk ingestion).
+    Entities come from batched transformer NER, a ner-only spaCy pass, or
+    regex as last resort.
+    """
+    global ner_pipeline
 
+    texts = [text or '' for text in texts]
+    entities_list = None
     if ner_pipeline:
         try:
-            ner_res = ner_pipeline(text[:5000])
-            for ent in ner_res:
-                label = ent.get('entity_group')
-                word = ent.get('word', '').strip()
-                if label in entities and word and word not in entities[label]:
-                    entities[label].append(word)
+            entities_list = extract_entities_batch(texts, char_budget)
         except Exception:
-            ner_pipeline = None  # assign after global declared at top
+            ner_pipeline = None  # fall through to spaCy / regex from now on
 
-    if not ner_pipeline and nlp:
-        doc = nlp(text)
-        for ent in doc.ents:
-            if ent.label_ in entities and ent.text not in entities[ent.label_]:
-                entities[ent.label_].append(ent.text)
-    elif not ner_pipeline:
-        emails = re.findall(r'[\w\.-]+@[\w\.-]+\.\w+', text)
-        entities['PERSON'].extend(list(set(emails)))
+    if entities_list is None and nlp:
+        entities_list = _spacy_entities_batch(texts, char_budget)
+    elif entities_list is None:
+        entities_list = [_regex_entities(text[:char_budget]) for text in texts]
+
+    return [_metadata_dict(text, entities, char_budget) for text, entities in zip(texts, entities_list)]
 
+def _metadata_dict(text, entities, char_budget=METADATA_CHAR_BUDGET):
+    title, author, date_created = _extract_fields(text, char_budget)
     return {
         'title': title,
         'author': author or '',
@@ -143,65 +285,81 @@ def extract_metadata(text):
         'entities': entities
     }
 
+def extract_metadata(text, entities=None):
+    """
+    Extract metadata including title, author, date, and key entities.
+    Uses transformer NER if available, spaCy fallback, and regex as last resort.
+    Pass precomputed transformer entities (e.g. from a batched NER call) to skip the pipeline.
+    """
+    if entities is not None:
+        return _metadata_dict(text or '', entities)
+    return extract_metadata_batch([text])[0]
+
+
 
+# --- Summarization ---
+
+# 'abstractive' (BART, extractive fallback), 'tfidf' or 'textrank'
+SUMMARY_MODES = ('abstractive',) + summarizer.METHODS
+SUMMARY_MODE = getattr(Config, 'SUMMARY_MODE', 'abstractive')
+
+_summarizer_pipelines = {}
+
+def get_summarizer_pipeline(model_name):
+    """Load the summarization pipeline once per process instead of on every call."""
+    if model_name not in _summarizer_pipelines:
+        started = time.perf_counter()
+        try:
+            _summarizer_pipelines[model_name] = pipeline('summarization', model=model_name)
+        except Exception as e:
+            # Remember the failure so every call does not retry the download
+            logger.warning("Summarization pipeline failed to load: %s", e)
+            _summarizer_pipelines[model_name] = None
+        _record_load('summarizer', started, _summarizer_pipelines[model_name] is not None)
+    return _summarizer_pipelines[model_name]
 
 # Abstractive summary generation using Hugging Face BART or fallback
 def generate_abstractive_summary(text, model_name='facebook/bart-large-cnn', max_length=130, min_length=30):
     try:
-        summarizer = pipeline('summarization', model=model_name)
-        summary = summarizer(text, max_length=max_length, min_length=min_length, do_sample=False)
+        summarizer_pipeline = get_summarizer_pipeline(model_name)
+        if summarizer_pipeline is None:
+            return generate_summary(text)
+        summary = summarizer_pipeline(text, max_length=max_length, min_length=min_length, do_sample=False)
         return summary[0]['summary_text']
     except Exception:
         return generate_summary(text)
 
 # Extractive summary fallback for robustness
-def generate_summary(text, num_sentences=3):
-    if nltk:
-        sentences = nltk.sent_tokenize(text)
-    else:
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-
-    if len(sentences) <= num_sentences:
-        return ' '.join(sentences)
+def generate_summary(text, num_sentences=3, method='tfidf'):
+    return summarizer.extractive_summary(text, num_sentences=num_sentences, method=method)
 
-    try:
-        from collections import Counter
-        import string
-        from nltk.corpus import stopwords
-        stop_words = set(stopwords.words('english'))
-    except:
-        stop_words = {'the', 'and', 'to', 'of', 'a', 'in', 'is', 'it'}
-
-    words = re.findall(r'\w+', text.lower())
-    words_filtered = [w for w in words if w not in stop_words]
-    freq = Counter(words_filtered)
-
-    top_n = max(1, int(len(freq) * 0.1)) if freq else 1
-    important_words = set([w for w, _ in freq.most_common(top_n)])
-
-    def sentence_score(sentence):
-        sentence_words = re.findall(r'\w+', sentence.lower())
-        if not sentence_words:
-            return 0
-        imp_count = sum(1 for w in sentence_words if w in important_words)
-        return imp_count / len(sentence_words)
-
-    scored = [(s, sentence_score(s)) for s in sentences]
-    scored.sort(key=lambda x: x[1], reverse=True)
-    top_sentences = [s for s, _ in scored[:num_sentences]]
-    top_sentences_sorted = sorted(top_sentences, key=lambda s: text.find(s))
-    return ' '.join(top_sentences_sorted)
+def summarize(text, mode=None):
+    """Summarize text with the configured (or given) summary mode."""
+    mode = mode or SUMMARY_MODE
+    if mode not in SUMMARY_MODES:
+        raise ValueError(f"Unsupported summary mode: {mode}")
+    if mode == 'abstractive':
+        return generate_abstractive_summary(text)
+    return generate_summary(text, method=mode)
 
 
 # Wrapper: Full processing pipeline for a document file
 def process_document_file(file_path, file_type):
     text = extract_text(file_path, file_type)
-    category = classify_document_detailed(text)
+    embedding = model_version = None
+    if centroid_classifier.active_model() is not None:
+        # Encoded once here for classification; the caller stores it for indexing
+        from modules import inference_broker, semantic_search
+        model_version = semantic_search.get_model_version()
+        embedding = inference_broker.encode(text, model_version)
+    category = classify_document_detailed(text, embedding)
     metadata = extract_metadata(text)
-    summary = generate_abstractive_summary(text)
+    summary = summarize(text)
     return {
         'text': text,
         'category': category,
         'metadata': metadata,
         'summary': summary,
+        'embedding': embedding,
+        'embedding_model_version': model_version,
     }
@@ -0,0 +1,57 @@
+# modules/health.py
+"""
+Readiness for /status: the database answers, the models this process
+serves with are loaded and the FAISS index has been read. Without
+fine-tuned weights the classifier falls back to a placeholder label, which
+counts as ready unless Config.READINESS_REQUIRE_CLASSIFIER is set. warm_up() loads
+the lazily created pieces in the background so a fresh web process turns
+ready without waiting for its first search.
+"""
+import logging
+import os
+import sys
+import threading
+from config import Config
+from modules import database
+
+logger = logging.getLogger(__name__)
+
+
+def _database_ok():
+    try:
+        conn = database.get_db_connection()
+        conn.execute('SELECT 1').fetchone()
+        conn.close()
+        return True
+    except Exception:
+        return False
+
+
+def readiness():
+    """(ready, checks) where checks maps each component to True/False."""
+    processor = sys.modules.get('modules.document_processor')
+    search = sys.modules.get('modules.semantic_search')
+    checks = {
+        'database': _database_ok(),
+        'classifier': processor is not None and (processor.model_cls is not None or
+                                                 not getattr(Config, 'READINESS_REQUIRE_CLASSIFIER', False)),
+        'embedding_model': search is not None and bool(search._embedding_models),
+        # An empty deployment has no index file yet; that is ready, not missing
+        'index': search is not None and (search.index_loaded() or
+                                         not os.path.exists(search.active_generation()['index_path'])),
+    }
+    return all(checks.values()), checks
+
+
+def warm_up():
+    """Load the embedding model and the FAISS index in a background thread."""
+    def run():
+        from modules import semantic_search
+        try:
+            semantic_search.get_embedding_model()
+            semantic_search.load_index()
+        except Exception:
+            logger.exception("Warm-up failed")
+    thread = threading.Thread(target=run, name='warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,227 @@
+# modules/inference_broker.py
+"""
+In-worker micro-batching for model inference.
+
+Concurrent callers (Celery worker threads, Flask request threads) submit
+single items; a background thread per model collects up to max_batch_size
+items or waits at most max_wait_ms, runs them as one padded batch and hands
+each caller its own result. Run Celery with a threaded pool
+(`celery -A celery_worker worker --pool threads`) so tasks share one broker.
+FAISS index additions are batched the same way, so concurrent index tasks
+share one rewrite of the index files instead of one each.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from config import Config
+from modules import metrics, profiling
+
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    'inference_queue_wait_seconds', 'Time an item waited in the batching queue', labelnames=('model',),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+BATCH_SIZE = metrics.histogram(
+    'inference_batch_size', 'Number of items per executed batch', labelnames=('model',),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BATCH_SECONDS = metrics.histogram(
+    'inference_batch_seconds', 'Model execution time per batch', labelnames=('model',))
+
+# Used when a model has no entry in Config.INFERENCE_BATCHING; timeout_seconds
+# bounds how long a caller waits for its result
+DEFAULT_BATCHING = {'max_batch_size': 16, 'max_wait_ms': 10, 'max_queue_size': 1024, 'timeout_seconds': 300}
+
+
+class MicroBatcher:
+    """
+    Collects single-item requests into batches for batch_fn.
+    batch_fn takes a list of items and returns a list of results in the same order.
+    Every submitted future is resolved: with its result, with batch_fn's
+    error, or with a RuntimeError when batch_fn returns the wrong number of
+    results or the batching thread stops.
+    """
+
+    def __init__(self, name, batch_fn, max_batch_size=16, max_wait_ms=10, max_queue_size=1024,
+                 timeout_seconds=None):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.timeout = timeout_seconds
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so a prefork child starts its own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f'inference-{self.name}', daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """Queue one item; returns a Future resolved with its result."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout=timeout if timeout is not None else self.timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _fail(batch, error):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _run(self):
+        batch = []
+        try:
+            while True:
+                batch = self._collect()
+                self._run_batch(batch)
+        finally:
+            # Only reached when the thread dies; nobody would resolve these otherwise
+            error = RuntimeError(f"Inference broker {self.name} stopped")
+            self._fail(batch, error)
+            while True:
+                try:
+                    self._fail([self._queue.get_nowait()], error)
+                except queue.Empty:
+                    break
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            QUEUE_WAIT_SECONDS.labels(model=self.name).observe(started - enqueued)
+        BATCH_SIZE.labels(model=self.name).observe(len(batch))
+
+        items = [item for item, _, _ in batch]
+        try:
+            with profiling.thread_profiled():
+                results = list(self.batch_fn(items))
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        finally:
+            BATCH_SECONDS.labels(model=self.name).observe(time.perf_counter() - started)
+
+        if len(results) != len(batch):
+            self._fail(batch, RuntimeError(
+                f"Inference broker {self.name}: {len(results)} results for a batch of {len(batch)}"))
+            return
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def _batch_settings(name):
+    settings = dict(DEFAULT_BATCHING)
+    settings.update(getattr(Config, 'INFERENCE_BATCHING', {}).get(name, {}))
+    return settings
+
+
+def get_broker(name, batch_fn):
+    """Return the process-wide batcher for a model, creating it on first use."""
+    broker = _brokers.get(name)
+    if broker is None:
+        with _brokers_lock:
+            broker = _brokers.get(name)
+            if broker is None:
+                broker = _brokers[name] = MicroBatcher(name, batch_fn, **_batch_settings(name))
+    return broker
+
+
+def _classify_batch(texts):
+    from modules import document_processor
+    return document_processor.classify_documents(texts)
+
+
+def _ner_batch(texts):
+    from modules import document_processor
+    return document_processor.extract_entities_batch(texts)
+
+
+def _encode_batch(items):
+    # Items are (text, model_version); a batch straddling a generation
+    # switch is encoded once per model
+    from modules import semantic_search
+    results = [None] * len(items)
+    for model_version in {version for _, version in items}:
+        rows = [i for i, (_, version) in enumerate(items) if version == model_version]
+        model = semantic_search.get_embedding_model(model_version)
+        matrix = semantic_search.generate_embeddings([items[i][0] for i in rows], model, batch_size=len(rows))
+        for i, vector in zip(rows, matrix):
+            results[i] = vector
+    return results
+
+
+def _index_batch(items):
+    # Items are (document_id, embedding, generation); one index write per
+    # generation in the batch
+    import numpy as np
+    from modules import semantic_search
+    groups = {}
+    for document_id, embedding, generation in items:
+        _, document_ids, vectors = groups.setdefault(generation['index_path'], (generation, [], []))
+        document_ids.append(document_id)
+        vectors.append(embedding)
+    for generation, document_ids, vectors in groups.values():
+        semantic_search.add_to_index(document_ids, np.stack(vectors), generation=generation)
+    return [None] * len(items)
+
+
+def classify(text):
+    """Broad category label for one text, batched with concurrent callers."""
+    return get_broker('classifier', _classify_batch)(text)
+
+
+def ner(text):
+    """Entity dict ({'PERSON': [...], 'ORG': [...], 'MONEY': [...]}) for one text."""
+    return get_broker('ner', _ner_batch)(text)
+
+
+def encode(text, model_version=None):
+    """float32 embedding for one text, by the active generation's model unless model_version is given."""
+    from modules import semantic_search
+    return get_broker('embedding', _encode_batch)((text, model_version or semantic_search.get_model_version()))
+
+
+def add_to_index(document_id, embedding, generation=None):
+    """Add one vector to the FAISS index of a generation (the active one by default), batched with concurrent callers."""
+    from modules import semantic_search
+    return get_broker('index', _index_batch)((document_id, embedding, generation or semantic_search.active_generation()))
+
+
+def stats():
+    """Queue-wait and batch-size histograms per model, for status pages."""
+    return {
+        metric: {labels[0]: value for labels, value in histogram.snapshot().items()}
+        for metric, histogram in (('queue_wait_seconds', QUEUE_WAIT_SECONDS),
+                                  ('batch_size', BATCH_SIZE),
+                                  ('batch_seconds', BATCH_SECONDS))
+    }
@@ -0,0 +1,410 @@
+# modules/metrics.py
+"""
+In-process metrics in the Prometheus text format.
+
+Each process keeps its own REGISTRY. Worker processes (Celery children and
+the process task backend) also write their samples to <pid>.json in a
+shared directory (Config.METRICS_DIR) every few seconds and when they exit;
+render_merged() adds every file to the web process's own samples, so
+/metrics shows the pipeline stages that ran in the workers. Counters and
+histograms are summed across processes, gauges are reported per process
+with a pid label (those of processes that have exited are dropped). Clear
+the directory when deploying, as prometheus_client's multiprocess mode does.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def _default(self):
+        # Unlabelled metrics use a single child with an empty key
+        return self.labels()
+
+    def _label_str(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def collect(self):
+        with self._lock:
+            children = list(self._children.items())
+        return [f'{self.name}{self._label_str(key)} {child.value}' for key, child in children]
+
+    def snapshot(self):
+        with self._lock:
+            return {key: child.value for key, child in self._children.items()}
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        # Evaluated lazily at scrape time so hot paths pay nothing
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return float('nan')
+        return self.value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def collect(self):
+        with self._lock:
+            children = list(self._children.items())
+        return [f'{self.name}{self._label_str(key)} {child.get()}' for key, child in children]
+
+    def snapshot(self):
+        with self._lock:
+            return {key: child.get() for key, child in self._children.items()}
+
+
+class _Timer:
+    """Context manager observing the elapsed seconds into a histogram child."""
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def collect(self):
+        with self._lock:
+            children = list(self._children.items())
+        lines = []
+        for key, child in children:
+            with child._lock:
+                counts = list(child.counts)
+                total, count = child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{self._label_str(key, ("le", le))} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_str(key)} {total}')
+            lines.append(f'{self.name}_count{self._label_str(key)} {count}')
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            children = list(self._children.items())
+        result = {}
+        for key, child in children:
+            with child._lock:
+                result[key] = {
+                    'buckets': dict(zip([repr(b) for b in self.buckets] + ['+Inf'], child.counts)),
+                    'sum': child.sum,
+                    'count': child.count,
+                }
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, documentation, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames=labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames=labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames=labelnames, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def dump(self):
+        """Every metric's definition and samples as JSON-serialisable data."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        data = {}
+        for metric in metrics:
+            entry = {'kind': metric.kind, 'documentation': metric.documentation,
+                     'labelnames': list(metric.labelnames)}
+            if isinstance(metric, Histogram):
+                entry['buckets'] = list(metric.buckets)
+                with metric._lock:
+                    children = list(metric._children.items())
+                samples = []
+                for key, child in children:
+                    with child._lock:
+                        samples.append([list(key), {'counts': list(child.counts), 'sum': child.sum,
+                                                    'count': child.count}])
+                entry['samples'] = samples
+            else:
+                entry['samples'] = [[list(key), value] for key, value in metric.snapshot().items()]
+            data[metric.name] = entry
+        return data
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+def hit_ratio(counter, hit='hit', miss='miss'):
+    """
+    Function for Gauge.set_function: hits / (hits + misses) of a counter whose
+    first label is the outcome, computed at scrape time.
+    """
+    def ratio():
+        values = {key[0]: value for key, value in counter.snapshot().items()}
+        total = values.get(hit, 0) + values.get(miss, 0)
+        return values.get(hit, 0) / total if total else float('nan')
+    return ratio
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _load(merged, data, pid=None):
+    """Add one process's dump to merged; gauges get a pid label."""
+    for name, entry in data.items():
+        labelnames = tuple(entry['labelnames'])
+        if entry['kind'] == 'counter':
+            metric = merged.counter(name, entry['documentation'], labelnames)
+            for key, value in entry['samples']:
+                metric.labels(**dict(zip(labelnames, key))).inc(value)
+        elif entry['kind'] == 'histogram':
+            metric = merged.histogram(name, entry['documentation'], labelnames, entry['buckets'])
+            if list(metric.buckets) != list(entry['buckets']):
+                continue
+            for key, value in entry['samples']:
+                child = metric.labels(**dict(zip(labelnames, key)))
+                with child._lock:
+                    child.counts = [a + b for a, b in zip(child.counts, value['counts'])]
+                    child.sum += value['sum']
+                    child.count += value['count']
+        elif entry['kind'] == 'gauge' and pid is not None:
+            metric = merged.gauge(name, entry['documentation'], labelnames + ('pid',))
+            for key, value in entry['samples']:
+                metric.labels(pid=pid, **dict(zip(labelnames, key))).set(value)
+
+
+def read_samples(directory):
+    """{pid: dump} of every process that exported into directory."""
+    result = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return result
+    for filename in names:
+        pid, ext = os.path.splitext(filename)
+        if ext != '.json' or not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                result[int(pid)] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return result
+
+
+def render_merged(directory, registry=None):
+    """registry's own metrics plus every other process's samples in directory, rendered."""
+    registry = registry or REGISTRY
+    if not directory:
+        return registry.render()
+    merged = Registry()
+    own_pid = os.getpid()
+    _load(merged, registry.dump(), own_pid)
+    for pid, data in sorted(read_samples(directory).items()):
+        if pid == own_pid:
+            continue
+        if not _process_alive(pid):
+            # Totals of exited processes still count; their gauges no longer mean anything
+            data = {name: entry for name, entry in data.items() if entry['kind'] != 'gauge'}
+        _load(merged, data, pid)
+    return merged.render()
+
+
+def write_samples(directory, registry=None):
+    """Write this process's samples to directory/<pid>.json (atomically)."""
+    registry = registry or REGISTRY
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry.dump(), f)
+    os.replace(tmp_path, path)
+
+
+_exporter = {'pid': None, 'directory': None, 'registry': None}
+
+
+def flush():
+    """Write this process's samples now, if start_exporter() ran in it."""
+    if _exporter['pid'] != os.getpid():
+        return
+    try:
+        write_samples(_exporter['directory'], _exporter['registry'])
+    except OSError:
+        pass
+
+
+def start_exporter(directory, interval=5.0, registry=None):
+    """
+    Write this process's samples to directory every interval seconds and at
+    exit. Call once per process, after a fork (the thread does not survive it);
+    pool processes that leave without atexit handlers should call flush().
+    """
+    if not directory or _exporter['pid'] == os.getpid():
+        return
+    _exporter.update(pid=os.getpid(), directory=directory, registry=registry)
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            flush()
+
+    threading.Thread(target=loop, name='metrics-exporter', daemon=True).start()
+    atexit.register(flush)
+
+
+# Process-wide default registry
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
@@ -0,0 +1,270 @@
+# modules/migrations.py
+"""
+Versioned schema migrations tracked with PRAGMA user_version.
+
+Each migration runs once, in order, inside a BEGIN IMMEDIATE transaction, so
+a web process and a Celery worker starting at the same time cannot apply the
+same step twice. Add new steps to the end of MIGRATIONS; never edit or
+reorder a step that has shipped.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _ensure_column(cursor, table, column, definition):
+    # SQLite has no ADD COLUMN IF NOT EXISTS
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in {row['name'] for row in cursor.fetchall()}:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _base_schema(cursor):
+    # IF NOT EXISTS: databases created before migrations existed start at user_version 0
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT CHECK(role IN ('admin', 'hr', 'finance')) NOT NULL
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            original_filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            upload_date DATETIME NOT NULL,
+            uploaded_by INTEGER NOT NULL,
+            category TEXT,
+            title TEXT,
+            author TEXT,
+            date_created TEXT,
+            summary TEXT,
+            FOREIGN KEY(uploaded_by) REFERENCES users(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS access_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            document_id INTEGER,
+            action TEXT CHECK(action IN ('view', 'download', 'search')),
+            timestamp DATETIME NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(document_id) REFERENCES documents(id)
+        )
+    ''')
+
+
+def _content_and_embeddings(cursor):
+    # extracted text, zlib-compressed, so downstream jobs never re-parse files
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_content (
+            document_id INTEGER PRIMARY KEY,
+            text_z BLOB NOT NULL,
+            char_count INTEGER NOT NULL,
+            extracted_at DATETIME NOT NULL,
+            FOREIGN KEY(document_id) REFERENCES documents(id)
+        )
+    ''')
+
+    # float32 embeddings keyed by document and embedding model version
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_embeddings (
+            document_id INTEGER NOT NULL,
+            model_version TEXT NOT NULL,
+            dimension INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            created_at DATETIME NOT NULL,
+            PRIMARY KEY(document_id, model_version),
+            FOREIGN KEY(document_id) REFERENCES documents(id)
+        )
+    ''')
+
+
+def _content_hash(cursor):
+    _ensure_column(cursor, 'documents', 'content_hash', 'TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash)')
+
+
+def _document_corrections(cursor):
+    # Previously created by app.py at startup
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_corrections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER,
+            old_category TEXT,
+            corrected_category TEXT,
+            corrected_by INTEGER,
+            correction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _hot_query_indexes(cursor):
+    # /dashboard: filter by category, newest first (and the admin listing without a filter)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_category_upload_date ON documents(category, upload_date DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_upload_date ON documents(upload_date DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_uploaded_by ON documents(uploaded_by)')
+    # correction history per document
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_document_corrections_document ON document_corrections(document_id, correction_date)')
+    # audit queries: a user's activity over time, and who touched a document
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_user_timestamp ON access_logs(user_id, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_document ON access_logs(document_id)')
+    # load_embeddings() reads one model version in document order; the primary key leads with document_id
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_document_embeddings_model ON document_embeddings(model_version, document_id)')
+
+
+def _keyset_listing_indexes(cursor):
+    # The dashboard pages on ORDER BY upload_date DESC, id DESC. An ascending index
+    # walked backwards yields exactly that order (the rowid suffix descends too),
+    # while the DESC indexes from version 5 needed a sort for the id tie-break.
+    # Version 5 has shipped, so its indexes are replaced here rather than edited there.
+    cursor.execute('DROP INDEX IF EXISTS idx_documents_category_upload_date')
+    cursor.execute('DROP INDEX IF EXISTS idx_documents_upload_date')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_category_upload ON documents(category, upload_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_upload ON documents(upload_date)')
+
+
+# Summaries longer than this (DOCX uploads used to store their full text as the
+# summary) are re-summarized during the move to document_summaries
+SUMMARY_BACKFILL_MAX_CHARS = 2000
+
+
+def _summaries_side_table(cursor):
+    # Summaries move out of documents so listing and search pages, which read
+    # many rows, stay small. documents.summary is kept (always NULL) so older
+    # SQLite versions without DROP COLUMN can run this.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_summaries (
+            document_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            FOREIGN KEY(document_id) REFERENCES documents(id)
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO document_summaries (document_id, summary)
+        SELECT id, summary FROM documents WHERE summary IS NOT NULL AND length(summary) <= ?
+    ''', (SUMMARY_BACKFILL_MAX_CHARS,))
+
+    cursor.execute('SELECT id, summary FROM documents WHERE length(summary) > ?', (SUMMARY_BACKFILL_MAX_CHARS,))
+    oversized = cursor.fetchall()
+    if oversized:
+        from modules.summarizer import extractive_summary
+        cursor.executemany('INSERT OR IGNORE INTO document_summaries (document_id, summary) VALUES (?, ?)',
+                           [(row['id'], extractive_summary(row['summary'], 3, 'tfidf')) for row in oversized])
+    cursor.execute('UPDATE documents SET summary = NULL WHERE summary IS NOT NULL')
+
+
+def _access_log_actions(cursor):
+    # SQLite cannot alter a CHECK constraint, so the table is rebuilt: the old
+    # constraint rejected the 'process' events written by the Celery task
+    cursor.execute('''
+        CREATE TABLE access_logs_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            document_id INTEGER,
+            action TEXT CHECK(action IN ('view', 'download', 'search', 'list', 'upload', 'process')) NOT NULL,
+            timestamp DATETIME NOT NULL,
+            detail TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(document_id) REFERENCES documents(id)
+        )
+    ''')
+    # The old column allowed NULL; every row is audit history, so those are kept as views
+    cursor.execute('SELECT COUNT(*) FROM access_logs WHERE action IS NULL')
+    without_action = cursor.fetchone()[0]
+    cursor.execute('''
+        INSERT INTO access_logs_new (id, user_id, document_id, action, timestamp)
+        SELECT id, user_id, document_id, COALESCE(action, 'view'), timestamp FROM access_logs
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM access_logs_new')
+    logger.info("Copied %d access log rows (%d without an action, recorded as 'view')",
+                cursor.fetchone()[0], without_action)
+    cursor.execute('DROP TABLE access_logs')
+    cursor.execute('ALTER TABLE access_logs_new RENAME TO access_logs')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_user_timestamp ON access_logs(user_id, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_document_timestamp ON access_logs(document_id, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_logs_timestamp ON access_logs(timestamp)')
+
+
+def _document_stages(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_stages (
+            document_id INTEGER NOT NULL,
+            stage TEXT NOT NULL,
+            status TEXT CHECK(status IN ('running', 'done', 'failed')) NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at DATETIME NOT NULL,
+            PRIMARY KEY(document_id, stage),
+            FOREIGN KEY(document_id) REFERENCES documents(id)
+        )
+    ''')
+    # Work already persisted before stages were tracked counts as done
+    for stage, where in (
+        ('extract', 'id IN (SELECT document_id FROM document_content)'),
+        ('classify', 'category IS NOT NULL'),
+        ('summarize', 'id IN (SELECT document_id FROM document_summaries)'),
+        ('index', 'id IN (SELECT document_id FROM document_embeddings)'),
+    ):
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO document_stages (document_id, stage, status, attempts, updated_at)
+            SELECT id, ?, 'done', 0, CURRENT_TIMESTAMP FROM documents WHERE {where}
+        ''', (stage,))
+
+
+# (version, description, function); user_version is the last applied version
+MIGRATIONS = [
+    (1, 'base schema', _base_schema),
+    (2, 'document content and embeddings', _content_and_embeddings),
+    (3, 'documents.content_hash', _content_hash),
+    (4, 'document_corrections', _document_corrections),
+    (5, 'indexes for dashboard, corrections, access logs and embeddings', _hot_query_indexes),
+    (6, 'ascending listing indexes for keyset pagination', _keyset_listing_indexes),
+    (7, 'move summaries to document_summaries', _summaries_side_table),
+    (8, 'access_logs actions and detail column', _access_log_actions),
+    (9, 'document_stages processing status', _document_stages),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """
+    Apply every migration newer than the database's user_version, up to target.
+    Returns the list of versions applied.
+    """
+    if get_schema_version(conn) >= target:
+        return []
+
+    applied = []
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        # Re-read under the write lock: another process may have migrated meanwhile
+        current = get_schema_version(conn)
+        for version, description, function in MIGRATIONS:
+            if current < version <= target:
+                function(cursor)
+                cursor.execute(f'PRAGMA user_version = {int(version)}')
+                applied.append(version)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if applied:
+        # Refresh planner statistics for the new indexes
+        conn.execute('PRAGMA optimize')
+        logger.info("Applied schema migrations: %s", ', '.join(f'{v} ({d})' for v, d, _ in MIGRATIONS if v in applied))
+    return applied
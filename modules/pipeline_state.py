@@ -0,0 +1,98 @@
+# modules/pipeline_state.py
+"""
+Per-document status of each processing stage (document_stages table).
+
+A stage is marked running when a task starts it, done once its output is
+persisted and failed (with the error) when an attempt raises. Tasks skip
+stages that are already done, so a retried or re-queued chain only redoes
+the missing work.
+"""
+from datetime import datetime
+from modules import database
+
+STAGE_NAMES = ('extract', 'classify', 'summarize', 'index')
+STATUSES = ('running', 'done', 'failed')
+
+# Longest error message kept per stage
+ERROR_MAX_CHARS = 500
+
+
+@database.retry_on_busy
+def _set_status(document_id, stage, status, error=None, started=False, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = database.get_db_connection()
+    conn.execute('''
+        INSERT INTO document_stages (document_id, stage, status, attempts, error, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(document_id, stage) DO UPDATE SET
+            status = excluded.status,
+            attempts = attempts + excluded.attempts,
+            error = excluded.error,
+            updated_at = excluded.updated_at
+    ''', (document_id, stage, status, 1 if started else 0,
+          (error or '')[:ERROR_MAX_CHARS] or None, datetime.now()))
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+
+def mark_started(document_id, stage, conn=None):
+    _set_status(document_id, stage, 'running', started=True, conn=conn)
+
+
+def mark_done(document_id, stage, conn=None):
+    _set_status(document_id, stage, 'done', conn=conn)
+
+
+def mark_failed(document_id, stage, error, conn=None):
+    _set_status(document_id, stage, 'failed', error=f"{type(error).__name__}: {error}", conn=conn)
+
+
+@database.retry_on_busy
+def mark_stages_done(document_ids, stages, conn=None):
+    """Mark stages done for many documents at once, e.g. work done in the upload request or a bulk ingest."""
+    now = datetime.now()
+    own_conn = conn is None
+    if own_conn:
+        conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT OR REPLACE INTO document_stages (document_id, stage, status, attempts, error, updated_at)
+        VALUES (?, ?, 'done', 1, NULL, ?)
+    ''', [(doc_id, stage, now) for doc_id in document_ids for stage in stages])
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+
+def is_done(document_id, stage):
+    conn = database.get_db_connection()
+    row = conn.execute('SELECT status FROM document_stages WHERE document_id = ? AND stage = ?',
+                       (document_id, stage)).fetchone()
+    conn.close()
+    return row is not None and row['status'] == 'done'
+
+
+def stage_statuses(document_id):
+    """{stage: row} with status, attempts, error and updated_at for one document."""
+    conn = database.get_db_connection()
+    rows = conn.execute('SELECT * FROM document_stages WHERE document_id = ?', (document_id,)).fetchall()
+    conn.close()
+    return {row['stage']: row for row in rows}
+
+
+def incomplete_documents(stage='index', limit=None):
+    """Ids of documents whose given stage (by default the last one) is not done, oldest first."""
+    conn = database.get_db_connection()
+    rows = conn.execute(f'''
+        SELECT d.id FROM documents d
+        LEFT JOIN document_stages s ON s.document_id = d.id AND s.stage = ?
+        WHERE s.status IS NULL OR s.status != 'done'
+        ORDER BY d.id {'LIMIT ?' if limit else ''}
+    ''', (stage, limit) if limit else (stage,)).fetchall()
+    conn.close()
+    return [row['id'] for row in rows]
+
+
+def clear(document_id, conn):
+    conn.execute('DELETE FROM document_stages WHERE document_id = ?', (document_id,))
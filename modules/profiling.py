@@ -0,0 +1,258 @@
+# modules/profiling.py
+"""
+Opt-in cProfile runs for /search, /upload and the pipeline stages.
+
+A request is profiled when an admin sends the X-Profile header or it falls
+in the Config.PROFILE_SAMPLE_RATE sample; pipeline stages use the same rate.
+Each run keeps its top PROFILE_TOP_N functions by own time (with cumulative
+time, so a slow faiss.read_index, model.encode or PyMuPDF call stands out)
+as one JSON file in PROFILE_DIR, of which the newest PROFILE_KEEP are kept.
+/admin/profiles lists the slowest of them.
+
+Only one run is profiled at a time: the profiler hooks are process-wide on
+newer Pythons, and a request that arrives while another is being profiled
+simply runs unprofiled. Up to Python 3.11 cProfile only sees the thread
+that enabled it, so the inference broker threads, which run the model for
+the profiled request, profile their batches with thread_profiled() into the
+active run while it lasts.
+"""
+import cProfile
+import glob
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from config import Config
+from modules import metrics, structured_logging
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+PROFILES = metrics.counter('profiles_recorded_total', 'Profiled runs saved by kind', labelnames=('kind',))
+
+_active = threading.Lock()
+# The run holding _active, for thread_profiled()
+_current = {'run': None}
+
+
+def sampled():
+    rate = getattr(Config, 'PROFILE_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def _profile_dir():
+    return getattr(Config, 'PROFILE_DIR', None) or os.path.join(os.path.dirname(Config.LOG_FILE), 'profiles')
+
+
+def _short_path(filename):
+    # site-packages/faiss/__init__.py rather than the full interpreter path
+    for marker in ('site-packages' + os.sep, 'dist-packages' + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.relpath(filename, root) if filename.startswith(root) else filename
+
+
+def top_frames(profiler, limit=None, others=()):
+    """The hottest functions of a finished profile (merged with others) as dicts, by own time."""
+    stats = pstats.Stats(profiler, *others).stats
+    frames = []
+    for (filename, line, function), (_, calls, tottime, cumtime, _) in stats.items():
+        frames.append({
+            'function': function,
+            'file': _short_path(filename),
+            'line': line,
+            'calls': calls,
+            'own_seconds': round(tottime, 6),
+            'cumulative_seconds': round(cumtime, 6),
+        })
+    frames.sort(key=lambda frame: frame['own_seconds'], reverse=True)
+    return frames[:limit or getattr(Config, 'PROFILE_TOP_N', 25)]
+
+
+def _prune(directory):
+    keep = getattr(Config, 'PROFILE_KEEP', 200)
+    paths = sorted(glob.glob(os.path.join(directory, '*.json')), key=os.path.getmtime)
+    for path in paths[:-keep] if keep else paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def save(kind, name, seconds, frames, **details):
+    directory = _profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    record = {
+        'id': profile_id,
+        'kind': kind,
+        'name': name,
+        'request_id': structured_logging.get_request_id(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'seconds': round(seconds, 6),
+        'frames': frames,
+    }
+    record.update(details)
+    tmp_path = os.path.join(directory, f'.{profile_id}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, os.path.join(directory, f'{profile_id}.json'))
+    PROFILES.labels(kind=kind).inc()
+    _prune(directory)
+    return profile_id
+
+
+class Run:
+    """One profiled run; start() returns False when another run holds the profiler."""
+
+    def __init__(self, kind, name, **details):
+        self.kind, self.name, self.details = kind, name, details
+        self._profiler = None
+        self._started = None
+        self._lock = threading.Lock()
+        self._thread_profiles = []
+
+    def start(self):
+        if not _active.acquire(blocking=False):
+            return False
+        try:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        except ValueError:
+            # Another profiling tool (a debugger, an outer cProfile) is active
+            self._profiler = None
+            _active.release()
+            return False
+        self._started = time.perf_counter()
+        _current['run'] = self
+        return True
+
+    def add_thread_profile(self, profiler):
+        with self._lock:
+            if self._profiler is not None:
+                self._thread_profiles.append(profiler)
+
+    def stop(self, **details):
+        if self._profiler is None:
+            return None
+        seconds = time.perf_counter() - self._started
+        self._profiler.disable()
+        _current['run'] = None
+        with self._lock:
+            profiler, self._profiler = self._profiler, None
+            others, self._thread_profiles = self._thread_profiles, []
+        _active.release()
+        try:
+            self.details.update(details, other_threads=len(others))
+            return save(self.kind, self.name, seconds, top_frames(profiler, others=others), **self.details)
+        except Exception:
+            logger.exception("Saving %s profile failed", self.kind)
+            return None
+
+
+@contextmanager
+def profiled(kind, name, enabled=True, **details):
+    """Profile the block when enabled and the profiler is free."""
+    run = Run(kind, name, **details)
+    started = enabled and run.start()
+    try:
+        yield run
+    finally:
+        if started:
+            run.stop()
+
+
+@contextmanager
+def thread_profiled():
+    """
+    Profile the block into the active run, for threads doing its work (the
+    inference broker). A no-op without a run, and from Python 3.12 on, where
+    the run's profiler already sees every thread.
+    """
+    run = _current['run']
+    if run is None or sys.version_info >= (3, 12):
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        run.add_thread_profile(profiler)
+
+
+def recent(limit=50, kind=None):
+    """Saved profiles, slowest first, without their frames."""
+    summaries = []
+    for path in glob.glob(os.path.join(_profile_dir(), '*.json')):
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if kind and record.get('kind') != kind:
+            continue
+        record['top'] = record['frames'][:3]
+        del record['frames']
+        summaries.append(record)
+    summaries.sort(key=lambda record: record['seconds'], reverse=True)
+    return summaries[:limit]
+
+
+def load(profile_id):
+    """One saved profile with its frames, or None."""
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    try:
+        with open(os.path.join(_profile_dir(), f'{profile_id}.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def init_app(app, endpoints=('search', 'upload')):
+    """Profile POSTs to the given endpoints on an admin's header or by sampling."""
+    from flask import g, request, session
+    from modules import authz
+
+    @app.before_request
+    def _start_profile():
+        if request.method != 'POST' or request.endpoint not in endpoints:
+            return
+        requested = bool(request.headers.get(PROFILE_HEADER)) and authz.is_admin(session.get('user_id'))
+        if not (requested or sampled()):
+            return
+        run = Run('request', request.endpoint, method=request.method, path=request.path,
+                  user_id=session.get('user_id'), requested=requested)
+        if run.start():
+            g._profile_run = run
+
+    @app.after_request
+    def _stop_profile(response):
+        run = g.pop('_profile_run', None)
+        if run is not None:
+            profile_id = run.stop(status=response.status_code)
+            if profile_id:
+                response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @app.teardown_request
+    def _release_profile(exc=None):
+        # after_request does not run when the view raised
+        run = g.pop('_profile_run', None)
+        if run is not None:
+            run.stop(status=500)
@@ -0,0 +1,214 @@
+# modules/reembedding.py
+"""
+Blue-green re-embedding: build a new index generation with another
+embedding model while the active one keeps serving, then switch over.
+
+begin() records a shadow generation in index_generations.json; fill()
+encodes every document that is not yet in it (reusing vectors already
+stored for the target model) and appends them, a page at a time, pausing
+while the processing pipeline has a backlog and never exceeding the given
+rate, so uploads keep their CPU. switch() makes the shadow generation the
+active one with a single atomic replace of the manifest: every process
+encodes queries with the new model and searches the new index from its
+next search on. Documents indexed into the old generation while the switch
+happened are caught up by a final fill() of the new active generation.
+
+The previous generation's files are kept, so rollback() can switch back;
+it then back-fills the restored generation with the documents indexed
+while it was retired. Run with scripts/reembed_corpus.py.
+"""
+import copy
+import logging
+import os
+import time
+from datetime import datetime
+import numpy as np
+from modules import database, content_store, pipeline_state, semantic_search
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 256
+# Time for in-flight index tasks to finish against the old generation before the final catch-up
+SETTLE_SECONDS = 5.0
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _manifest():
+    """The manifest to modify; before the first run, the legacy index becomes generation 0."""
+    data = semantic_search.read_generations()
+    if data:
+        # read_generations() hands out its cached copy
+        return copy.deepcopy(data)
+    active = semantic_search.legacy_generation()
+    index, _ = semantic_search.load_index(generation=semantic_search.resolve_generation(active))
+    active.update(dimension=index.d if index is not None else None, activated_at=None)
+    return {'active': active, 'shadow': None, 'retired': [], 'next_id': 1}
+
+
+def _remove_files(generation):
+    for path in (generation['index_path'], generation['id_map_path'], f"{generation['index_path']}.lock"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def begin(model_version):
+    """
+    The shadow generation for model_version, resuming one already being
+    built; a shadow for another model is discarded.
+    """
+    data = _manifest()
+    shadow = data.get('shadow')
+    if shadow and shadow['model_version'] == model_version:
+        return semantic_search.resolve_generation(shadow)
+    if shadow:
+        logger.info("Discarding shadow generation %s (%s)", shadow['id'], shadow['model_version'])
+        _remove_files(semantic_search.resolve_generation(shadow))
+    generation_id = data['next_id']
+    base, ext = os.path.splitext(os.path.basename(semantic_search.FAISS_INDEX_PATH))
+    map_base, map_ext = os.path.splitext(os.path.basename(semantic_search.IDX_MAP_PATH))
+    data['shadow'] = {
+        'id': generation_id,
+        'model_version': model_version,
+        'dimension': None,
+        'index_file': f'{base}.g{generation_id}{ext}',
+        'id_map_file': f'{map_base}.g{generation_id}{map_ext}',
+        'started_at': _now(),
+        'vectors': 0,
+    }
+    data['next_id'] = generation_id + 1
+    semantic_search.write_generations(data)
+    logger.info("Started shadow generation %s for %s", generation_id, model_version)
+    return semantic_search.resolve_generation(data['shadow'])
+
+
+def _pending_ids(indexed, after_id):
+    """Next page of document ids not in indexed, and the id to continue after."""
+    conn = database.get_db_connection()
+    ids = []
+    while len(ids) < PAGE_SIZE:
+        rows = conn.execute('SELECT id FROM documents WHERE id > ? ORDER BY id LIMIT ?',
+                            (after_id, PAGE_SIZE)).fetchall()
+        if not rows:
+            break
+        after_id = rows[-1]['id']
+        ids.extend(row['id'] for row in rows if row['id'] not in indexed)
+    conn.close()
+    return ids, after_id
+
+
+def _vectors(document_ids, model_version):
+    """(ids, matrix) for the documents, reusing stored vectors and encoding (and storing) the rest."""
+    vectors = content_store.get_embeddings(document_ids, model_version)
+    missing = [doc_id for doc_id in document_ids if doc_id not in vectors]
+    if missing:
+        texts = dict(content_store.iter_document_texts(missing))
+        without_text = [doc_id for doc_id in missing if not texts.get(doc_id)]
+        if without_text:
+            texts.update(content_store.get_document_summaries(without_text))
+        to_encode = [doc_id for doc_id in missing if texts.get(doc_id)]
+        if to_encode:
+            model = semantic_search.get_embedding_model(model_version)
+            matrix = semantic_search.generate_embeddings([texts[doc_id] for doc_id in to_encode], model,
+                                                         batch_size=PAGE_SIZE)
+            content_store.save_embeddings(to_encode, model_version, matrix)
+            vectors.update(zip(to_encode, matrix))
+    kept = [doc_id for doc_id in document_ids if doc_id in vectors]
+    return kept, np.vstack([vectors[doc_id] for doc_id in kept]) if kept else None
+
+
+def wait_for_pipeline(max_backlog, poll_seconds=5.0):
+    """Block while more than max_backlog documents are waiting to be indexed."""
+    if max_backlog is None:
+        return
+    while len(pipeline_state.incomplete_documents('index', limit=max_backlog + 1)) > max_backlog:
+        time.sleep(poll_seconds)
+
+
+def fill(generation, docs_per_second=None, max_backlog=None, progress=None):
+    """
+    Add every document missing from the generation's index, a page at a
+    time, at most docs_per_second and only while the pipeline backlog is at
+    most max_backlog. Returns the number of documents added.
+    """
+    added, after_id = 0, 0
+    indexed = semantic_search.indexed_document_ids(generation)
+    while True:
+        wait_for_pipeline(max_backlog)
+        started = time.perf_counter()
+        document_ids, after_id = _pending_ids(indexed, after_id)
+        if not document_ids:
+            return added
+        kept, matrix = _vectors(document_ids, generation['model_version'])
+        if kept:
+            added += semantic_search.add_to_index(kept, matrix, generation=generation)
+            indexed.update(kept)
+        if progress:
+            progress(added)
+        if docs_per_second:
+            time.sleep(max(0.0, len(document_ids) / docs_per_second - (time.perf_counter() - started)))
+
+
+def _record_vectors(data, key, generation):
+    index, id_map = semantic_search.load_index(generation=generation)
+    if index is not None:
+        data[key].update(dimension=index.d, vectors=len(id_map))
+
+
+def update_progress(generation):
+    """Write the shadow generation's dimension and vector count to the manifest."""
+    data = _manifest()
+    if data.get('shadow') and data['shadow']['id'] == generation['id']:
+        _record_vectors(data, 'shadow', generation)
+        data['shadow']['updated_at'] = _now()
+        semantic_search.write_generations(data)
+
+
+def switch():
+    """Make the shadow generation the active one. Returns the new active generation."""
+    data = _manifest()
+    shadow = data.get('shadow')
+    if not shadow:
+        raise RuntimeError("No shadow generation to switch to")
+    _record_vectors(data, 'shadow', semantic_search.resolve_generation(shadow))
+    data['retired'] = data.get('retired', []) + [dict(data['active'], retired_at=_now())]
+    data['active'] = dict(shadow, activated_at=_now())
+    data['shadow'] = None
+    semantic_search.write_generations(data)
+    logger.info("Switched search to generation %s (%s)", shadow['id'], shadow['model_version'])
+    return semantic_search.resolve_generation(data['active'])
+
+
+def rollback(docs_per_second=None, max_backlog=None):
+    """
+    Make the most recently retired generation active again and fill in the
+    documents uploaded since it was retired. Returns it.
+    """
+    data = _manifest()
+    if not data.get('retired'):
+        raise RuntimeError("No earlier generation to roll back to")
+    previous = data['retired'].pop()
+    previous.pop('retired_at', None)
+    data['retired'].append(dict(data['active'], retired_at=_now()))
+    data['active'] = dict(previous, activated_at=_now())
+    semantic_search.write_generations(data)
+    logger.info("Rolled search back to generation %s (%s)", previous['id'], previous['model_version'])
+    generation = semantic_search.resolve_generation(data['active'])
+    # Index tasks may still be writing to the generation just retired
+    time.sleep(SETTLE_SECONDS)
+    added = fill(generation, docs_per_second, max_backlog)
+    logger.info("Back-filled %s documents into generation %s", added, previous['id'])
+    return generation
+
+
+def prune_retired(keep=1):
+    """Delete the index files of all but the newest keep retired generations."""
+    data = _manifest()
+    retired = data.get('retired', [])
+    drop, data['retired'] = retired[:max(0, len(retired) - keep)], retired[max(0, len(retired) - keep):]
+    for generation in drop:
+        _remove_files(semantic_search.resolve_generation(generation))
+    semantic_search.write_generations(data)
+    return [generation['id'] for generation in drop]
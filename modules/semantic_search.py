@@ -1,25 +1,84 @@
 import os
 import json
+import sqlite3
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 from config import Config
-import sqlite3
+from modules import database, metrics
 from collections import defaultdict
 import re
+import threading
+import logging
+import time
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 # Path to FAISS index file
 FAISS_INDEX_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'models', 'faiss_index.index')
 # Path to JSON file mapping FAISS index ids to document ids
 IDX_MAP_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'models', 'faiss_id_map.json')
+# Which index generation serves searches, next to the index files (see modules/reembedding.py)
+GENERATIONS_FILE = 'index_generations.json'
+# Downloaded embedding models are saved here, one directory per model name
+EMBEDDING_MODELS_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'models')
+# Where the single embedding model was saved before models were kept per name
+LEGACY_MODEL_PATH = os.path.join(EMBEDDING_MODELS_DIR, 'sentence_transformer_model')
+
+# Serializes read-modify-write of the index files between task threads;
+# _index_write_locked() adds a file lock for the other processes
+_index_write_lock = threading.Lock()
+
+MODEL_LOAD_SECONDS = metrics.gauge('model_load_seconds', 'Time taken to load each model in this process',
+                                   labelnames=('model',))
+MODEL_LOADED = metrics.gauge('model_loaded', '1 if the model is loaded in this process, 0 if loading failed',
+                             labelnames=('model',))
+INDEX_CACHE = metrics.counter('search_index_cache_total', 'FAISS index lookups by cache outcome', labelnames=('outcome',))
+INDEX_LOAD_SECONDS = metrics.histogram('search_index_load_seconds', 'Time to read the FAISS index and ID map from disk')
 
 
-def get_embedding_model():
+# model version -> SentenceTransformer; normally only the active generation's model
+_embedding_models = {}
+_embedding_model_lock = threading.Lock()
+
+
+def get_embedding_model(model_version=None):
+    """
+    Return the process-wide SentenceTransformer for a model version (by
+    default the one the active index generation was built with), loading it
+    on first use.
+    """
+    model_version = model_version or get_model_version()
+    model = _embedding_models.get(model_version)
+    if model is None:
+        with _embedding_model_lock:
+            model = _embedding_models.get(model_version)
+            if model is None:
+                started = time.perf_counter()
+                model = _embedding_models[model_version] = load_embedding_model(model_version)
+                MODEL_LOAD_SECONDS.labels(model='embedding').set(time.perf_counter() - started)
+                MODEL_LOADED.labels(model='embedding').set(1)
+    return model
+
+
+def _local_model_path(model_name):
+    # The legacy directory holds whatever model the index was first built with
+    if os.path.exists(LEGACY_MODEL_PATH) and model_name == _legacy_model_version():
+        return LEGACY_MODEL_PATH
+    return os.path.join(EMBEDDING_MODELS_DIR, 'sentence_transformer_' + re.sub(r'[^A-Za-z0-9._-]+', '__', model_name))
+
+
+def load_embedding_model(model_name=None):
     """
     Load or download SentenceTransformer embedding model.
     """
-    embedding_model_name = Config.EMBEDDING_MODEL_NAME
-    local_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'models', 'sentence_transformer_model')
+    embedding_model_name = model_name or Config.EMBEDDING_MODEL_NAME
+    local_path = _local_model_path(embedding_model_name)
     try:
         if os.path.exists(local_path):
             model = SentenceTransformer(local_path)
@@ -27,16 +86,113 @@ def get_embedding_model():
             model = SentenceTransformer(embedding_model_name)
             model.save(local_path)
     except Exception as e:
-        print(f"Failed to load embedding model locally: {e}. Downloading anew.")
+        logger.warning("Failed to load embedding model locally, downloading anew: %s", e)
         model = SentenceTransformer(embedding_model_name)
     return model
 
+def get_model_version():
+    """
+    Identifier stored alongside every embedding so vectors from different models never mix:
+    the model of the active index generation, which queries must be encoded with.
+    """
+    return active_generation()['model_version']
+
+
+# --- Index generations ---
+#
+# Each generation is one FAISS index plus ID map built with one embedding
+# model. index_generations.json names the active generation (and a shadow
+# one while modules/reembedding.py builds it); replacing that file switches
+# every process to the new generation on its next search. Without the file
+# the original faiss_index.index / faiss_id_map.json pair is the active
+# generation.
+
+_generations = {'key': None, 'data': None}
+_legacy_versions = {}
+
+
+def _generations_path():
+    # Resolved per call, like the index paths, so test rigs get their own
+    return os.path.join(os.path.dirname(FAISS_INDEX_PATH), GENERATIONS_FILE)
+
+
+def read_generations():
+    """The generations manifest, or None before the first re-embedding; re-read only after it changes."""
+    path = _generations_path()
+    try:
+        key = (path, _file_stamp(path))
+    except OSError:
+        return None
+    if _generations['key'] != key:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        _generations.update(key=key, data=data)
+    return _generations['data']
+
+
+def write_generations(data):
+    _write_atomic(_generations_path(), lambda path: _dump_json(data, path))
+
+
+def _legacy_model_version():
+    """
+    Model the pre-generation index was built with: the model most stored
+    vectors came from, so changing EMBEDDING_MODEL_NAME does not relabel an
+    index that was encoded with another model.
+    """
+    key = (database.DB_PATH, FAISS_INDEX_PATH)
+    if key not in _legacy_versions:
+        version = None
+        try:
+            conn = database.get_db_connection()
+            row = conn.execute('''
+                SELECT model_version FROM document_embeddings
+                GROUP BY model_version ORDER BY COUNT(*) DESC LIMIT 1
+            ''').fetchone()
+            conn.close()
+            version = row['model_version'] if row else None
+        except sqlite3.Error:
+            pass
+        _legacy_versions[key] = version or Config.EMBEDDING_MODEL_NAME
+    return _legacy_versions[key]
+
+
+def legacy_generation():
+    return {'id': 0, 'model_version': _legacy_model_version(), 'dimension': None,
+            'index_file': os.path.basename(FAISS_INDEX_PATH), 'id_map_file': os.path.basename(IDX_MAP_PATH)}
+
+
+def resolve_generation(generation):
+    directory = os.path.dirname(FAISS_INDEX_PATH)
+    return dict(generation, index_path=os.path.join(directory, generation['index_file']),
+                id_map_path=os.path.join(directory, generation['id_map_file']))
+
+
+def active_generation():
+    """The generation searches use: id, model_version, dimension, index_path and id_map_path."""
+    data = read_generations()
+    return resolve_generation(data['active'] if data and data.get('active') else legacy_generation())
+
+
+def shadow_generation():
+    """The generation being built, or None."""
+    data = read_generations()
+    return resolve_generation(data['shadow']) if data and data.get('shadow') else None
+
+
+def _paths(generation=None, index_path=None, id_map_path=None):
+    # Explicit paths win (scripts and rigs), then the given generation, then the active one
+    if index_path:
+        return index_path, id_map_path or IDX_MAP_PATH
+    generation = generation or active_generation()
+    return generation['index_path'], generation['id_map_path']
+
+
 def keyword_search(query, k=10):
     """
     Keyword search using SQLite FTS5 if available; fallback to LIKE search.
     """
-    conn = sqlite3.connect(Config.DATABASE_URI)
-    conn.row_factory = sqlite3.Row
+    conn = database.get_db_connection()
     cursor = conn.cursor()
 
     # Assuming an FTS5 virtual table called documents_fts with content from documents.title, summary, etc.
@@ -56,7 +212,9 @@ def keyword_search(query, k=10):
         # Fallback naive LIKE search (slow for large DBs)
         like_query = f'%{query}%'
         cursor.execute("""
-        SELECT * FROM documents WHERE title LIKE ? OR summary LIKE ? LIMIT ?
+        SELECT d.* FROM documents d
+        LEFT JOIN document_summaries s ON s.document_id = d.id
+        WHERE d.title LIKE ? OR s.summary LIKE ? LIMIT ?
         """, (like_query, like_query, k))
         results = cursor.fetchall()
 
@@ -80,8 +238,7 @@ def hybrid_search(query, k=5):
     # Sort by combined RRF score descending
     fused = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
     # Fetch document info for top-k
-    conn = sqlite3.connect(Config.DATABASE_URI)
-    conn.row_factory = sqlite3.Row
+    conn = database.get_db_connection()
     cursor = conn.cursor()
 
     results = []
@@ -107,75 +264,229 @@ def generate_embedding(text, model):
     return np.array(embedding).astype('float32')
 
 
-def init_faiss_index(dimension):
+def generate_embeddings(texts, model, batch_size=32):
+    """
+    Encode a list of texts in batches.
+    Return a float32 numpy array of shape (len(texts), dimension).
+    """
+    embeddings = model.encode(list(texts), batch_size=batch_size)
+    return np.asarray(embeddings, dtype='float32')
+
+
+def init_faiss_index(dimension, index_path=None, id_map_path=None):
     """
     Initialize new FAISS index with specified dimension.  
     Use IndexFlatIP for cosine similarity when embeddings normalized.
     """
+    index_path, id_map_path = _paths(index_path=index_path, id_map_path=id_map_path)
     index = faiss.IndexFlatL2(dimension)   # or faiss.IndexFlatIP(dimension) if normalized vectors
-    faiss.write_index(index, FAISS_INDEX_PATH)
-    if not os.path.exists(IDX_MAP_PATH):
-        with open(IDX_MAP_PATH, 'w') as f:
+    faiss.write_index(index, index_path)
+    if not os.path.exists(id_map_path):
+        with open(id_map_path, 'w') as f:
             json.dump({}, f)
     return index
 
 
-def update_index(document_id, embedding, index_path=FAISS_INDEX_PATH):
+def update_index(document_id, embedding, index_path=None, generation=None):
     """
     Add new embedding to FAISS index and update mapping file.
+    Does nothing if the document is already indexed.
     """
-    if not os.path.exists(index_path):
-        dimension = embedding.shape[0]
-        index = init_faiss_index(dimension)
-    else:
-        index = faiss.read_index(index_path)
+    add_to_index([document_id], np.expand_dims(embedding, axis=0), index_path=index_path, generation=generation)
 
-    # Normalize embedding if you use cosine similarity
-    # norm = np.linalg.norm(embedding)
-    # if norm > 0:
-    #     embedding = embedding / norm
 
-    index.add(np.expand_dims(embedding, axis=0))
-    faiss.write_index(index, index_path)
+@contextmanager
+def _index_write_locked(index_path):
+    """
+    Exclusive right to rewrite index_path and its ID map, across threads and
+    (through flock on a sidecar index_path.lock) across worker processes, so
+    concurrent load-add-replace cycles never drop each other's vectors.
+    """
+    with _index_write_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+        with open(f'{index_path}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _write_atomic(path, write):
+    # Readers never see a half-written file: write a sibling, then rename over
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def add_to_index(document_ids, matrix, index_path=None, generation=None):
+    """
+    Append a (n, dim) batch of embeddings to the FAISS index (of the active
+    generation unless another is given) with one read and one write.
+    Documents already in the ID map are skipped, so re-running a batch never
+    adds duplicate vectors. Returns the number of vectors added.
+    """
+    # Resolved per call so scripts and test rigs can point the module at other files
+    index_path, id_map_path = _paths(generation, index_path)
+    matrix = np.ascontiguousarray(matrix, dtype='float32')
+    if not len(document_ids):
+        return 0
+    with _index_write_locked(index_path):
+        id_map = load_id_map(id_map_path)
+        seen = set(id_map.values())
+        keep = []
+        for row, document_id in enumerate(document_ids):
+            if document_id not in seen:
+                seen.add(document_id)
+                keep.append(row)
+        if not keep:
+            return 0
+        document_ids = [document_ids[row] for row in keep]
+        matrix = matrix[keep]
+
+        if not os.path.exists(index_path):
+            dimension = matrix.shape[1]
+            index = init_faiss_index(dimension, index_path, id_map_path)
+        else:
+            index = faiss.read_index(index_path)
+        if index.d != matrix.shape[1]:
+            raise ValueError(f"{matrix.shape[1]}-d vectors do not fit the {index.d}-d index {index_path}")
+
+        # Normalize embedding if you use cosine similarity
+        # faiss.normalize_L2(matrix)
+
+        first_id = index.ntotal
+        index.add(matrix)
+        # Index before map: a crash in between leaves unmapped vectors, never
+        # map entries pointing at vectors that do not exist
+        _write_atomic(index_path, lambda path: faiss.write_index(index, path))
 
-    if os.path.exists(IDX_MAP_PATH):
-        with open(IDX_MAP_PATH, 'r') as f:
-            id_map = json.load(f)
-    else:
-        id_map = {}
+        for offset, document_id in enumerate(document_ids):
+            id_map[str(first_id + offset)] = document_id
+        _write_atomic(id_map_path, lambda path: _dump_json(id_map, path))
+    return len(document_ids)
 
-    new_id = index.ntotal - 1
-    id_map[str(new_id)] = document_id
 
-    # Consider atomic write for concurrency safety
-    with open(IDX_MAP_PATH, 'w') as f:
-        json.dump(id_map, f)
+def _dump_json(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f)
 
 
+def load_id_map(id_map_path=None):
+    id_map_path = id_map_path or active_generation()['id_map_path']
+    if os.path.exists(id_map_path):
+        with open(id_map_path, 'r') as f:
+            return json.load(f)
+    return {}
 
-def search_index(query_embedding, k=5, index_path=FAISS_INDEX_PATH):
-    if not os.path.exists(index_path) or not os.path.exists(IDX_MAP_PATH):
-        print("FAISS index or ID map file missing")
+
+def indexed_document_ids(generation=None):
+    """Set of document ids that already have a vector in the FAISS index."""
+    return set(load_id_map((generation or active_generation())['id_map_path']).values())
+
+
+def build_index(document_ids, matrix, index_path=None, generation=None):
+    """
+    Write a fresh FAISS index and ID map from a (n, dim) embedding matrix in one pass.
+    """
+    index_path, id_map_path = _paths(generation, index_path)
+    matrix = np.ascontiguousarray(matrix, dtype='float32')
+    index = faiss.IndexFlatL2(matrix.shape[1])
+    index.add(matrix)
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    id_map = {str(i): doc_id for i, doc_id in enumerate(document_ids)}
+    with _index_write_locked(index_path):
+        _write_atomic(index_path, lambda path: faiss.write_index(index, path))
+        _write_atomic(id_map_path, lambda path: _dump_json(id_map, path))
+    return index
+
+
+# The index as last read from disk: snapshot is one (key, index, id_map) tuple,
+# replaced whole so readers never pair one version's index with another's map.
+# generation counts reloads in this process
+_loaded = {'snapshot': (None, None, None), 'generation': 0}
+_index_load_lock = threading.Lock()
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_index(index_path=None, generation=None):
+    """
+    (index, id_map) for searching, or (None, None) if the files are missing.
+    The files are read again only after a writer replaced them (or another
+    generation became active), so searches cost one stat() per file instead
+    of a full read.
+    """
+    index_path, id_map_path = _paths(generation, index_path)
+    try:
+        key = (index_path, id_map_path, _file_stamp(index_path), _file_stamp(id_map_path))
+    except OSError:
+        return None, None
+    snapshot = _loaded['snapshot']
+    if snapshot[0] == key:
+        INDEX_CACHE.labels(outcome='hit').inc()
+        return snapshot[1], snapshot[2]
+    with _index_load_lock:
+        snapshot = _loaded['snapshot']
+        if snapshot[0] != key:
+            INDEX_CACHE.labels(outcome='miss').inc()
+            with INDEX_LOAD_SECONDS.time():
+                index = faiss.read_index(index_path)
+                with open(id_map_path, 'r') as f:
+                    id_map = json.load(f)
+            snapshot = _loaded['snapshot'] = (key, index, id_map)
+            _loaded['generation'] += 1
+        return snapshot[1], snapshot[2]
+
+
+def _loaded_index():
+    return _loaded['snapshot'][1]
+
+
+def index_loaded():
+    return _loaded_index() is not None
+
+
+metrics.gauge('search_index_vectors', 'Vectors in the loaded FAISS index').set_function(
+    lambda: getattr(_loaded_index(), 'ntotal', 0))
+metrics.gauge('search_index_generation', 'Times this process has loaded a new version of the FAISS index').set_function(
+    lambda: _loaded['generation'])
+metrics.gauge('cache_hit_ratio', 'Hit ratio per cache', labelnames=('cache',)).labels(cache='search_index').set_function(
+    metrics.hit_ratio(INDEX_CACHE))
+
+
+def search_index(query_embedding, k=5, index_path=None, generation=None):
+    index, id_map = load_index(index_path, generation)
+    if index is None:
+        logger.warning("FAISS index or ID map file missing")
+        return []
+    if index.d != len(query_embedding):
+        # Encoded with another model than the index was built with
+        logger.warning("Query embedding has %s dimensions, the index %s", len(query_embedding), index.d)
         return []
 
-    index = faiss.read_index(index_path)
     D, I = index.search(np.expand_dims(query_embedding, axis=0), k)
     distances = D[0]
     indices = I[0]
 
-    with open(IDX_MAP_PATH, 'r') as f:
-        id_map = json.load(f)
-
-    print(f"Loaded ID map: {id_map}")  # Debug print
-
     results = []
     for i, dist in zip(indices, distances):
+        if i < 0:
+            # FAISS pads with -1 when the index holds fewer than k vectors
+            continue
         if str(i) in id_map:
             results.append((id_map[str(i)], float(dist)))
         else:
-            print(f"FAISS index id {i} not found in ID map")
+            logger.warning("FAISS index id %s not found in ID map", i)
 
-    print(f"Search results: {results}")  # Debug print
+    logger.debug("Vector search", extra={'k': k, 'hits': len(results), 'id_map_size': len(id_map)})
     return results
 
 def keyword_filter(doc_score_list, query):
@@ -184,7 +495,7 @@ def keyword_filter(doc_score_list, query):
     for doc, score in doc_score_list:
         # Convert sqlite3.Row to dict for compatibility
         doc = dict(doc)
-        text = (doc.get('title', '') + ' ' + doc.get('summary', '')).lower()
+        text = ((doc.get('title') or '') + ' ' + (doc.get('summary') or '')).lower()
         if all(word in text for word in query_words):
             filtered.append((doc, score))
     return filtered
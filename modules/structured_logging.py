@@ -0,0 +1,191 @@
+# modules/structured_logging.py
+"""
+JSON logging that never blocks the caller on I/O.
+
+configure_logging() puts a QueueHandler on the root logger; a QueueListener
+thread formats records as one JSON object per line and writes them to stderr
+and Config.LOG_FILE (logs/app.log). Every process appends to that file and
+none rotates it: logrotate does, and WatchedFileHandler reopens the new file.
+When the queue is full the record is dropped and counted. Levels are set per logger from Config.LOG_LEVELS, and DEBUG
+records are sampled (Config.LOG_DEBUG_SAMPLE_RATE, or extra={'sample_rate': r}
+on the call) so chatty debug events cost little when DEBUG is on.
+
+Each record carries the current request id. Flask takes it from the
+X-Request-ID header or makes one; it rides along in Celery message headers
+and the local task backend's queue, so a document's upload request and its
+pipeline stages log the same id.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import traceback
+import uuid
+from datetime import datetime, timezone
+from config import Config
+from modules import metrics
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+DROPPED = metrics.counter('log_records_dropped_total', 'Log records dropped because the log queue was full')
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# LogRecord attributes that are not user-supplied extra fields
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def get_request_id():
+    return request_id_var.get()
+
+
+def set_request_id(request_id):
+    """Bind request_id to the current context; returns a token for reset_request_id."""
+    return request_id_var.set(request_id)
+
+
+def reset_request_id(token):
+    request_id_var.reset(token)
+
+
+class DebugSampler(logging.Filter):
+    """Keep a fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = getattr(record, 'sample_rate', self.rate)
+        return rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key != 'sample_rate':
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Resolve the message, traceback and request id in the calling thread;
+        # unlike the stock prepare() this keeps them as separate fields
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+_state = {'pid': None, 'listener': None}
+_lock = threading.Lock()
+
+
+def _output_handlers(config):
+    formatter = JsonFormatter()
+    handlers = [logging.StreamHandler()]
+    log_file = getattr(config, 'LOG_FILE', None)
+    if log_file:
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        # The web app and every worker process append to the same file, so none of
+        # them may rotate it; logrotate does, and each process reopens the new file
+        handlers.append(logging.handlers.WatchedFileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure_logging(config=Config):
+    """
+    Route every logger through the queue. Safe to call more than once; a
+    forked child (prefork worker) gets its own listener thread.
+    """
+    with _lock:
+        if _state['pid'] == os.getpid():
+            return _state['listener']
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        log_queue = queue.Queue(maxsize=getattr(config, 'LOG_QUEUE_SIZE', 10000))
+        queue_handler = _DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(DebugSampler(getattr(config, 'LOG_DEBUG_SAMPLE_RATE', 1.0)))
+        root.addHandler(queue_handler)
+        root.setLevel(getattr(config, 'LOG_LEVEL', 'INFO'))
+        for name, level in getattr(config, 'LOG_LEVELS', {}).items():
+            logging.getLogger(name).setLevel(level)
+
+        listener = logging.handlers.QueueListener(log_queue, *_output_handlers(config), respect_handler_level=True)
+        listener.start()
+        if _state['pid'] is None:
+            atexit.register(stop_logging)
+        _state.update(pid=os.getpid(), listener=listener)
+        return listener
+
+
+def stop_logging():
+    """Flush queued records (scripts, shutdown)."""
+    with _lock:
+        listener = _state['listener']
+        if listener is not None and _state['pid'] == os.getpid():
+            listener.stop()
+        _state.update(pid=None, listener=None)
+
+
+def init_app(app):
+    """Give every Flask request a request id, echoed back in the response header."""
+    from flask import g, request
+
+    @app.before_request
+    def _bind_request_id():
+        request_id = request.headers.get(REQUEST_ID_HEADER) or new_request_id()
+        g._request_id_token = set_request_id(request_id[:64])
+
+    @app.after_request
+    def _echo_request_id(response):
+        request_id = get_request_id()
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+    @app.teardown_request
+    def _unbind_request_id(exc=None):
+        token = g.pop('_request_id_token', None)
+        if token is not None:
+            reset_request_id(token)
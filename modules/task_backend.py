@@ -0,0 +1,279 @@
+# modules/task_backend.py
+"""
+Where queued document processing runs, selected by Config.TASK_BACKEND:
+
+    celery   the per-stage Celery chain (needs a broker, see celery_worker.py)
+    thread   a bounded in-process queue served by TASK_WORKERS threads
+    process  the same queue, each pipeline run in a process pool
+    eager    run the pipeline in the caller before returning (tests, scripts)
+
+The local backends run tasks.run_pipeline, which uses the same stage
+checkpoints and retry policy as the Celery tasks, and serve small documents
+first like the broker priorities do. When the queue is full the document is
+left unprocessed; scripts/resume_processing.py picks it up later.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from modules import database, metrics, structured_logging
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('celery', 'thread', 'process', 'eager')
+
+JOBS = metrics.counter('task_backend_jobs_total', 'Documents handled by the local task backend by outcome',
+                       labelnames=('outcome',))
+PIPELINE_SECONDS = metrics.histogram('task_backend_pipeline_seconds', 'Time to run the whole pipeline for one document',
+                                     buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+
+
+def _child_paths():
+    # Spawned children re-import the modules, so pass on paths a script or test rig changed
+    paths = {'db_path': database.DB_PATH}
+    search = sys.modules.get('modules.semantic_search')
+    if search is not None:
+        paths.update(index_path=search.FAISS_INDEX_PATH, id_map_path=search.IDX_MAP_PATH)
+    return paths
+
+
+def _init_child(paths):
+    structured_logging.configure_logging()
+    metrics.start_exporter(getattr(Config, 'METRICS_DIR', None), getattr(Config, 'METRICS_EXPORT_INTERVAL', 5.0))
+    database.DB_PATH = paths['db_path']
+    if 'index_path' in paths:
+        from modules import semantic_search
+        semantic_search.FAISS_INDEX_PATH = paths['index_path']
+        semantic_search.IDX_MAP_PATH = paths['id_map_path']
+
+
+def _run_in_child(document_id, request_id=None):
+    # Entry point in a pool process; flush what a normal exit would, since
+    # pool workers leave without running atexit handlers
+    from modules import tasks, access_log
+    token = structured_logging.set_request_id(request_id)
+    try:
+        return tasks.run_pipeline(document_id)
+    finally:
+        structured_logging.reset_request_id(token)
+        access_log.flush()
+        metrics.flush()
+        database.release_thread_connection()
+
+
+class CeleryBackend:
+    name = 'celery'
+
+    def submit(self, document_id, file_size=None):
+        from modules import tasks
+        return tasks.enqueue_chain(document_id, file_size)
+
+    def pending(self):
+        # Queue depth lives in the broker
+        return None
+
+    def join(self, timeout=None):
+        return True
+
+
+class EagerBackend:
+    name = 'eager'
+
+    def submit(self, document_id, file_size=None):
+        from modules import tasks
+        started = time.perf_counter()
+        try:
+            result = tasks.run_pipeline(document_id)
+        except Exception:
+            JOBS.labels(outcome='failed').inc()
+            logger.exception("Processing document %s failed", document_id, extra={'document_id': document_id})
+            return False
+        finally:
+            PIPELINE_SECONDS.observe(time.perf_counter() - started)
+        JOBS.labels(outcome='done' if result is not None else 'discarded').inc()
+        return True
+
+    def pending(self):
+        return 0
+
+    def join(self, timeout=None):
+        return True
+
+
+class LocalBackend:
+    """Bounded priority queue served by worker threads, optionally handing each run to a process pool."""
+
+    def __init__(self, name='thread', workers=4, queue_size=1000):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.queue_size = queue_size
+        self._queue = queue.PriorityQueue(maxsize=queue_size)
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._pool = None
+
+    def _ensure_started(self):
+        # Same fork handling as the access-log writer: a forked child starts its own threads
+        if self._threads and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._queue = queue.PriorityQueue(maxsize=self.queue_size)
+            self._pid = os.getpid()
+            if self.name == 'process':
+                # spawn: forking a process that already runs torch threads can deadlock
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_child, initargs=(_child_paths(),))
+            self._threads = [threading.Thread(target=self._run, name=f'task-backend-{i}', daemon=True)
+                             for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def submit(self, document_id, file_size=None):
+        """Queue a document; returns False if the queue is full."""
+        from modules.tasks import document_priority
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((document_priority(file_size), next(self._order), document_id,
+                                    structured_logging.get_request_id()))
+        except queue.Full:
+            JOBS.labels(outcome='rejected').inc()
+            logger.warning("Task queue full, document %s left for scripts/resume_processing.py", document_id,
+                           extra={'document_id': document_id})
+            return False
+        JOBS.labels(outcome='queued').inc()
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def join(self, timeout=None):
+        """Wait until every queued document has been processed; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _process(self, document_id, request_id):
+        if self._pool is not None:
+            return self._pool.submit(_run_in_child, document_id, request_id).result()
+        from modules import tasks
+        try:
+            return tasks.run_pipeline(document_id)
+        finally:
+            database.release_thread_connection()
+
+    def _run(self):
+        while True:
+            _, _, document_id, request_id = self._queue.get()
+            started = time.perf_counter()
+            # Log under the id of the request that queued the document
+            token = structured_logging.set_request_id(request_id)
+            try:
+                result = self._process(document_id, request_id)
+                JOBS.labels(outcome='done' if result is not None else 'discarded').inc()
+            except Exception:
+                # The failed stage and its error are in document_stages
+                JOBS.labels(outcome='failed').inc()
+                logger.exception("Processing document %s failed", document_id, extra={'document_id': document_id})
+            finally:
+                structured_logging.reset_request_id(token)
+                PIPELINE_SECONDS.observe(time.perf_counter() - started)
+                self._queue.task_done()
+
+
+def create_backend(name=None, workers=None, queue_size=None):
+    name = name or getattr(Config, 'TASK_BACKEND', 'celery')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown task backend: {name} (expected one of {', '.join(BACKENDS)})")
+    if name == 'celery':
+        return CeleryBackend()
+    if name == 'eager':
+        return EagerBackend()
+    return LocalBackend(name,
+                        workers=workers or getattr(Config, 'TASK_WORKERS', 4),
+                        queue_size=queue_size or getattr(Config, 'TASK_QUEUE_SIZE', 1000))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(name, **settings):
+    """Switch backends at runtime (benchmarks, tests); returns the new backend."""
+    global _backend
+    with _backend_lock:
+        _backend = create_backend(name, **settings)
+    return _backend
+
+
+def _queue_depth():
+    depth = get_backend().pending() if _backend is not None else 0
+    return float('nan') if depth is None else depth
+
+
+metrics.gauge('task_backend_queue_depth', 'Documents waiting in the local task backend').set_function(_queue_depth)
+
+# Broker queue lengths are read at most this often, however often /metrics is scraped
+CELERY_DEPTH_TTL = 10
+_celery_depths = {'at': None, 'depths': {}}
+_celery_depths_lock = threading.Lock()
+
+
+def celery_queue_depths():
+    """{queue: messages waiting in the broker} for the pipeline queues; empty when unreachable."""
+    with _celery_depths_lock:
+        now = time.monotonic()
+        if _celery_depths['at'] is not None and now - _celery_depths['at'] < CELERY_DEPTH_TTL:
+            return _celery_depths['depths']
+        from celery_worker import celery_app
+        depths = {}
+        try:
+            with celery_app.connection_for_read() as conn:
+                conn.ensure_connection(max_retries=1)
+                channel = conn.default_channel
+                for name in Config.CELERY_QUEUES:
+                    # Passive declare only reads the length (summed over priority levels on Redis)
+                    depths[name] = channel.queue_declare(queue=name, passive=True).message_count
+        except Exception as e:
+            logger.debug("Could not read Celery queue depths: %s", e)
+        _celery_depths.update(at=now, depths=depths)
+        return depths
+
+
+def _celery_queue_depth(name):
+    if get_backend().name != 'celery':
+        return float('nan')
+    return celery_queue_depths().get(name, float('nan'))
+
+
+_celery_depth_gauge = metrics.gauge('celery_queue_depth', 'Messages waiting in each pipeline queue on the broker',
+                                    labelnames=('queue',))
+for _name in Config.CELERY_QUEUES:
+    _celery_depth_gauge.labels(queue=_name).set_function(lambda name=_name: _celery_queue_depth(name))
+
+
+def enqueue_document(document_id, file_size=None):
+    """Queue the processing pipeline for a stored document on the configured backend."""
+    return get_backend().submit(document_id, file_size)
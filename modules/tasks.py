@@ -1,51 +1,242 @@
 # modules/tasks.py
+"""
+Document processing pipeline as chained Celery tasks, one per stage:
+
+    extract -> classify (category, role check, metadata) -> summarize -> index
+
+Each stage is routed to its own queue (see celery_worker.py) so slow stages,
+such as BART summaries of long PDFs, never hold up cheap ones. Stages pass
+the document id along the chain and read the text from the content store.
+Small documents are sent with a higher broker priority.
+
+Every stage persists its output before it is marked done in
+document_stages, and skips itself when it already is, so a retried or
+re-queued chain only redoes the missing work. Transient errors (SQLite
+busy, broker or network timeouts) are retried with exponential backoff.
+"""
+from celery import chain
 from celery_worker import celery_app
-from modules import database, document_processor, semantic_search
-from datetime import datetime
+from config import Config
+from modules import database, document_processor, semantic_search, content_store, inference_broker, access_log, authz
+from modules import pipeline_state, metrics, profiling, centroid_classifier
+import logging
+import os
+import random
+import time
 
-@celery_app.task
-def process_document_async(document_id):
+logger = logging.getLogger(__name__)
+
+SMALL_DOCUMENT_BYTES = getattr(Config, 'SMALL_DOCUMENT_BYTES', 1024 * 1024)
+# Redis priorities: 0 is served first
+SMALL_DOCUMENT_PRIORITY = 0
+LARGE_DOCUMENT_PRIORITY = 6
+
+STAGE_SECONDS = metrics.histogram('pipeline_stage_seconds', 'Duration of each processing stage by outcome',
+                                  labelnames=('stage', 'outcome'),
+                                  buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+STAGE_SKIPS = metrics.counter('pipeline_stage_skipped_total', 'Stages skipped because they were already done',
+                              labelnames=('stage',))
+
+# Only a busy database is transient; other OperationalErrors (missing table, disk I/O) are not
+TRANSIENT_ERRORS = (database.TransientDBError, ConnectionError, TimeoutError)
+# Backoff doubles from 1s up to retry_backoff_max, with jitter
+STAGE_TASK_OPTIONS = {
+    'autoretry_for': TRANSIENT_ERRORS,
+    'retry_backoff': True,
+    'retry_backoff_max': 300,
+    'retry_jitter': True,
+    'max_retries': 5,
+    # Acknowledge after the stage finishes so a worker dying mid-stage gets it redelivered
+    'acks_late': True,
+}
+
+def _discard_document(conn, doc):
+    conn.execute('DELETE FROM document_content WHERE document_id = ?', (doc['id'],))
+    conn.execute('DELETE FROM document_summaries WHERE document_id = ?', (doc['id'],))
+    conn.execute('DELETE FROM document_embeddings WHERE document_id = ?', (doc['id'],))
+    pipeline_state.clear(doc['id'], conn)
+    conn.execute('DELETE FROM documents WHERE id = ?', (doc['id'],))
+    conn.commit()
+    if os.path.exists(doc['file_path']):
+        os.remove(doc['file_path'])
+
+def _load_document(document_id):
+    if document_id is None:
+        return None
     conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM documents WHERE id = ?', (document_id,))
-    doc = cursor.fetchone()
-    if not doc:
-        conn.close()
-        return f"Document {document_id} not found."
+    doc = conn.execute('SELECT * FROM documents WHERE id = ?', (document_id,)).fetchone()
+    conn.close()
+    return doc
+
+def _stored_text(doc):
+    text = content_store.get_document_text(doc['id'])
+    if text is None:
+        text = document_processor.extract_text(doc['file_path'], doc['file_type'])
+        content_store.save_document_text(doc['id'], text)
+    return text
+
+def retry_delay(attempt):
+    """Seconds before retry number attempt + 1, the same full-jitter backoff Celery uses."""
+    return random.uniform(0, min(STAGE_TASK_OPTIONS['retry_backoff_max'], 2 ** attempt))
+
+def _run_stage(stage, document_id, work):
+    """
+    Run work(doc) for one stage unless it is already done. work returns False
+    when the document was discarded, which ends the chain. A busy database
+    surfaces as database.TransientDBError, which is retried.
+    """
+    with database.busy_as_transient():
+        doc = _load_document(document_id)
+        if not doc:
+            return None
+        if pipeline_state.is_done(document_id, stage):
+            STAGE_SKIPS.labels(stage=stage).inc()
+            return document_id
+        pipeline_state.mark_started(document_id, stage)
+        started = time.perf_counter()
+        try:
+            with profiling.profiled('pipeline', stage, enabled=profiling.sampled(), document_id=document_id):
+                keep = work(doc)
+        except Exception as e:
+            STAGE_SECONDS.labels(stage=stage, outcome='failed').observe(time.perf_counter() - started)
+            pipeline_state.mark_failed(document_id, stage, e)
+            raise
+        STAGE_SECONDS.labels(stage=stage, outcome='discarded' if keep is False else 'done').observe(
+            time.perf_counter() - started)
+        if keep is False:
+            return None
+        pipeline_state.mark_done(document_id, stage)
+        return document_id
+
+def _extract(doc):
+    # Reuse stored text when the upload path already extracted it
+    _stored_text(doc)
 
-    file_path = doc['file_path']
-    file_type = doc['file_type']
+def _embedding(doc, model_version=None):
+    # A stored vector for this model version is reused, so a retry after the
+    # embedding was saved does not encode again
+    model_version = model_version or semantic_search.get_model_version()
+    embedding = content_store.get_embedding(doc['id'], model_version)
+    if embedding is None:
+        embedding = inference_broker.encode(_stored_text(doc), model_version)
+        content_store.save_embedding(doc['id'], model_version, embedding)
+    return embedding
 
-    # Extract text
-    text = document_processor.extract_text(file_path, file_type)
+def _classify(doc):
+    document_id = doc['id']
+    text = _stored_text(doc)
 
-    # Classify document
-    category = document_processor.classify_document(text)
+    # The centroid classifier reuses the embedding the index stage needs anyway;
+    # the transformer (batched with other in-flight tasks) runs when it is unsure
+    category = None
+    if centroid_classifier.active_model() is not None:
+        category = centroid_classifier.classify(_embedding(doc))
+    if category is None:
+        broad_category = inference_broker.classify(text)
+        category = document_processor.BROAD_TO_DETAILED.get(broad_category, 'Non_Relevant')
+    category = document_processor.normalize_category(category)
 
-    # Extract metadata
-    metadata = document_processor.extract_metadata(text)
+    conn = database.get_db_connection()
+    # Archive uploads are queued before classification, so the uploader's
+    # role is checked here instead of in the upload request
+    if doc['category'] is None and not authz.filter_for_user(doc['uploaded_by']).allows(category):
+        _discard_document(conn, doc)
+        conn.close()
+        logger.info("Document %s discarded: category %s not allowed for uploader", document_id, category,
+                    extra={'document_id': document_id})
+        return False
 
-    # Generate abstractive summary
-    summary = document_processor.generate_abstractive_summary(text)
+    # Extract metadata; transformer NER goes through the batching broker
+    try:
+        entities = inference_broker.ner(text)
+    except Exception:
+        entities = None
+    metadata = document_processor.extract_metadata(text, entities=entities)
 
-    # Update document with extracted info
-    cursor.execute('''
-        UPDATE documents SET category=?, title=?, author=?, date_created=?, summary=?
+    conn.execute('''
+        UPDATE documents SET category=?, title=?, author=?, date_created=?
         WHERE id=?
-    ''', (category, metadata.get('title'), metadata.get('author'), metadata.get('date_created'), summary, document_id))
+    ''', (category, metadata.get('title'), metadata.get('author'), metadata.get('date_created'), document_id))
     conn.commit()
+    conn.close()
 
-    # Generate embedding & update FAISS index
-    model = semantic_search.get_embedding_model()
-    embedding = semantic_search.generate_embedding(text, model)
-    semantic_search.update_index(document_id, embedding)
+def _summarize(doc):
+    # Generate summary with the configured summary mode
+    summary = document_processor.summarize(_stored_text(doc))
+    content_store.save_document_summary(doc['id'], summary)
+
+def _index(doc):
+    document_id = doc['id']
+    # Vector and index from the same generation, even if a switch-over happens in between
+    generation = semantic_search.active_generation()
+    embedding = _embedding(doc, generation['model_version'])
+    # No-op when the document is already in the FAISS index; concurrent index
+    # tasks in this worker share one write of the index files
+    inference_broker.add_to_index(document_id, embedding, generation)
 
     # Log processing completion as 'process' action
-    cursor.execute('''
-        INSERT INTO access_logs (user_id, document_id, action, timestamp)
-        VALUES (?, ?, 'process', ?)
-    ''', (doc['uploaded_by'], document_id, datetime.now()))
-    conn.commit()
+    access_log.log(doc['uploaded_by'], 'process', document_id=document_id)
 
-    conn.close()
-    return f"Processed document {document_id}."
+@celery_app.task(**STAGE_TASK_OPTIONS)
+def extract_stage(document_id):
+    return _run_stage('extract', document_id, _extract)
+
+@celery_app.task(**STAGE_TASK_OPTIONS)
+def classify_stage(document_id):
+    return _run_stage('classify', document_id, _classify)
+
+@celery_app.task(**STAGE_TASK_OPTIONS)
+def summarize_stage(document_id):
+    return _run_stage('summarize', document_id, _summarize)
+
+@celery_app.task(**STAGE_TASK_OPTIONS)
+def index_stage(document_id):
+    return _run_stage('index', document_id, _index)
+
+STAGES = (extract_stage, classify_stage, summarize_stage, index_stage)
+PIPELINE = (('extract', _extract), ('classify', _classify), ('summarize', _summarize), ('index', _index))
+
+def run_pipeline(document_id):
+    """
+    Run every stage in the calling process with the same checkpoints and
+    retry policy as the Celery tasks (the in-process task backends use this).
+    Returns document_id, or None if the document was discarded or is missing.
+    """
+    for stage, work in PIPELINE:
+        for attempt in range(STAGE_TASK_OPTIONS['max_retries'] + 1):
+            try:
+                result = _run_stage(stage, document_id, work)
+                break
+            except TRANSIENT_ERRORS:
+                if attempt == STAGE_TASK_OPTIONS['max_retries']:
+                    raise
+                time.sleep(retry_delay(attempt))
+        if result is None:
+            return None
+    return document_id
+
+def document_priority(file_size):
+    if file_size is not None and file_size <= SMALL_DOCUMENT_BYTES:
+        return SMALL_DOCUMENT_PRIORITY
+    return LARGE_DOCUMENT_PRIORITY
+
+def processing_chain(document_id, file_size=None):
+    """The stage chain for one document, every stage carrying the document's priority."""
+    priority = document_priority(file_size)
+    first, *rest = STAGES
+    return chain(first.si(document_id).set(priority=priority),
+                 *(stage.s().set(priority=priority) for stage in rest))
+
+def enqueue_chain(document_id, file_size=None):
+    """Send the processing chain for a stored document to the Celery broker."""
+    return processing_chain(document_id, file_size).apply_async()
+
+@celery_app.task
+def process_document_async(document_id):
+    # Kept so messages queued before the pipeline split still get processed
+    doc = _load_document(document_id)
+    if not doc:
+        return f"Document {document_id} not found."
+    size = os.path.getsize(doc['file_path']) if os.path.exists(doc['file_path']) else None
+    enqueue_chain(document_id, size)
+    return f"Queued processing pipeline for document {document_id}."
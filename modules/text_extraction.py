@@ -0,0 +1,29 @@
+# modules/text_extraction.py
+# Text extraction only: no model imports, so process-pool workers stay light.
+import os
+import fitz  # PyMuPDF for PDFs
+import docx  # python-docx for DOCX docs
+
+# File extension -> file_type as stored in documents.file_type
+ALLOWED_EXTENSIONS = {'.pdf': 'pdf', '.docx': 'docx', '.txt': 'txt'}
+
+def file_type_for(filename):
+    """Return the file_type for a filename, or None if the extension is unsupported."""
+    return ALLOWED_EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+def extract_text(file_path, file_type):
+    """Extract text from PDF, DOCX, or TXT files."""
+    file_type = file_type.lower()
+    if file_type == 'pdf':
+        with fitz.open(file_path) as doc:
+            text = "".join(page.get_text() for page in doc)
+    elif file_type == 'docx':
+        doc = docx.Document(file_path)
+        paragraphs = [para.text for para in doc.paragraphs]
+        text = "\n".join(paragraphs)
+    elif file_type == 'txt':
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    else:
+        raise ValueError(f"Unsupported file_type: {file_type}")
+    return text
@@ -1,95 +1,248 @@
 import os
+import hashlib
+import itertools
+import tempfile
+import zipfile
 from datetime import datetime
-from modules import document_processor, database
-from modules.tasks import process_document_async
-from docx import Document
-
-# Role to allowed categories mapping for three roles only
-ROLE_TO_CATEGORIES = {
-    'admin': None,  # Admin has access to all categories
-    'hr': ['Resume'],
-    'finance': ['Invoice', 'Contract'],
+import magic
+from werkzeug.utils import secure_filename
+from config import Config
+from modules import document_processor, database, content_store, authz, pipeline_state, document_listing
+from modules.task_backend import enqueue_document
+from modules.text_extraction import file_type_for
+
+# Sniffed MIME type expected for each file_type
+ALLOWED_MIMES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',  # DOCX MIME
+    'txt': 'text/plain',
 }
+# Bytes sniffed by libmagic, taken from the first chunk of the stream
+MAGIC_SNIFF_BYTES = 2048
+
+UPLOAD_CHUNK_SIZE = getattr(Config, 'UPLOAD_CHUNK_SIZE', 64 * 1024)
+MAX_UPLOAD_FILE_BYTES = getattr(Config, 'MAX_UPLOAD_FILE_BYTES', 50 * 1024 * 1024)
+MAX_ARCHIVE_MEMBERS = getattr(Config, 'MAX_ARCHIVE_MEMBERS', 500)
+MAX_ARCHIVE_BYTES = getattr(Config, 'MAX_ARCHIVE_BYTES', 500 * 1024 * 1024)
+MAX_ARCHIVE_UNCOMPRESSED_BYTES = getattr(Config, 'MAX_ARCHIVE_UNCOMPRESSED_BYTES', 1024 * 1024 * 1024)
+
+normalize_category = document_processor.normalize_category
+
+def stream_to_temp(stream, directory, max_bytes=MAX_UPLOAD_FILE_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Copy a file-like stream to a temp file in fixed-size chunks.
+    The SHA-256 content hash and the libmagic MIME sniff are computed in the same pass.
+    Returns (temp_path, sha256_hex, mime, size); raises ValueError past max_bytes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.part')
+    digest = hashlib.sha256()
+    head = b''
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"File exceeds the upload size limit of {max_bytes} bytes.")
+                if len(head) < MAGIC_SNIFF_BYTES:
+                    head += chunk[:MAGIC_SNIFF_BYTES - len(head)]
+                digest.update(chunk)
+                out.write(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    mime = magic.from_buffer(head, mime=True) if head else None
+    return temp_path, digest.hexdigest(), mime, size
+
+def find_document_by_hash(content_hash, category_filter=None, user_id=None):
+    """
+    Id of a document with this content the user may see (its category passes
+    category_filter, or they uploaded it), so a duplicate never reveals a
+    document outside the uploader's categories.
+    """
+    return document_listing.find_by_hash(content_hash, category_filter, user_id)
+
+def _store_upload(temp_path, upload_folder, filename, content_hash):
+    """
+    Move an accepted temp file into the upload folder under a name no other
+    document uses. os.link fails instead of overwriting, so two uploads of
+    the same content (or name) never end up sharing one file.
+    """
+    safe_name = secure_filename(filename) or 'document'
+    for attempt in itertools.count():
+        if attempt == 0:
+            name = safe_name
+        elif attempt == 1:
+            name = f"{content_hash[:12]}_{safe_name}"
+        else:
+            name = f"{content_hash[:12]}_{attempt}_{safe_name}"
+        save_path = os.path.join(upload_folder, name)
+        try:
+            os.link(temp_path, save_path)
+        except FileExistsError:
+            continue
+        os.remove(temp_path)
+        return safe_name, save_path
+
+def _remove_if_exists(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def _receive_file(stream, filename, upload_folder, category_filter=None, user_id=None):
+    """Validate extension, stream to a temp file and check hash and MIME. Returns (file_type, temp_path, content_hash)."""
+    file_type = file_type_for(filename)
+    if not file_type:
+        raise ValueError("Unsupported file type.")
 
-def normalize_category(cat):
-    if not cat:
-        return None
-    # Replace underscores with spaces and capitalize each word
-    return ' '.join(word.capitalize() for word in cat.strip().replace('_', ' ').split())
-
-def extract_docx_text(file_path):
-    doc = Document(file_path)
-    full_text = []
-    for para in doc.paragraphs:
-        full_text.append(para.text)
-    return '\n'.join(full_text)
-
-def get_user_role_by_id(user_id):
-    # Fetch the role for given user_id from your users table
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT role FROM users WHERE id = ?', (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return row['role'].lower().strip()
-    return None
+    temp_path, content_hash, mime, _ = stream_to_temp(stream, upload_folder)
+    if mime != ALLOWED_MIMES[file_type]:
+        os.remove(temp_path)
+        raise ValueError('Disallowed file type detected.')
+    if find_document_by_hash(content_hash, category_filter, user_id):
+        os.remove(temp_path)
+        raise ValueError(f"{filename} has already been uploaded.")
+    return file_type, temp_path, content_hash
 
 def handle_file_upload(uploaded_file, upload_folder, user_id):
-    user_role = get_user_role_by_id(user_id)
-    allowed_categories = ROLE_TO_CATEGORIES.get(user_role, [])
-
-    filename = uploaded_file.filename
-    allowed_ext = {'.pdf': 'pdf', '.docx': 'docx', '.txt': 'txt'}
-    file_ext = os.path.splitext(filename)[1].lower()
-
-    if file_ext not in allowed_ext:
-        raise ValueError("Unsupported file type.")
+    category_filter = authz.filter_for_user(user_id)
 
-    file_type = allowed_ext[file_ext]
-    os.makedirs(upload_folder, exist_ok=True)
-    save_path = os.path.join(upload_folder, filename)
-    uploaded_file.save(save_path)
+    original_filename = uploaded_file.filename
+    file_type, temp_path, content_hash = _receive_file(uploaded_file.stream, original_filename, upload_folder,
+                                                       category_filter, user_id)
 
-    if file_type == 'docx':
-        extracted_text = extract_docx_text(save_path)
-    else:
-        extracted_text = None
+    save_path = None
+    try:
+        processed = document_processor.process_document_file(temp_path, file_type)
 
-    processed = document_processor.process_document_file(save_path, file_type)
+        category_raw = processed.get('category')
+        category_norm = normalize_category(category_raw)
 
-    if file_type == 'docx' and extracted_text:
-        processed['summary'] = extracted_text
+        if not category_filter.allows(category_norm):
+            raise ValueError("You are not allowed to upload documents in this category.")
 
-    category_raw = processed.get('category')
-    category_norm = normalize_category(category_raw)
+        filename, save_path = _store_upload(temp_path, upload_folder, original_filename, content_hash)
+
+        conn = database.get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by, category, title, author, date_created, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            filename,
+            original_filename,
+            save_path,
+            file_type,
+            datetime.now(),
+            user_id,
+            category_norm,
+            processed.get('metadata', {}).get('title'),
+            processed.get('metadata', {}).get('author'),
+            processed.get('metadata', {}).get('date_created'),
+            content_hash
+        ))
+        doc_id = cursor.lastrowid
+        content_store.save_document_text(doc_id, processed.get('text'), conn=conn)
+        content_store.save_document_summary(doc_id, processed.get('summary'), conn=conn)
+        if processed.get('embedding') is not None:
+            content_store.save_embedding(doc_id, processed['embedding_model_version'], processed['embedding'], conn=conn)
+        # Already done in this request; the queued chain only has to index
+        pipeline_state.mark_stages_done([doc_id], ('extract', 'classify', 'summarize'), conn=conn)
+        conn.commit()
+        conn.close()
+    except Exception:
+        # The stored file would have no documents row
+        _remove_if_exists(save_path)
+        raise
+    finally:
+        _remove_if_exists(temp_path)
+
+    enqueue_document(doc_id, os.path.getsize(save_path))
 
-    if user_role != 'admin':
-        if not allowed_categories or category_norm not in allowed_categories:
-            raise ValueError("You are not allowed to upload documents in this category.")
+    return doc_id
 
+def handle_archive_upload(uploaded_file, upload_folder, user_id):
+    """
+    Fan the documents inside a ZIP archive out into the processing queue.
+    The archive is streamed to disk, members are read one at a time through
+    zipfile's streaming reader, and each accepted member gets a documents row
+    that the Celery task classifies. Returns (document_ids, skipped) where
+    skipped is a list of (member name, reason).
+
+    Unlike a single upload, members are not classified in the request, so
+    the uploader's category filter cannot be applied before the row is
+    inserted: the classify stage discards (row and file) any member that
+    lands in a category the uploader may not upload. The upload page tells
+    restricted users so.
+    """
+    category_filter = authz.filter_for_user(user_id)
+    archive_path, _, _, _ = stream_to_temp(uploaded_file.stream, upload_folder, max_bytes=MAX_ARCHIVE_BYTES)
+    doc_ids, skipped, sizes = [], [], {}
+    try:
+        try:
+            archive = zipfile.ZipFile(archive_path)
+        except zipfile.BadZipFile:
+            raise ValueError("The uploaded archive is not a valid ZIP file.")
+
+        with archive:
+            members = [info for info in archive.infolist() if not info.is_dir()]
+            if len(members) > MAX_ARCHIVE_MEMBERS:
+                raise ValueError(f"Archives may contain at most {MAX_ARCHIVE_MEMBERS} files.")
+
+            total_bytes = 0
+            for info in members:
+                # Only the base name is used, so member paths cannot escape the upload folder
+                member_name = os.path.basename(info.filename)
+                total_bytes += info.file_size
+                if total_bytes > MAX_ARCHIVE_UNCOMPRESSED_BYTES:
+                    skipped.append((member_name, "archive size limit reached"))
+                    break
+                try:
+                    # zipfile validates the declared size while reading, and
+                    # stream_to_temp enforces the per-file cap on actual bytes
+                    with archive.open(info) as member_stream:
+                        file_type, temp_path, content_hash = _receive_file(member_stream, member_name, upload_folder,
+                                                                           category_filter, user_id)
+                except ValueError as ve:
+                    skipped.append((member_name, str(ve)))
+                    continue
+                except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+                    # corrupt, encrypted or unsupported-compression members
+                    skipped.append((member_name, str(e)))
+                    continue
+
+                save_path = None
+                try:
+                    filename, save_path = _store_upload(temp_path, upload_folder, member_name, content_hash)
+                    doc_id = _insert_pending_document(filename, member_name, save_path, file_type, user_id,
+                                                      content_hash)
+                except Exception:
+                    _remove_if_exists(save_path)
+                    raise
+                finally:
+                    _remove_if_exists(temp_path)
+                doc_ids.append(doc_id)
+                sizes[doc_id] = os.path.getsize(save_path)
+    finally:
+        os.remove(archive_path)
+
+    for doc_id in doc_ids:
+        enqueue_document(doc_id, sizes[doc_id])
+    return doc_ids, skipped
+
+@database.retry_on_busy
+def _insert_pending_document(filename, original_filename, save_path, file_type, user_id, content_hash):
+    """Insert a row with no category yet; the processing task fills it in."""
     conn = database.get_db_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by, category, title, author, date_created, summary)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        filename,
-        filename,
-        save_path,
-        file_type,
-        datetime.now(),
-        user_id,
-        category_norm,
-        processed.get('metadata', {}).get('title'),
-        processed.get('metadata', {}).get('author'),
-        processed.get('metadata', {}).get('date_created'),
-        processed.get('summary')
-    ))
+        INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (filename, original_filename, save_path, file_type, datetime.now(), user_id, content_hash))
     doc_id = cursor.lastrowid
     conn.commit()
     conn.close()
-
-    process_document_async.delay(doc_id)
-
     return doc_id
@@ -0,0 +1,182 @@
+# modules/worker_bootstrap.py
+"""
+Model preloading for Celery workers.
+
+The worker_init hook runs in the parent process before the prefork pool
+forks. Loading every model there, switching it to eval() and freezing the
+gc generations means the children share the weight pages copy-on-write, so
+each added child costs little more than its own interpreter state. The
+worker_process_init hook then runs in every child to cap torch's thread
+pool (concurrency children x all cores each would oversubscribe the CPU)
+and to report the child's memory.
+
+No forward pass may run in the parent: the OpenMP thread pool torch starts
+on first use does not survive fork.
+"""
+import gc
+import logging
+import os
+import resource
+from config import Config
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+# Queue -> models its stage uses beyond the ones document_processor loads at import
+QUEUE_MODELS = {
+    'extract': (),
+    'classify': ('embedding', 'centroid'),
+    'summarize': ('summarizer',),
+    'index': ('embedding',),
+}
+
+PROCESS_MEMORY = metrics.gauge('worker_process_memory_bytes', 'Memory of this worker process by kind',
+                               labelnames=('kind',))
+
+
+def _load_embedding():
+    from modules import semantic_search
+    return semantic_search.get_embedding_model()
+
+
+def _load_centroid():
+    from modules import centroid_classifier
+    return centroid_classifier.active_model()
+
+
+def _load_summarizer():
+    from modules import document_processor
+    if Config.SUMMARY_MODE != 'abstractive':
+        return None
+    return document_processor.get_summarizer_pipeline('facebook/bart-large-cnn')
+
+
+PRELOADERS = {
+    'centroid': _load_centroid,
+    'embedding': _load_embedding,
+    'summarizer': _load_summarizer,
+}
+
+
+def torch_models():
+    """(name, torch module) for every model loaded in this process so far."""
+    from modules import document_processor, semantic_search
+    found = [('classifier', document_processor.model_cls)]
+    if document_processor.ner_pipeline is not None:
+        found.append(('ner', document_processor.ner_pipeline.model))
+    for name, pipe in document_processor._summarizer_pipelines.items():
+        if pipe is not None:
+            found.append((f'summarizer:{name}', pipe.model))
+    found.extend((f'embedding:{version}', model) for version, model in semantic_search._embedding_models.items())
+    return [(name, model) for name, model in found if model is not None and hasattr(model, 'eval')]
+
+
+def preload_models(queues=None):
+    """
+    Load the models the given queues need (all of them when queues is None),
+    put every torch model in eval mode with gradients off, and freeze the gc
+    so collections in the children do not write to the shared pages.
+    """
+    # Importing document_processor loads the classifier, NER pipeline and spaCy
+    from modules import document_processor  # noqa: F401
+    names = set()
+    for queue in (queues or QUEUE_MODELS):
+        names.update(QUEUE_MODELS.get(queue, ()))
+    before = memory_usage()['rss']
+    for name in sorted(names):
+        try:
+            PRELOADERS[name]()
+        except Exception as e:
+            logger.warning("Preloading %s failed, children will load it on first use: %s", name, e)
+
+    models = torch_models()
+    for _, model in models:
+        model.eval()
+        for parameter in model.parameters():
+            parameter.requires_grad_(False)
+
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    loaded = ', '.join(name for name, _ in models) or 'none'
+    logger.info("Preloaded models: %s (+%.0f MiB)", loaded, (memory_usage()['rss'] - before) / 2**20)
+    return [name for name, _ in models]
+
+
+def torch_threads(pool, concurrency):
+    """Intra-op threads per process: the cores split across prefork children."""
+    configured = getattr(Config, 'WORKER_TORCH_THREADS', None)
+    if configured:
+        return int(configured)
+    cores = os.cpu_count() or 1
+    if pool == 'prefork':
+        return max(1, cores // max(1, concurrency))
+    return cores
+
+
+def configure_torch(threads):
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        # Only allowed before the first parallel op in this process
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def memory_usage(pid='self'):
+    """
+    {'rss', 'pss', 'private'} in bytes for a process. pss splits shared pages
+    among the processes mapping them and private counts pages only this one
+    holds, which is what an added prefork child really costs. Falls back to
+    peak RSS where /proc is not available.
+    """
+    usage = {'rss': 0, 'pss': 0, 'private': 0}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                fields = value.split()
+                if not fields or not fields[0].isdigit():
+                    continue
+                kib = int(fields[0]) * 1024
+                if key == 'Rss':
+                    usage['rss'] = kib
+                elif key == 'Pss':
+                    usage['pss'] = kib
+                elif key in ('Private_Clean', 'Private_Dirty'):
+                    usage['private'] += kib
+        return usage
+    except OSError:
+        pass
+    if pid == 'self':
+        # ru_maxrss is KiB on Linux
+        usage['rss'] = usage['pss'] = usage['private'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return usage
+
+
+def child_pids(parent_pid):
+    """Direct children of a process (the prefork pool of a worker)."""
+    try:
+        with open(f'/proc/{parent_pid}/task/{parent_pid}/children') as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+
+def report_memory(label):
+    usage = memory_usage()
+    for kind, value in usage.items():
+        PROCESS_MEMORY.labels(kind=kind).set(value)
+    logger.info("%s memory: rss %.0f MiB, pss %.0f MiB, private %.0f MiB", label,
+                usage['rss'] / 2**20, usage['pss'] / 2**20, usage['private'] / 2**20,
+                extra={'rss_bytes': usage['rss'], 'pss_bytes': usage['pss'], 'private_bytes': usage['private']})
+    return usage
+
+
+def pool_name(pool_cls):
+    """'prefork', 'threads', 'solo', ... from a worker's pool setting (name or class)."""
+    if isinstance(pool_cls, str):
+        return pool_cls
+    name = getattr(pool_cls, '__module__', str(pool_cls)).rsplit('.', 1)[-1]
+    return {'thread': 'threads'}.get(name, name)
@@ -0,0 +1,150 @@
+# scripts/benchmark_db_concurrency.py
+"""
+Reader/writer throughput on SQLite while Celery-style writers run in parallel.
+
+Compares the legacy setup (rollback journal, a new connection per call) with
+the pooled WAL connections from modules.database. Readers run the dashboard
+listing query in threads; writers run in separate processes, like Celery
+workers, updating documents and inserting access logs.
+
+    python scripts/benchmark_db_concurrency.py --docs 20000 --readers 8 --writers 2 --seconds 10
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import multiprocessing
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from modules import database
+
+CATEGORIES = ['Invoice', 'Resume', 'Contract', 'Technical Manual', 'Non_Relevant']
+READ_QUERY = 'SELECT id, title, category, author, upload_date FROM documents WHERE category = ? ORDER BY upload_date DESC LIMIT 50'
+
+
+def seed(path, num_docs):
+    database.DB_PATH = path
+    database.init_db()
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO users (username, password, role) VALUES ('bench', 'x', 'admin')")
+    start = datetime(2020, 1, 1)
+    conn.executemany('''
+        INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by, category, title)
+        VALUES (?, ?, ?, 'txt', ?, 1, ?, ?)
+    ''', [(f'doc{i}.txt', f'doc{i}.txt', f'/tmp/doc{i}.txt', start + timedelta(minutes=i),
+           random.choice(CATEGORIES), f'Document {i}') for i in range(num_docs)])
+    conn.commit()
+    database.release_thread_connection()
+    database.get_pool(path).close_all()
+
+
+def legacy_connection(path):
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=DELETE')
+    return conn
+
+
+def open_connection(mode, path):
+    if mode == 'legacy':
+        return legacy_connection(path)
+    database.DB_PATH = path
+    return database.get_db_connection()
+
+
+def writer_process(mode, path, num_docs, stop_at, result_queue):
+    done, errors = 0, 0
+    while time.time() < stop_at:
+        conn = open_connection(mode, path)
+        try:
+            doc_id = random.randint(1, num_docs)
+            conn.execute('UPDATE documents SET title = ? WHERE id = ?', (f'Updated {doc_id}', doc_id))
+            conn.execute("INSERT INTO access_logs (user_id, document_id, action, timestamp) VALUES (1, ?, 'view', ?)",
+                         (doc_id, datetime.now()))
+            conn.commit()
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            conn.rollback()
+        conn.close()
+    result_queue.put((done, errors))
+
+
+def reader_thread(mode, path, stop_at, results):
+    done, errors, latencies = 0, 0, []
+    while time.time() < stop_at:
+        started = time.perf_counter()
+        conn = open_connection(mode, path)
+        try:
+            conn.execute(READ_QUERY, (random.choice(CATEGORIES),)).fetchall()
+            done += 1
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            errors += 1
+        conn.close()
+    if mode != 'legacy':
+        database.release_thread_connection()
+    results.append((done, errors, latencies))
+
+
+def run(mode, args):
+    workdir = tempfile.mkdtemp(prefix=f'dbbench-{mode}-')
+    path = os.path.join(workdir, 'bench.db')
+    seed(path, args.docs)
+    if mode == 'legacy':
+        # seed() used the pooled connection; switch the file back to a rollback journal
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.close()
+
+    stop_at = time.time() + args.seconds
+    result_queue = multiprocessing.Queue()
+    writers = [multiprocessing.Process(target=writer_process, args=(mode, path, args.docs, stop_at, result_queue))
+               for _ in range(args.writers)]
+    for w in writers:
+        w.start()
+
+    reader_results = []
+    readers = [threading.Thread(target=reader_thread, args=(mode, path, stop_at, reader_results))
+               for _ in range(args.readers)]
+    for r in readers:
+        r.start()
+    for r in readers:
+        r.join()
+    writer_results = [result_queue.get() for _ in writers]
+    for w in writers:
+        w.join()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    reads = sum(r[0] for r in reader_results)
+    read_errors = sum(r[1] for r in reader_results)
+    latencies = sorted(l for r in reader_results for l in r[2])
+    writes = sum(w[0] for w in writer_results)
+    write_errors = sum(w[1] for w in writer_results)
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan')
+    print(f"{mode:<7} reads/s {reads / args.seconds:>9.1f}  read p95 {p95:>7.2f} ms  read errors {read_errors:>4}  "
+          f"writes/s {writes / args.seconds:>8.1f}  write errors {write_errors:>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite reader/writer concurrency benchmark")
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--mode', choices=('legacy', 'pooled', 'both'), default='both')
+    args = parser.parse_args()
+
+    for mode in (('legacy', 'pooled') if args.mode == 'both' else (args.mode,)):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# scripts/benchmark_ingest_latency.py
+"""
+Measure upload -> searchable latency on one machine, with no Redis: the
+pipeline runs on an in-process task backend and the database, upload folder
+and FAISS index live in a temporary directory.
+
+A document counts as searchable once its index stage is done in
+document_stages. Needs the models the pipeline uses.
+
+    python scripts/benchmark_ingest_latency.py
+    python scripts/benchmark_ingest_latency.py --docs 200 --clients 8 --backend process --workers 4
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import io
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.datastructures import FileStorage
+from werkzeug.security import generate_password_hash
+
+from benchmarks.corpus import synthetic_text
+from modules import database, semantic_search, task_backend
+from modules.category_classifier import CATEGORY_KEYWORDS
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def setup(workdir):
+    database.DB_PATH = os.path.join(workdir, 'bench.db')
+    semantic_search.FAISS_INDEX_PATH = os.path.join(workdir, 'faiss_index.index')
+    semantic_search.IDX_MAP_PATH = os.path.join(workdir, 'faiss_id_map.json')
+    upload_folder = os.path.join(workdir, 'uploads')
+    os.makedirs(upload_folder)
+    database.init_db()
+    conn = database.get_db_connection()
+    cursor = conn.execute('INSERT INTO users (username, password, role) VALUES (?, ?, ?)',
+                          ('bench', generate_password_hash('bench'), 'admin'))
+    user_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return upload_folder, user_id
+
+
+def watch_searchable(pending, searchable_at, stop):
+    """Record when each document's index stage turns done."""
+    conn = database.get_db_connection()
+    while not stop.is_set():
+        rows = conn.execute("SELECT document_id FROM document_stages WHERE stage = 'index' AND status = 'done'").fetchall()
+        now = time.perf_counter()
+        for row in rows:
+            if row['document_id'] in pending and row['document_id'] not in searchable_at:
+                searchable_at[row['document_id']] = now
+        time.sleep(0.02)
+    conn.close()
+    database.release_thread_connection()
+
+
+def run(args):
+    from modules.upload_handler import handle_file_upload
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='ingest-bench-')
+    try:
+        upload_folder, user_id = setup(workdir)
+        backend = task_backend.set_backend(args.backend, workers=args.workers, queue_size=max(args.docs, 1000))
+        categories = sorted(CATEGORY_KEYWORDS)
+        documents = [(f'doc_{i}.txt', synthetic_text(rng.choice(categories), args.words, rng).encode('utf-8'))
+                     for i in range(args.docs)]
+
+        # Load the models before timing, as a running server would have
+        from modules import document_processor  # noqa: F401
+        semantic_search.get_embedding_model()
+
+        pending, uploaded_at, request_seconds, searchable_at = {}, {}, [], {}
+        lock = threading.Lock()
+        stop = threading.Event()
+        watcher = threading.Thread(target=watch_searchable, args=(pending, searchable_at, stop), daemon=True)
+        watcher.start()
+
+        def upload(item):
+            filename, body = item
+            started = time.perf_counter()
+            doc_id = handle_file_upload(FileStorage(stream=io.BytesIO(body), filename=filename), upload_folder, user_id)
+            with lock:
+                request_seconds.append(time.perf_counter() - started)
+                pending[doc_id] = filename
+                uploaded_at[doc_id] = started
+            database.release_thread_connection()
+
+        wall_started = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as clients:
+            list(clients.map(upload, documents))
+        backend.join(timeout=args.timeout)
+        deadline = time.monotonic() + 5
+        while len(searchable_at) < len(pending) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        wall = time.perf_counter() - wall_started
+        stop.set()
+        watcher.join()
+
+        latencies = [searchable_at[doc_id] - uploaded_at[doc_id] for doc_id in searchable_at]
+        print(f"backend={args.backend} workers={args.workers} clients={args.clients} docs={args.docs}")
+        print(f"upload request:          p50 {percentile(request_seconds, 50) * 1000:8.1f} ms   "
+              f"p95 {percentile(request_seconds, 95) * 1000:8.1f} ms")
+        print(f"upload -> searchable:    p50 {percentile(latencies, 50) * 1000:8.1f} ms   "
+              f"p95 {percentile(latencies, 95) * 1000:8.1f} ms   max {max(latencies or [0]) * 1000:8.1f} ms")
+        print(f"searchable: {len(searchable_at)}/{len(pending)} documents in {wall:.1f}s "
+              f"({len(searchable_at) / wall:.1f} docs/s)")
+        database.release_thread_connection()
+        database.get_pool().close_all()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark upload -> searchable latency without external services")
+    parser.add_argument('--docs', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=4, help="Concurrent uploaders")
+    parser.add_argument('--backend', choices=('thread', 'process', 'eager'), default='thread')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--words', type=int, default=400, help="Words per synthetic document")
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,279 @@
+# scripts/bulk_ingest.py
+"""
+Bulk-ingest a directory tree of PDF/DOCX/TXT files.
+
+Extraction runs in a process pool; classification, metadata, summaries and
+embeddings run in batches in the main process; documents rows are written with
+executemany inside one transaction per batch, and vectors are committed to the
+FAISS index every --index-every documents. Files already present in the
+documents table are skipped, so an interrupted run can simply be restarted.
+
+    python scripts/bulk_ingest.py /data/archive --user-id 1 --workers 8
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+
+from modules import database, content_store, semantic_search, pipeline_state
+from modules.text_extraction import extract_text, file_type_for
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+
+def find_files(root_dir):
+    """Yield absolute paths of supported files below root_dir, in a stable order."""
+    for subdir, dirs, files in os.walk(root_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if file_type_for(name):
+                yield os.path.abspath(os.path.join(subdir, name))
+
+
+def already_ingested_paths():
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT file_path FROM documents')
+    paths = {row['file_path'] for row in cursor.fetchall()}
+    conn.close()
+    return paths
+
+
+def _extract_worker(path):
+    """Runs in a pool process: (path, file_type, text, error)."""
+    file_type = file_type_for(path)
+    try:
+        return path, file_type, extract_text(path, file_type), None
+    except Exception as e:
+        return path, file_type, None, str(e)
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.items = defaultdict(int)
+
+    def record(self, stage, started, count):
+        self.seconds[stage] += time.perf_counter() - started
+        self.items[stage] += count
+
+    def report(self, wall_seconds):
+        print("\nStage throughput:")
+        for stage, seconds in self.seconds.items():
+            rate = self.items[stage] / seconds if seconds else float('inf')
+            print(f"  {stage:<10} {self.items[stage]:>8} docs  {seconds:>9.1f}s  {rate:>10.1f} docs/s")
+        total = self.items.get('insert', 0)
+        print(f"  {'overall':<10} {total:>8} docs  {wall_seconds:>9.1f}s  {total / wall_seconds if wall_seconds else 0:>10.1f} docs/s")
+
+
+def insert_batch(batch, user_id, model_version):
+    """
+    Insert one batch of processed documents in a single transaction.
+    Returns the new document ids, in batch order.
+    """
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    # IMMEDIATE takes the write lock up front, so the AUTOINCREMENT ids we
+    # compute below cannot be taken by a concurrent upload
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'documents'")
+        row = cursor.fetchone()
+        seq = row['seq'] if row else 0
+        cursor.execute('SELECT COALESCE(MAX(id), 0) AS max_id FROM documents')
+        first_id = max(seq, cursor.fetchone()['max_id']) + 1
+
+        now = datetime.now()
+        cursor.executemany('''
+            INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by, category, title, author, date_created)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(
+            os.path.basename(doc['path']),
+            os.path.basename(doc['path']),
+            doc['path'],
+            doc['file_type'],
+            now,
+            user_id,
+            doc['category'],
+            doc['metadata'].get('title'),
+            doc['metadata'].get('author'),
+            doc['metadata'].get('date_created'),
+        ) for doc in batch])
+
+        doc_ids = list(range(first_id, first_id + len(batch)))
+        cursor.execute('SELECT MAX(id) AS max_id FROM documents')
+        if cursor.fetchone()['max_id'] != doc_ids[-1]:
+            raise RuntimeError("Unexpected document ids assigned during bulk insert")
+
+        content_store.save_document_texts(zip(doc_ids, (doc['text'] for doc in batch)), conn=conn)
+        content_store.save_document_summaries(zip(doc_ids, (doc['summary'] for doc in batch)), conn=conn)
+        content_store.save_embeddings(doc_ids, model_version,
+                                      np.stack([doc['embedding'] for doc in batch]), conn=conn)
+        # Vectors reach FAISS in commit_pending_vectors, or reconcile_index after a crash
+        pipeline_state.mark_stages_done(doc_ids, pipeline_state.STAGE_NAMES, conn=conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+    conn.close()
+    return doc_ids
+
+
+def process_batch(batch, args, timer, embedding_model):
+    """Classify, extract metadata, summarize and embed one batch in place."""
+    from modules import document_processor, centroid_classifier
+
+    texts = [doc['text'] for doc in batch]
+
+    # Embed first: a trained centroid classifier labels from these vectors
+    started = time.perf_counter()
+    matrix = semantic_search.generate_embeddings(texts, embedding_model, batch_size=args.batch_size)
+    for doc, embedding in zip(batch, matrix):
+        doc['embedding'] = embedding
+    timer.record('embed', started, len(batch))
+
+    started = time.perf_counter()
+    if centroid_classifier.active_model() is not None:
+        for doc in batch:
+            doc['category'] = centroid_classifier.classify(doc['embedding'])
+    # The transformer only sees the documents the centroids were unsure about
+    unsure = [doc for doc in batch if not doc.get('category')]
+    if unsure:
+        broad = document_processor.classify_documents([doc['text'] for doc in unsure])
+        for doc, label in zip(unsure, broad):
+            doc['category'] = document_processor.BROAD_TO_DETAILED.get(label, 'Non_Relevant')
+    for doc in batch:
+        doc['category'] = document_processor.normalize_category(doc['category'])
+    timer.record('classify', started, len(batch))
+
+    started = time.perf_counter()
+    for doc, metadata in zip(batch, document_processor.extract_metadata_batch(texts)):
+        doc['metadata'] = metadata
+    timer.record('metadata', started, len(batch))
+
+    started = time.perf_counter()
+    for doc in batch:
+        doc['summary'] = document_processor.summarize(doc['text'], mode=args.summary_mode)
+    timer.record('summarize', started, len(batch))
+
+
+def commit_pending_vectors(pending_ids, pending_vectors, timer):
+    if not pending_ids:
+        return
+    started = time.perf_counter()
+    semantic_search.add_to_index(pending_ids, np.stack(pending_vectors))
+    timer.record('index', started, len(pending_ids))
+    pending_ids.clear()
+    pending_vectors.clear()
+
+
+def reconcile_index():
+    """Index vectors stored by a previous run that stopped before its index commit."""
+    model_version = semantic_search.get_model_version()
+    indexed = semantic_search.indexed_document_ids()
+    doc_ids, matrix = content_store.load_embeddings(model_version)
+    missing = [i for i, doc_id in enumerate(doc_ids) if doc_id not in indexed]
+    if missing:
+        semantic_search.add_to_index([doc_ids[i] for i in missing], matrix[missing])
+        print(f"Indexed {len(missing)} stored vectors left over from a previous run.")
+
+
+def bulk_ingest(args):
+    database.init_db()
+    reconcile_index()
+
+    done = already_ingested_paths()
+    paths = [path for path in find_files(args.root) if path not in done]
+    print(f"{len(paths)} files to ingest ({len(done)} already in the database).")
+    if not paths:
+        return
+
+    from modules import document_processor  # noqa: F401  (load models once, before timing)
+    embedding_model = semantic_search.get_embedding_model()
+    model_version = semantic_search.get_model_version()
+
+    timer = StageTimer()
+    wall_started = time.perf_counter()
+    progress = tqdm(total=len(paths), unit='doc') if tqdm else None
+    failed = 0
+    batch, pending_ids, pending_vectors = [], [], []
+
+    def flush():
+        if not batch:
+            return
+        process_batch(batch, args, timer, embedding_model)
+        started = time.perf_counter()
+        doc_ids = insert_batch(batch, args.user_id, model_version)
+        timer.record('insert', started, len(batch))
+        pending_ids.extend(doc_ids)
+        pending_vectors.extend(doc['embedding'] for doc in batch)
+        if len(pending_ids) >= args.index_every:
+            commit_pending_vectors(pending_ids, pending_vectors, timer)
+        if progress:
+            progress.update(len(batch))
+        else:
+            print(f"Ingested {timer.items['insert']}/{len(paths)} documents")
+        batch.clear()
+
+    # Extract in windows, keeping at most two windows of text in memory while
+    # the pool works on the next window during model batches
+    window = max(args.batch_size, args.workers * 16)
+    windows = [paths[i:i + window] for i in range(0, len(paths), window)]
+    # Spawned, not forked: the models above have started torch's threads, which a
+    # forked child inherits in whatever state they were in and can deadlock on
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        upcoming = pool.map(_extract_worker, windows[0], chunksize=4)
+        extract_started = time.perf_counter()
+        for w in range(len(windows)):
+            current = upcoming
+            if w + 1 < len(windows):
+                upcoming = pool.map(_extract_worker, windows[w + 1], chunksize=4)
+            for path, file_type, text, error in current:
+                if error or not (text or '').strip():
+                    failed += 1
+                    if progress:
+                        progress.update(1)
+                    if error:
+                        print(f"Error extracting {path}: {error}")
+                    continue
+                batch.append({'path': path, 'file_type': file_type, 'text': text})
+                if len(batch) >= args.batch_size:
+                    timer.record('extract', extract_started, len(batch))
+                    flush()
+                    extract_started = time.perf_counter()
+        timer.record('extract', extract_started, len(batch))
+        flush()
+
+    commit_pending_vectors(pending_ids, pending_vectors, timer)
+    if progress:
+        progress.close()
+
+    print(f"\nIngested {timer.items['insert']} documents, {failed} failed or empty.")
+    timer.report(time.perf_counter() - wall_started)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of documents.")
+    parser.add_argument('root', help="Directory to walk for PDF, DOCX and TXT files")
+    parser.add_argument('--user-id', type=int, required=True, help="users.id recorded as uploaded_by")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Extraction processes")
+    parser.add_argument('--batch-size', type=int, default=64, help="Documents per model batch and DB transaction")
+    parser.add_argument('--index-every', type=int, default=5000, help="Commit vectors to the FAISS index every N documents")
+    parser.add_argument('--summary-mode', default='tfidf', choices=('abstractive', 'tfidf', 'textrank'),
+                        help="Summary mode; abstractive (BART) is far slower for large corpora")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    bulk_ingest(parse_args())
@@ -1,64 +1,279 @@
 # scripts/create_training_data.py
+"""
+Export labelled documents as training data, unattended.
+
+Each document's label is its latest document_corrections entry, or the
+category the pipeline assigned when it was never corrected (--corrected-only
+skips those). Documents without a label are counted and skipped.
+
+Rows are read in pages by id, text comes from the content store, and only
+documents never extracted are parsed, in a process pool. Records are
+written to gzip-compressed JSONL shards in scripts/training_data/
+(part-00000.jsonl.gz, ...). export_state.json remembers the last exported
+document and correction, so the next run only writes new documents and
+documents corrected since; readers keep the newest record per document_id.
+Documents still in the pipeline (no category yet) are remembered there too
+and tried again by every run until they have a label.
+Shards are written under temporary names and renamed into place when the
+run finishes, so an interrupted run leaves the export as it was.
+
+Label statistics (as scripts/inspect_data.py prints) are reported for the
+records written in the same pass.
+
+    python scripts/create_training_data.py
+    python scripts/create_training_data.py --full --shard-size 50000 --workers 8
+"""
+import sys
 import os
-import sqlite3
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import glob
+import gzip
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
-DB_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'instance', 'app.db')
-ALLOWED_CATEGORIES = ['Finance', 'HR', 'Legal', 'Contracts', 'Technical']
-
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def extract_text_from_file(file_path, file_type):
-    # Reuse extraction code to ensure consistency
-    import sys
-    sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), '..'))
-    from modules.document_processor import extract_text
-    return extract_text(file_path, file_type)
-
-def prompt_for_category(doc_text):
-    # Show chunk (first 500 chars) to prompt user
-    print("\n" + "="*80)
-    print("Document text excerpt:\n")
-    print(doc_text[:500].replace('\n', ' '))
-    print("\nAvailable categories:", ALLOWED_CATEGORIES)
-    while True:
-        cat = input("Enter correct category for this document (case-sensitive): ").strip()
-        if cat in ALLOWED_CATEGORIES:
-            return cat
-        else:
-            print("Invalid category. Please input one from the list.")
+from modules import database, content_store, centroid_classifier
+from modules.text_extraction import extract_text
+from scripts.inspect_data import LabelStats, EXPORT_DIR
 
-def main():
-    conn = get_db_connection()
-    cursor = conn.cursor()
+STATE_FILE = 'export_state.json'
+SHARD_NAME = 'part-{:05d}.jsonl.gz'
+
+
+def _extract_worker(doc):
+    """Runs in a pool process: (document_id, text, error)."""
+    doc_id, file_path, file_type = doc
+    try:
+        return doc_id, extract_text(file_path, file_type), None
+    except Exception as e:
+        return doc_id, None, str(e)
+
+
+def empty_state():
+    return {'last_document_id': 0, 'last_correction_id': 0, 'pending_document_ids': [], 'next_shard': 0,
+            'exports': []}
+
+
+def read_state(directory):
+    try:
+        with open(os.path.join(directory, STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return empty_state()
+
+
+def write_state(directory, state):
+    path = os.path.join(directory, STATE_FILE)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ShardWriter:
+    """Gzip JSONL shards of at most shard_size records, renamed into place by commit()."""
+
+    def __init__(self, directory, first_shard, shard_size):
+        self.directory = directory
+        self.next_shard = first_shard
+        self.shard_size = shard_size
+        self.file = None
+        self.count = 0
+        self.pending = []
+
+    def write(self, record):
+        if self.file is None or self.count >= self.shard_size:
+            self._open()
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.count += 1
 
-    cursor.execute('SELECT * FROM documents')
-    all_docs = cursor.fetchall()
+    def _open(self):
+        self._close()
+        final = os.path.join(self.directory, SHARD_NAME.format(self.next_shard))
+        tmp_path = f'{final}.{os.getpid()}.tmp'
+        self.pending.append((tmp_path, final))
+        self.file = gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6)
+        self.next_shard += 1
+        self.count = 0
 
-    output_file = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'training_data.jsonl')
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
-    with open(output_file, 'w', encoding='utf-8') as f_out:
-        for doc in all_docs:
-            doc_id = doc['id']
-            # Extract text to ensure consistency
-            text = extract_text_from_file(doc['file_path'], doc['file_type'])
+    def commit(self):
+        """Close the open shard and move every shard of this run into place; returns their names."""
+        self._close()
+        for tmp_path, final in self.pending:
+            os.replace(tmp_path, final)
+        return [os.path.basename(final) for _, final in self.pending]
 
-            category = doc['category']
-            if category not in ALLOWED_CATEGORIES:
-                category = prompt_for_category(text)
-                cursor.execute('UPDATE documents SET category = ? WHERE id = ?', (category, doc_id))
-                conn.commit()
-                print(f"Updated document ID {doc_id} category to '{category}'")
+    def abort(self):
+        self._close()
+        for tmp_path, _ in self.pending:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
-            # Write to JSONL file
-            record = {"text": text, "label": category}
-            f_out.write(json.dumps(record) + '\n')
 
-    print(f"\nTraining data JSONL exported to: {output_file}")
+def recorrected_ids(last_document_id, last_correction_id):
+    """Already exported documents corrected since the last export."""
+    conn = database.get_db_connection()
+    rows = conn.execute('''
+        SELECT DISTINCT document_id FROM document_corrections
+        WHERE id > ? AND document_id <= ? ORDER BY document_id
+    ''', (last_correction_id, last_document_id)).fetchall()
     conn.close()
+    return [row['document_id'] for row in rows]
+
+
+def iter_document_pages(page_size, after_id=0, document_ids=None):
+    """Pages of documents rows (id, file_path, file_type, category), by id or from a list of ids."""
+    conn = database.get_db_connection()
+    try:
+        if document_ids is not None:
+            for start in range(0, len(document_ids), page_size):
+                chunk = document_ids[start:start + page_size]
+                placeholders = ','.join('?' * len(chunk))
+                yield conn.execute(f'''
+                    SELECT id, file_path, file_type, category FROM documents
+                    WHERE id IN ({placeholders}) ORDER BY id
+                ''', tuple(chunk)).fetchall()
+            return
+        while True:
+            rows = conn.execute('''
+                SELECT id, file_path, file_type, category FROM documents
+                WHERE id > ? ORDER BY id LIMIT ?
+            ''', (after_id, page_size)).fetchall()
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1]['id']
+    finally:
+        conn.close()
+
+
+def page_texts(rows, pool_factory, counters):
+    """{document_id: text}, from the content store or extracted in the pool (and then stored)."""
+    if not rows:
+        return {}
+    texts = dict(content_store.iter_document_texts([row['id'] for row in rows]))
+    missing = [(row['id'], row['file_path'], row['file_type']) for row in rows
+               if row['id'] not in texts and row['file_path']]
+    if missing:
+        extracted = []
+        for doc_id, text, error in pool_factory().map(_extract_worker, missing, chunksize=4):
+            if error:
+                counters['extract_failed'] += 1
+                print(f"Error extracting document {doc_id}: {error}")
+                continue
+            texts[doc_id] = text
+            extracted.append((doc_id, text))
+        content_store.save_document_texts(extracted)
+        counters['extracted'] += len(extracted)
+    return texts
+
+
+def export(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(args.output_dir, '*.tmp')):
+        os.remove(stale)
+    if args.full:
+        for old in glob.glob(os.path.join(args.output_dir, 'part-*.jsonl.gz')):
+            os.remove(old)
+        state = empty_state()
+    else:
+        state = read_state(args.output_dir)
+
+    conn = database.get_db_connection()
+    last_correction_id = conn.execute('SELECT MAX(id) FROM document_corrections').fetchone()[0] or 0
+    conn.close()
+    corrections = centroid_classifier.corrected_labels()
+    # Unlabelled last time (still being processed) or corrected since
+    again = sorted(set(state.get('pending_document_ids', [])) |
+                   set(recorrected_ids(state['last_document_id'], state['last_correction_id'])))
+    pending = []
+
+    stats = LabelStats()
+    counters = {'records': 0, 'corrected': 0, 'unlabeled': 0, 'no_text': 0, 'extracted': 0, 'extract_failed': 0}
+    pool = []
+
+    def pool_factory():
+        if not pool:
+            pool.append(ProcessPoolExecutor(max_workers=args.workers))
+        return pool[0]
+
+    writer = ShardWriter(args.output_dir, state['next_shard'], args.shard_size)
+    last_document_id = state['last_document_id']
+    started = time.perf_counter()
+    try:
+        pages = [iter_document_pages(args.page_size, document_ids=again),
+                 iter_document_pages(args.page_size, after_id=state['last_document_id'])]
+        for source in pages:
+            for rows in source:
+                last_document_id = max(last_document_id, rows[-1]['id'])
+                labelled = []
+                for row in rows:
+                    label = corrections.get(row['id'])
+                    if label is None and not args.corrected_only:
+                        label = row['category']
+                    if label:
+                        labelled.append((row, label))
+                    else:
+                        counters['unlabeled'] += 1
+                        # --corrected-only picks these up through recorrected_ids() once corrected
+                        if not args.corrected_only:
+                            pending.append(row['id'])
+                texts = page_texts([row for row, _ in labelled], pool_factory, counters)
+                for row, label in labelled:
+                    doc_id = row['id']
+                    text = texts.get(doc_id)
+                    if not text or not text.strip():
+                        counters['no_text'] += 1
+                        continue
+                    writer.write({'document_id': doc_id, 'text': text, 'label': label,
+                                  'label_source': 'correction' if doc_id in corrections else 'pipeline',
+                                  'file_type': row['file_type']})
+                    stats.add(label, len(text))
+                    counters['records'] += 1
+                    counters['corrected'] += doc_id in corrections
+        shards = writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if pool:
+            pool[0].shutdown()
+
+    seconds = time.perf_counter() - started
+    state.update(last_document_id=last_document_id, last_correction_id=last_correction_id,
+                 pending_document_ids=sorted(pending), next_shard=writer.next_shard)
+    state['exports'].append(dict(counters, exported_at=datetime.now().isoformat(timespec='seconds'),
+                                 seconds=round(seconds, 1), shards=shards, stats=stats.as_dict()))
+    write_state(args.output_dir, state)
+    return stats, counters, shards, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export labelled documents as sharded, compressed JSONL")
+    parser.add_argument('--output-dir', default=EXPORT_DIR)
+    parser.add_argument('--full', action='store_true', help="Discard earlier shards and export every document")
+    parser.add_argument('--corrected-only', action='store_true', help="Only documents with a correction")
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--shard-size', type=int, default=10000, help="Records per shard")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Extraction processes")
+    args = parser.parse_args()
+
+    database.init_db()
+    stats, counters, shards, seconds = export(args)
+    print(f"Exported {counters['records']} documents ({counters['corrected']} corrected) to "
+          f"{len(shards)} shard(s) in {args.output_dir} in {seconds:.1f}s")
+    print(f"Skipped {counters['unlabeled']} without a label and {counters['no_text']} without text; "
+          f"extracted {counters['extracted']} ({counters['extract_failed']} failed).\n")
+    stats.print_report()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,127 @@
+# scripts/evaluate_classifier.py
+"""
+Compare the embedding centroid classifier with the fine-tuned transformer
+on the labelled examples scripts/train_centroid_classifier.py trains on.
+
+Centroid accuracy is cross-validated (k folds, each fold classified by
+centroids fitted on the others). The transformer is scored on the same
+examples, and the hybrid the pipeline runs (centroids above a confidence
+threshold, the transformer below it) is shown for several thresholds with
+the share of documents that skip the transformer.
+
+    python scripts/evaluate_classifier.py
+    python scripts/evaluate_classifier.py --folds 10 --thresholds 0.5,0.6,0.7,0.8,0.9
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import random
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from config import Config
+from modules import database, semantic_search, centroid_classifier
+from scripts.train_centroid_classifier import load_examples, detailed_label, DATASET_CSV, TRAINING_JSONL
+
+TRANSFORMER_BATCH_SIZE = 16
+
+
+def cross_validate(embeddings, labels, folds, seed, temperature):
+    """[(label, confidence)] for every example, predicted by a model that never saw it."""
+    order = list(range(len(labels)))
+    random.Random(seed).shuffle(order)
+    predictions = [None] * len(labels)
+    model_version = semantic_search.get_model_version()
+    for fold in range(folds):
+        test = order[fold::folds]
+        held_out = set(test)
+        train = [i for i in order if i not in held_out]
+        model = centroid_classifier.fit(embeddings[train], [labels[i] for i in train], model_version, temperature)
+        for i, prediction in zip(test, model.predict_batch(embeddings[test])):
+            predictions[i] = prediction
+    return predictions
+
+
+def transformer_predictions(texts):
+    from modules import document_processor
+    predictions = []
+    for start in range(0, len(texts), TRANSFORMER_BATCH_SIZE):
+        predictions.extend(detailed_label(label) for label in
+                           document_processor.classify_documents(texts[start:start + TRANSFORMER_BATCH_SIZE]))
+    return predictions
+
+
+def accuracy(predicted, labels):
+    return sum(p == t for p, t in zip(predicted, labels)) / len(labels) if labels else float('nan')
+
+
+def per_class(predicted, labels):
+    hits, totals = defaultdict(int), Counter(labels)
+    for p, t in zip(predicted, labels):
+        hits[t] += p == t
+    return {label: hits[label] / total for label, total in sorted(totals.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare centroid and transformer classification accuracy")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--thresholds', default='0.5,0.6,0.7,0.8,0.9')
+    parser.add_argument('--temperature', type=float, default=centroid_classifier.TEMPERATURE)
+    parser.add_argument('--include-uncorrected', action='store_true')
+    parser.add_argument('--csv', default=DATASET_CSV)
+    parser.add_argument('--jsonl', default=TRAINING_JSONL)
+    parser.add_argument('--skip-transformer', action='store_true', help="Only evaluate the centroids")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    thresholds = [float(t) for t in args.thresholds.split(',')]
+
+    database.init_db()
+    texts, embeddings, labels = load_examples(args.include_uncorrected, args.csv, args.jsonl)
+    if len(set(labels)) < 2 or len(labels) < args.folds:
+        print(f"Need at least two categories and {args.folds} examples; found {len(labels)}.")
+        return
+    print(f"{len(labels)} labelled examples: " + ', '.join(f"{k} {v}" for k, v in sorted(Counter(labels).items())))
+
+    started = time.perf_counter()
+    centroid = cross_validate(embeddings, labels, args.folds, args.seed, args.temperature)
+    centroid_seconds = time.perf_counter() - started
+    centroid_labels = [label for label, _ in centroid]
+    print(f"\nCentroids ({args.folds}-fold): accuracy {accuracy(centroid_labels, labels):.3f}, "
+          f"{centroid_seconds / len(labels) * 1e6:.0f} us per document (fit included)")
+    for label, score in per_class(centroid_labels, labels).items():
+        print(f"  {label:20} {score:.3f}")
+
+    transformer = None
+    if not args.skip_transformer:
+        from modules import document_processor
+        if document_processor.model_cls is None:
+            print("\nTransformer: fine-tuned weights not found, so it would guess at random; skipped.")
+        else:
+            started = time.perf_counter()
+            transformer = transformer_predictions(texts)
+            transformer_seconds = time.perf_counter() - started
+            print(f"\nTransformer: accuracy {accuracy(transformer, labels):.3f}, "
+                  f"{transformer_seconds / len(labels) * 1000:.1f} ms per document")
+            for label, score in per_class(transformer, labels).items():
+                print(f"  {label:20} {score:.3f}")
+
+    print(f"\n{'threshold':>9} {'coverage':>9} {'centroid acc':>13} {'hybrid acc':>11}")
+    confidences = np.array([confidence for _, confidence in centroid])
+    for threshold in thresholds:
+        confident = confidences >= threshold
+        covered = [i for i in range(len(labels)) if confident[i]]
+        covered_accuracy = accuracy([centroid_labels[i] for i in covered], [labels[i] for i in covered])
+        hybrid = '-'
+        if transformer is not None:
+            combined = [centroid_labels[i] if confident[i] else transformer[i] for i in range(len(labels))]
+            hybrid = f"{accuracy(combined, labels):.3f}"
+        marker = '  <- CENTROID_MIN_CONFIDENCE' if threshold == Config.CENTROID_MIN_CONFIDENCE else ''
+        print(f"{threshold:9.2f} {confident.mean():9.1%} {covered_accuracy:13.3f} {hybrid:>11}{marker}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,83 +1,389 @@
+# scripts/fine_tune_classifier.py
+"""
+Fine-tune the transformer category classifier on CPU and publish it as a
+new version that running web and worker processes switch to on their next
+batch (modules/classifier_registry.py).
+
+Labelled examples come from scripts/training_data.jsonl, scripts/dataset.csv
+and the latest correction of every corrected document. Labels are mapped to
+document_processor.LABEL_LIST (Invoice -> Finance, Resume -> HR, ...), and
+examples whose label has no broad category are skipped.
+
+Texts are tokenized once, without padding, and cached under
+models/.tokenized keyed by tokenizer and content, so later epochs and runs
+reuse the token ids. Batches are padded only to their longest member, and
+group_by_length puts texts of similar length together so little of each
+batch is padding.
+
+    python scripts/fine_tune_classifier.py                     # full run from the published model
+    python scripts/fine_tune_classifier.py --incremental       # only corrections since the last version
+    python scripts/fine_tune_classifier.py --distill-to models/small-bert --epochs 4
+    python scripts/fine_tune_classifier.py --rollback 20250101-120000
+"""
+import sys
 import os
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, Trainer, TrainingArguments
-import torch
-from torch.utils.data import Dataset
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import csv
+import hashlib
+import json
+import random
+import shutil
+import time
+from collections import Counter
+from datetime import datetime
+
 import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, Trainer, TrainingArguments
+
+from config import Config
+from modules import database, content_store, classifier_registry, document_processor
+
+SCRIPTS_DIR = os.path.abspath(os.path.dirname(__file__))
+DATASET_CSV = os.path.join(SCRIPTS_DIR, 'dataset.csv')
+TRAINING_JSONL = os.path.join(SCRIPTS_DIR, 'training_data.jsonl')
+CACHE_DIR = os.path.join(SCRIPTS_DIR, '..', 'models', '.tokenized')
+MAX_LENGTH = 512
+LABEL2ID = {label: i for i, label in enumerate(document_processor.LABEL_LIST)}
+DETAILED_TO_BROAD = {document_processor.normalize_category(detailed): broad
+                     for broad, detailed in document_processor.BROAD_TO_DETAILED.items()}
+
+
+def broad_label(label):
+    """LABEL_LIST entry for a broad or detailed label, else None."""
+    if not label:
+        return None
+    if label in LABEL2ID:
+        return label
+    return DETAILED_TO_BROAD.get(document_processor.normalize_category(label))
+
+
+def file_examples(csv_path=DATASET_CSV, jsonl_path=TRAINING_JSONL):
+    """[(text, label)] from the labelled dataset files that exist."""
+    examples = []
+    if csv_path and os.path.exists(csv_path):
+        with open(csv_path, encoding='utf-8', newline='') as f:
+            examples.extend((row['text'], row['label']) for row in csv.DictReader(f))
+    if jsonl_path and os.path.exists(jsonl_path):
+        with open(jsonl_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    examples.append((record.get('text'), record.get('label')))
+    return examples
+
+
+def correction_examples(since_id=0):
+    """
+    ([(text, label)], newest correction id) for documents whose latest
+    correction is newer than since_id.
+    """
+    conn = database.get_db_connection()
+    rows = conn.execute('''
+        SELECT c.id, c.document_id, c.corrected_category FROM document_corrections c
+        WHERE c.id = (SELECT c2.id FROM document_corrections c2 WHERE c2.document_id = c.document_id
+                      ORDER BY c2.correction_date DESC, c2.id DESC LIMIT 1)
+          AND c.corrected_category IS NOT NULL AND c.id > ?
+    ''', (since_id,)).fetchall()
+    last_id = conn.execute('SELECT MAX(id) FROM document_corrections').fetchone()[0] or 0
+    conn.close()
+    labels = {row['document_id']: row['corrected_category'] for row in rows}
+    texts = dict(content_store.iter_document_texts(sorted(labels)))
+    return [(texts[doc_id], labels[doc_id]) for doc_id in sorted(labels) if texts.get(doc_id)], last_id
+
+
+def clean(examples):
+    """(texts, label ids) for examples with text and a known label, and a Counter of skipped labels."""
+    texts, labels, skipped = [], [], Counter()
+    for text, label in examples:
+        broad = broad_label(label)
+        if not text or not text.strip() or broad is None:
+            skipped[label] += 1
+            continue
+        texts.append(text)
+        labels.append(LABEL2ID[broad])
+    return texts, labels, skipped
+
+
+def split(texts, labels, eval_fraction, seed):
+    """Per-label random split into (train, held out) index lists."""
+    rng = random.Random(seed)
+    train, held_out = [], []
+    for label in sorted(set(labels)):
+        members = [i for i, value in enumerate(labels) if value == label]
+        rng.shuffle(members)
+        cut = int(len(members) * eval_fraction)
+        held_out += members[:cut]
+        train += members[cut:]
+    return sorted(train), sorted(held_out)
+
+
+# --- Tokenization cache ---
+
+def _cache_key(tokenizer, texts, max_length):
+    digest = hashlib.sha1(f'{tokenizer.name_or_path}|{len(tokenizer)}|{max_length}'.encode('utf-8'))
+    for text in texts:
+        digest.update(hashlib.sha1(text.encode('utf-8')).digest())
+    return digest.hexdigest()[:20]
 
-LABEL_LIST = ['Invoice', 'Resume', 'Contract', 'Technical Manual']
-LABEL2ID = {label: i for i, label in enumerate(LABEL_LIST)}
 
-class TextDataset(Dataset):
-    def __init__(self, texts, labels, tokenizer):
-        self.texts = texts
-        self.labels = [LABEL2ID[label] for label in labels]
-        self.tokenizer = tokenizer
+def tokenize(tokenizer, texts, max_length=MAX_LENGTH, cache_dir=CACHE_DIR, batch_size=256):
+    """
+    Token ids of every text, truncated but not padded. Cached as one flat
+    array plus offsets, so the same texts are never tokenized twice.
+    """
+    path = os.path.join(cache_dir, f'{_cache_key(tokenizer, texts, max_length)}.npz') if cache_dir else None
+    if path and os.path.exists(path):
+        with np.load(path) as data:
+            ids, offsets = data['ids'], data['offsets']
+        return [ids[offsets[i]:offsets[i + 1]].tolist() for i in range(len(texts))]
+
+    encoded = []
+    for start in range(0, len(texts), batch_size):
+        encoded += tokenizer(texts[start:start + batch_size], truncation=True, max_length=max_length)['input_ids']
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        offsets = np.cumsum([0] + [len(ids) for ids in encoded])
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, ids=np.fromiter((t for ids in encoded for t in ids), dtype='int32', count=int(offsets[-1])),
+                     offsets=offsets)
+        os.replace(tmp_path, path)
+    return encoded
+
+
+class TokenizedDataset(torch.utils.data.Dataset):
+    """Pre-tokenized examples; padding happens per batch in collate."""
+
+    def __init__(self, input_ids, labels, teacher_logits=None):
+        self.input_ids = input_ids
+        self.labels = labels
+        self.teacher_logits = teacher_logits
 
     def __len__(self):
-        return len(self.texts)
+        return len(self.input_ids)
 
     def __getitem__(self, idx):
-        encoding = self.tokenizer(self.texts[idx], truncation=True, padding='max_length', max_length=512, return_tensors='pt')
-        item = {key: val.squeeze(0) for key, val in encoding.items()}
-        item['labels'] = torch.tensor(self.labels[idx])
+        item = {'input_ids': self.input_ids[idx], 'labels': self.labels[idx]}
+        if self.teacher_logits is not None:
+            item['teacher_logits'] = self.teacher_logits[idx]
         return item
 
-def classify_text(text, tokenizer, model):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
-    outputs = model(**inputs)
-    logits = outputs.logits
-    probabilities = torch.nn.functional.softmax(logits, dim=1)
-    pred_label_id = torch.argmax(probabilities).item()
-    pred_label = LABEL_LIST[pred_label_id]
-    confidence = probabilities[0][pred_label_id].item()
-    return pred_label, confidence
-
-def train_new_data(tokenizer, model, texts, labels, output_dir, epochs=3):
-    dataset = TextDataset(texts, labels, tokenizer)
+
+def make_collate(tokenizer):
+    """Pad a batch to its longest member only."""
+    def collate(features):
+        batch = tokenizer.pad([{'input_ids': f['input_ids']} for f in features], padding=True, return_tensors='pt')
+        batch['labels'] = torch.tensor([f['labels'] for f in features], dtype=torch.long)
+        if 'teacher_logits' in features[0]:
+            batch['teacher_logits'] = torch.tensor(np.stack([f['teacher_logits'] for f in features]))
+        return batch
+    return collate
+
+
+class DistillationTrainer(Trainer):
+    """Trains on a blend of the teacher's softened predictions and the true labels."""
+
+    def __init__(self, *args, temperature=2.0, alpha=0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        teacher_logits = inputs.pop('teacher_logits')
+        outputs = model(**inputs)
+        soft = F.kl_div(F.log_softmax(outputs.logits / self.temperature, dim=-1),
+                        F.softmax(teacher_logits / self.temperature, dim=-1),
+                        reduction='batchmean') * self.temperature ** 2
+        loss = self.alpha * soft + (1 - self.alpha) * outputs.loss
+        return (loss, outputs) if return_outputs else loss
+
+
+# --- Training ---
+
+def load_model(path):
+    """Tokenizer and classifier from path, with a LABEL_LIST head (new when path is a base model)."""
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = AutoModelForSequenceClassification.from_pretrained(
+        path, num_labels=len(LABEL2ID), id2label=dict(enumerate(document_processor.LABEL_LIST)),
+        label2id=LABEL2ID, ignore_mismatched_sizes=True)
+    return tokenizer, model
+
+
+def predict_logits(model, tokenizer, input_ids, batch_size):
+    """Logits for pre-tokenized examples, shortest first so batches carry little padding."""
+    model.eval()
+    order = sorted(range(len(input_ids)), key=lambda i: len(input_ids[i]))
+    logits = np.zeros((len(input_ids), len(LABEL2ID)), dtype='float32')
+    with torch.no_grad():
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            batch = tokenizer.pad([{'input_ids': input_ids[i]} for i in chunk], padding=True, return_tensors='pt')
+            logits[chunk] = model(**batch).logits.numpy()
+    return logits
+
+
+def accuracy(model, tokenizer, input_ids, labels, batch_size):
+    if not labels:
+        return None
+    predicted = predict_logits(model, tokenizer, input_ids, batch_size).argmax(axis=1)
+    return round(float((predicted == np.array(labels)).mean()), 4)
+
+
+def train(model, tokenizer, dataset, args, output_dir, trainer_cls=Trainer, **trainer_kwargs):
     training_args = TrainingArguments(
         output_dir=output_dir,
-        num_train_epochs=epochs,
-        per_device_train_batch_size=4,
+        num_train_epochs=args.epochs,
+        per_device_train_batch_size=args.batch_size,
+        learning_rate=args.learning_rate,
+        group_by_length=True,
         logging_steps=10,
-        save_strategy="epoch",
-        evaluation_strategy="no",
-        disable_tqdm=False,
-        seed=42
+        save_strategy='no',
+        report_to=[],
+        remove_unused_columns=False,
+        dataloader_num_workers=0,
+        disable_tqdm=True,
+        seed=args.seed,
     )
-    trainer = Trainer(model=model, args=training_args, train_dataset=dataset)
+    trainer = trainer_cls(model=model, args=training_args, train_dataset=dataset,
+                          data_collator=make_collate(tokenizer), **trainer_kwargs)
     trainer.train()
-    trainer.save_model(output_dir)
-    tokenizer.save_pretrained(output_dir)
+    model.eval()
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tune and publish the transformer category classifier")
+    parser.add_argument('--base', help="Model to start from (default: the published version, else Config.MODEL_PATH)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Train the published version on corrections made since it was trained")
+    parser.add_argument('--replay', type=float, default=0.2,
+                        help="With --incremental, share of earlier file examples mixed in to avoid forgetting")
+    parser.add_argument('--distill-to', help="Also train this smaller model on the fine-tuned model's predictions "
+                                             "and publish it instead")
+    parser.add_argument('--distill-temperature', type=float, default=2.0)
+    parser.add_argument('--distill-alpha', type=float, default=0.5, help="Weight of the teacher's predictions")
+    parser.add_argument('--csv', default=DATASET_CSV, help="Labelled CSV with text,label columns ('' to skip)")
+    parser.add_argument('--jsonl', default=TRAINING_JSONL, help="Labelled JSONL with text and label ('' to skip)")
+    parser.add_argument('--epochs', type=float, default=3)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--learning-rate', type=float, default=5e-5)
+    parser.add_argument('--max-length', type=int, default=MAX_LENGTH)
+    parser.add_argument('--eval-fraction', type=float, default=0.1)
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Tokenized dataset cache ('' to disable)")
+    parser.add_argument('--keep', type=int, default=5, help="Published versions to keep")
+    parser.add_argument('--no-activate', action='store_true', help="Publish without switching workers to it")
+    parser.add_argument('--rollback', metavar='VERSION', help="Point workers at an earlier version and exit")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if not 0 <= args.replay < 1:
+        parser.error("--replay must be in [0, 1)")
+
+    if args.rollback:
+        classifier_registry.activate(args.rollback)
+        print(f"Classifier version {args.rollback} is now active.")
+        return
+
+    torch.set_num_threads(max(1, args.threads))
+    random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    database.init_db()
+
+    previous = classifier_registry.read_metadata()
+    if args.incremental:
+        if not classifier_registry.current_version():
+            print("--incremental needs a published version to continue from.")
+            return
+        base = classifier_registry.current_dir()
+        corrections, last_correction_id = correction_examples(previous.get('last_correction_id', 0))
+        if not corrections:
+            print(f"No corrections since version {classifier_registry.current_version()}.")
+            return
+        from_files = file_examples(args.csv, args.jsonl)
+        # Replayed examples make up --replay of the mix
+        replay_count = min(len(from_files), int(len(corrections) * args.replay / (1 - args.replay)))
+        examples = corrections + random.Random(args.seed).sample(from_files, replay_count)
+    else:
+        base = args.base or (classifier_registry.current_dir() if classifier_registry.current_version()
+                             else Config.MODEL_PATH)
+        corrections, last_correction_id = correction_examples()
+        examples = file_examples(args.csv, args.jsonl) + corrections
 
-if __name__ == "__main__":
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    model_dir = os.path.join(script_dir, '..', 'models', 'finetuned_classifier')
+    texts, labels, skipped = clean(examples)
+    if len(set(labels)) < 2:
+        print(f"Need examples of at least two categories; found {len(labels)} usable examples.")
+        return
+    print(f"{len(labels)} examples ({len(corrections)} from corrections): " +
+          ', '.join(f"{document_processor.LABEL_LIST[k]} {v}" for k, v in sorted(Counter(labels).items())))
+    if skipped:
+        print("Skipped (no text or no broad category): " + ', '.join(f"{k} {v}" for k, v in skipped.items()))
 
-    tokenizer = AutoTokenizer.from_pretrained(model_dir)
-    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    workdir = os.path.join(classifier_registry.VERSIONS_DIR, f'.train-{os.getpid()}')
+    try:
+        version = run(args, base, texts, labels, corrections, last_correction_id, previous, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    removed = classifier_registry.prune(args.keep)
+    state = 'published' if not args.no_activate else 'saved (not active; use --rollback to switch)'
+    print(f"Version {version} {state}; removed {len(removed)} old version(s).")
 
-    model.train()  # Set model to training mode
 
-    # Example: add new data samples for training
-    new_texts = [
-        "Sample invoice text here...",
-        "New resume text example...",
-        "A freshly added contract text.",
-        "Updated technical manual content."
-    ]
-    new_labels = ['Invoice', 'Resume', 'Contract', 'Technical Manual']
+def run(args, base, texts, labels, corrections, last_correction_id, previous, workdir):
+    """Train (and distil) on the examples and publish; returns the version name."""
+    train_idx, eval_idx = split(texts, labels, args.eval_fraction, args.seed)
+    started = time.perf_counter()
+    tokenizer, model = load_model(base)
+    input_ids = tokenize(tokenizer, texts, args.max_length, args.cache_dir)
+    print(f"Tokenized in {time.perf_counter() - started:.1f}s (from {base}); "
+          f"mean length {np.mean([len(ids) for ids in input_ids]):.0f} tokens")
 
-    train_new_data(tokenizer, model, new_texts, new_labels, model_dir, epochs=3)
+    started = time.perf_counter()
+    train(model, tokenizer, TokenizedDataset([input_ids[i] for i in train_idx], [labels[i] for i in train_idx]),
+          args, workdir)
+    eval_ids, eval_labels = [input_ids[i] for i in eval_idx], [labels[i] for i in eval_idx]
+    score = accuracy(model, tokenizer, eval_ids, eval_labels, args.batch_size)
+    print(f"Trained in {time.perf_counter() - started:.0f}s; held-out accuracy {score}")
 
-    model.eval()  # Switch back to eval mode for inference
+    metadata = {
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'base': os.path.relpath(base) if os.path.exists(base) else base,
+        'parent_version': classifier_registry.current_version(),
+        'incremental': args.incremental,
+        'examples': len(labels),
+        'from_corrections': len(corrections),
+        'last_correction_id': last_correction_id,
+        'labels': document_processor.LABEL_LIST,
+        'epochs': args.epochs,
+        'max_length': args.max_length,
+        'eval_examples': len(eval_labels),
+        'accuracy': score,
+    }
 
-    print("Enter text to classify (or 'quit' to exit):")
-    while True:
-        text = input("\n> ")
-        if text.lower() == 'quit':
-            break
-        label, conf = classify_text(text, tokenizer, model)
-        print(f"Predicted category: {label} (Confidence: {conf:.2f})")
+    if args.distill_to:
+        started = time.perf_counter()
+        teacher_logits = predict_logits(model, tokenizer, [input_ids[i] for i in train_idx], args.batch_size)
+        teacher_params = sum(p.numel() for p in model.parameters())
+        tokenizer, model = load_model(args.distill_to)
+        student_ids = tokenize(tokenizer, texts, args.max_length, args.cache_dir)
+        dataset = TokenizedDataset([student_ids[i] for i in train_idx], [labels[i] for i in train_idx],
+                                   list(teacher_logits))
+        train(model, tokenizer, dataset, args, workdir, trainer_cls=DistillationTrainer,
+              temperature=args.distill_temperature, alpha=args.distill_alpha)
+        student_score = accuracy(model, tokenizer, [student_ids[i] for i in eval_idx], eval_labels, args.batch_size)
+        print(f"Distilled {len(train_idx)} examples into {args.distill_to} in "
+              f"{time.perf_counter() - started:.0f}s; held-out accuracy {student_score}")
+        metadata.update(teacher_accuracy=score, accuracy=student_score, distilled_to=args.distill_to,
+                        teacher_parameters=teacher_params)
+    metadata['parameters'] = sum(p.numel() for p in model.parameters())
 
+    if previous.get('accuracy') is not None and metadata['accuracy'] is not None:
+        print(f"Published version {previous.get('version')} scored {previous['accuracy']} on its own held-out set.")
+    return classifier_registry.publish(model, tokenizer, metadata, activate=not args.no_activate)
 
 
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,75 @@
 # scripts/inspect_data.py
 import os
+import gzip
+import glob
 import json
 from collections import Counter
 
 DATA_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'training_data.jsonl')
+EXPORT_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'training_data')
+
+
+class LabelStats:
+    """Document count and text length per label; fed one record at a time."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total_length = 0
+        self.total_docs = 0
+
+    def add(self, label, length):
+        self.counts[label or 'Unknown'] += 1
+        self.total_length += length
+        self.total_docs += 1
+
+    def as_dict(self):
+        return {
+            'total_documents': self.total_docs,
+            'average_length': self.total_length // self.total_docs if self.total_docs else 0,
+            'per_category': dict(self.counts.most_common()),
+        }
+
+    def print_report(self):
+        print("Labeled Data Statistics:")
+        print("========================")
+        print(f"Total documents: {self.total_docs}")
+        if self.total_docs > 0:
+            print(f"Average document length (characters): {self.total_length // self.total_docs}")
+        print("\nDocument count per category:")
+        for category, count in self.counts.most_common():
+            print(f"  {category}: {count}")
+
+
+def iter_records(path):
+    """Records of a .jsonl or .jsonl.gz file."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
 
 def main():
-    if not os.path.exists(DATA_PATH):
+    paths = [path for path in [DATA_PATH] if os.path.exists(path)]
+    paths += sorted(glob.glob(os.path.join(EXPORT_DIR, 'part-*.jsonl.gz')))
+    if not paths:
         print("Training data file not found:", DATA_PATH)
         return
 
-    counts = Counter()
-    total_length = 0
-    total_docs = 0
+    # Exports re-write documents whose label was corrected; the newest record wins
+    stats = LabelStats()
+    latest = {}
+    for path in paths:
+        for data in iter_records(path):
+            if 'document_id' in data:
+                latest[data['document_id']] = (data.get('label'), len(data.get('text', '')))
+            else:
+                stats.add(data.get('label'), len(data.get('text', '')))
+    for label, length in latest.values():
+        stats.add(label, length)
+
+    stats.print_report()
 
-    with open(DATA_PATH, 'r', encoding='utf-8') as f:
-        for line in f:
-            data = json.loads(line)
-            label = data.get('label', 'Unknown')
-            text = data.get('text', '')
-            counts[label] += 1
-            total_length += len(text)
-            total_docs += 1
-
-    print("Labeled Data Statistics:")
-    print("========================")
-    print(f"Total documents: {total_docs}")
-    if total_docs > 0:
-        print(f"Average document length (characters): {total_length // total_docs}")
-    print("\nDocument count per category:")
-    for category, count in counts.items():
-        print(f"  {category}: {count}")
 
 if __name__ == '__main__':
     main()
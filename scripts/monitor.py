@@ -1,26 +1,27 @@
 # scripts/monitor.py
-import logging
-from logging.handlers import RotatingFileHandler
+"""
+Helpers for security and processing events. Records go through the JSON
+logging set up by modules.structured_logging (stderr and logs/app.log).
+"""
+import sys
 import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-LOG_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'logs')
-os.makedirs(LOG_DIR, exist_ok=True)
+import logging
 
-log_path = os.path.join(LOG_DIR, 'app.log')
+from modules import structured_logging
 
+structured_logging.configure_logging()
 logger = logging.getLogger('docindexer')
-logger.setLevel(logging.INFO)
 
-handler = RotatingFileHandler(log_path, maxBytes=10*1024*1024, backupCount=5)
-formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
 
 def log_failed_login(username, ip):
-    logger.warning(f"Failed login attempt for username={username} from IP={ip}")
+    logger.warning("Failed login", extra={'username': username, 'ip': ip})
+
 
 def log_processing_error(document_id, error):
-    logger.error(f"Error processing document {document_id}: {error}")
+    logger.error("Error processing document %s: %s", document_id, error, extra={'document_id': document_id})
+
 
 def log_info(message):
     logger.info(message)
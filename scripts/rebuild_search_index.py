@@ -2,46 +2,57 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import json
 import numpy as np
-import faiss
-from modules import database, semantic_search
+from modules import database, semantic_search, content_store
 
+ENCODE_BATCH_SIZE = 64
 
-def rebuild_faiss_index():
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, summary FROM documents WHERE summary IS NOT NULL')
-    rows = cursor.fetchall()
-    conn.close()
-
-    if not rows:
-        print("No documents with summaries found to index.")
-        return
+
+def embed_missing_documents(model_version):
+    """
+    Encode documents that have no stored vector for the current model.
+    Uses the stored extracted text, falling back to the summary for documents
+    processed before the content store existed.
+    """
+    missing_ids = content_store.missing_embedding_ids(model_version)
+    if not missing_ids:
+        return 0
+
+    texts = dict(content_store.iter_document_texts(missing_ids))
+    without_text = [doc_id for doc_id in missing_ids if not texts.get(doc_id)]
+    if without_text:
+        texts.update(content_store.get_document_summaries(without_text))
+
+    to_encode = [doc_id for doc_id in missing_ids if texts.get(doc_id)]
+    if not to_encode:
+        return 0
 
     embedding_model = semantic_search.get_embedding_model()
-    # Dynamically get dimension from one sample embedding
-    sample_embedding = semantic_search.generate_embedding(rows[0][1], embedding_model)
-    dimension = len(sample_embedding)
+    for start in range(0, len(to_encode), ENCODE_BATCH_SIZE):
+        batch_ids = to_encode[start:start + ENCODE_BATCH_SIZE]
+        matrix = semantic_search.generate_embeddings([texts[doc_id] for doc_id in batch_ids], embedding_model,
+                                                     batch_size=ENCODE_BATCH_SIZE)
+        content_store.save_embeddings(batch_ids, model_version, matrix)
+    return len(to_encode)
 
-    index = faiss.IndexFlatL2(dimension)
-    id_map = {}
 
-    for idx, (doc_id, text) in enumerate(rows):
-        embedding = semantic_search.generate_embedding(text, embedding_model)
-        embedding = np.array(embedding, dtype='float32')
-        index.add(np.expand_dims(embedding, axis=0))
-        id_map[str(idx)] = doc_id
+def rebuild_faiss_index():
+    model_version = semantic_search.get_model_version()
 
-    model_folder = os.path.dirname(semantic_search.FAISS_INDEX_PATH)
-    os.makedirs(model_folder, exist_ok=True)
+    encoded = embed_missing_documents(model_version)
+    if encoded:
+        print(f"Encoded {encoded} documents without stored embeddings.")
 
-    faiss.write_index(index, semantic_search.FAISS_INDEX_PATH)
-    with open(semantic_search.IDX_MAP_PATH, 'w') as f:
-        json.dump(id_map, f)
+    # Everything now comes from stored vectors: one bulk read, one index add
+    doc_ids, matrix = content_store.load_embeddings(model_version)
+    if not doc_ids:
+        print("No documents with text or summaries found to index.")
+        return
 
+    index = semantic_search.build_index(doc_ids, np.asarray(matrix, dtype='float32'))
     print(f"Rebuilt FAISS index with {index.ntotal} documents.")
 
 
 if __name__ == "__main__":
+    database.init_db()
     rebuild_faiss_index()
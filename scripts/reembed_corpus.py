@@ -0,0 +1,90 @@
+# scripts/reembed_corpus.py
+"""
+Re-embed the corpus with another embedding model and switch search over
+to it without downtime (modules/reembedding.py).
+
+The current index keeps serving while the new one is built; stop the
+script at any time and run it again to resume. Run it next to the app, e.g.
+under nohup, and throttle it so uploads are not starved:
+
+    python scripts/reembed_corpus.py --model sentence-transformers/all-mpnet-base-v2 --docs-per-second 20 --max-backlog 50
+    python scripts/reembed_corpus.py --status
+    python scripts/reembed_corpus.py --rollback
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import time
+
+from config import Config
+from modules import database, semantic_search, reembedding
+
+
+def print_status():
+    data = semantic_search.read_generations()
+    if not data:
+        active = semantic_search.active_generation()
+        print(f"No re-embedding yet; the original index serves searches ({active['model_version']}).")
+        return
+    print(json.dumps({key: data.get(key) for key in ('active', 'shadow', 'retired')}, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed every document into a new index generation and switch to it")
+    parser.add_argument('--model', default=Config.EMBEDDING_MODEL_NAME,
+                        help="Embedding model to move to (default: EMBEDDING_MODEL_NAME)")
+    parser.add_argument('--docs-per-second', type=float, help="Encoding rate cap")
+    parser.add_argument('--max-backlog', type=int,
+                        help="Pause while more documents than this are waiting in the processing pipeline")
+    parser.add_argument('--no-switch', action='store_true', help="Build the shadow index but keep the current one active")
+    parser.add_argument('--keep-retired', type=int, default=1, help="Older generations whose index files are kept")
+    parser.add_argument('--status', action='store_true')
+    parser.add_argument('--rollback', action='store_true', help="Switch back to the previous generation")
+    args = parser.parse_args()
+
+    database.init_db()
+    if args.status:
+        print_status()
+        return
+    if args.rollback:
+        generation = reembedding.rollback(args.docs_per_second, args.max_backlog)
+        print(f"Searches use generation {generation['id']} ({generation['model_version']}) again, "
+              f"with the documents indexed since it was retired.")
+        return
+
+    active = semantic_search.active_generation()
+    if active['model_version'] == args.model and not semantic_search.shadow_generation():
+        print(f"Generation {active['id']} already uses {args.model}; nothing to do.")
+        return
+
+    started = time.perf_counter()
+
+    def progress(added):
+        elapsed = time.perf_counter() - started
+        print(f"  {added} documents embedded ({added / elapsed if elapsed else 0:.1f}/s)")
+
+    shadow = reembedding.begin(args.model)
+    print(f"Building generation {shadow['id']} with {args.model} while generation {active['id']} "
+          f"({active['model_version']}) serves searches")
+    reembedding.fill(shadow, args.docs_per_second, args.max_backlog, progress)
+    reembedding.update_progress(shadow)
+    if args.no_switch:
+        print("Shadow generation is complete; run again without --no-switch to switch over.")
+        return
+
+    generation = reembedding.switch()
+    time.sleep(reembedding.SETTLE_SECONDS)
+    caught_up = reembedding.fill(generation)
+    removed = reembedding.prune_retired(args.keep_retired)
+    print(f"Searches now use generation {generation['id']} ({args.model}); caught up {caught_up} documents "
+          f"indexed during the switch, removed the files of {len(removed)} old generation(s) "
+          f"in {time.perf_counter() - started:.0f}s.")
+    if args.model != Config.EMBEDDING_MODEL_NAME:
+        print(f"Set EMBEDDING_MODEL_NAME to {args.model} so a fresh deployment starts with the same model.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# scripts/resume_processing.py
+"""
+Re-queue every document whose processing pipeline has not finished, e.g.
+after a worker or broker outage. Stages already marked done in
+document_stages are skipped by the tasks, so only the missing work runs.
+
+    python scripts/resume_processing.py             # queue all unfinished documents
+    python scripts/resume_processing.py --dry-run   # only list them with their stage status
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+
+from modules import database, pipeline_state
+
+
+def describe(document_id):
+    statuses = pipeline_state.stage_statuses(document_id)
+    parts = []
+    for stage in pipeline_state.STAGE_NAMES:
+        row = statuses.get(stage)
+        if row is None:
+            parts.append(f"{stage}=pending")
+        elif row['status'] == 'failed':
+            parts.append(f"{stage}=failed x{row['attempts']} ({row['error']})")
+        else:
+            parts.append(f"{stage}={row['status']}")
+    return ', '.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-queue documents with unfinished processing stages")
+    parser.add_argument('--dry-run', action='store_true', help="List the documents without queueing them")
+    parser.add_argument('--limit', type=int, default=None, help="Queue at most this many documents")
+    args = parser.parse_args()
+
+    database.init_db()
+    document_ids = pipeline_state.incomplete_documents(limit=args.limit)
+    if args.dry_run:
+        for document_id in document_ids:
+            print(f"{document_id}: {describe(document_id)}")
+        print(f"{len(document_ids)} documents with unfinished stages.")
+        return
+
+    from modules.task_backend import enqueue_document
+    conn = database.get_db_connection()
+    for document_id in document_ids:
+        row = conn.execute('SELECT file_path FROM documents WHERE id = ?', (document_id,)).fetchone()
+        path = row['file_path'] if row else None
+        enqueue_document(document_id, os.path.getsize(path) if path and os.path.exists(path) else None)
+    conn.close()
+    print(f"Queued {len(document_ids)} documents.")
+
+
+if __name__ == '__main__':
+    main()
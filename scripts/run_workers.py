@@ -0,0 +1,65 @@
+# scripts/run_workers.py
+"""
+Start one Celery worker per pipeline queue with the concurrency, pool and
+prefetch settings from Config.CELERY_QUEUES.
+
+    python scripts/run_workers.py                 # all queues
+    python scripts/run_workers.py summarize index # selected queues
+    python scripts/run_workers.py --print         # only print the commands
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import signal
+import subprocess
+
+from config import Config
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def worker_command(queue, settings, loglevel='info'):
+    return [
+        sys.executable, '-m', 'celery', '-A', 'celery_worker', 'worker',
+        '-Q', queue,
+        '-n', f'{queue}@%h',
+        '--pool', settings.get('pool', 'prefork'),
+        '--concurrency', str(settings['concurrency']),
+        '--prefetch-multiplier', str(settings['prefetch_multiplier']),
+        '--loglevel', loglevel,
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Start one Celery worker per pipeline queue")
+    parser.add_argument('queues', nargs='*', help="Queues to start (default: all)")
+    parser.add_argument('--print', dest='print_only', action='store_true', help="Print the commands and exit")
+    parser.add_argument('--loglevel', default='info')
+    args = parser.parse_args()
+
+    queues = args.queues or list(Config.CELERY_QUEUES)
+    unknown = [q for q in queues if q not in Config.CELERY_QUEUES]
+    if unknown:
+        parser.error(f"Unknown queues: {', '.join(unknown)}")
+
+    commands = [worker_command(q, Config.CELERY_QUEUES[q], args.loglevel) for q in queues]
+    if args.print_only:
+        for command in commands:
+            print(' '.join(command))
+        return
+
+    processes = [subprocess.Popen(command, cwd=PROJECT_ROOT) for command in commands]
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        for process in processes:
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# scripts/train_centroid_classifier.py
+"""
+Train the embedding centroid classifier (modules/centroid_classifier.py).
+
+Labelled examples come from scripts/dataset.csv, scripts/training_data.jsonl
+and every document whose category was corrected (its latest correction
+wins). --include-uncorrected also learns from the categories the pipeline
+assigned, which only helps once those are mostly right. Document vectors
+stored for the current embedding model are reused.
+
+    python scripts/train_centroid_classifier.py
+    python scripts/train_centroid_classifier.py --include-uncorrected --temperature 0.03
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import csv
+import json
+from collections import Counter
+
+import numpy as np
+
+from modules import database, content_store, semantic_search, centroid_classifier
+
+SCRIPTS_DIR = os.path.abspath(os.path.dirname(__file__))
+DATASET_CSV = os.path.join(SCRIPTS_DIR, 'dataset.csv')
+TRAINING_JSONL = os.path.join(SCRIPTS_DIR, 'training_data.jsonl')
+ENCODE_BATCH_SIZE = 64
+
+
+def detailed_label(label):
+    """Category as stored in documents.category; broad training labels are mapped first."""
+    from modules import document_processor
+    return document_processor.normalize_category(document_processor.BROAD_TO_DETAILED.get(label, label))
+
+
+def file_examples(csv_path=DATASET_CSV, jsonl_path=TRAINING_JSONL):
+    """[(text, label)] from the labelled dataset files that exist."""
+    examples = []
+    if csv_path and os.path.exists(csv_path):
+        with open(csv_path, encoding='utf-8', newline='') as f:
+            examples.extend((row['text'], row['label']) for row in csv.DictReader(f))
+    if jsonl_path and os.path.exists(jsonl_path):
+        with open(jsonl_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    examples.append((record['text'], record['label']))
+    return [(text, detailed_label(label)) for text, label in examples if text and text.strip() and label]
+
+
+def document_labels(include_uncorrected=False):
+    """{document_id: category} for corrected documents, plus the rest when include_uncorrected."""
+    labels = {}
+    if include_uncorrected:
+        conn = database.get_db_connection()
+        for row in conn.execute('SELECT id, category FROM documents WHERE category IS NOT NULL'):
+            labels[row['id']] = row['category']
+        conn.close()
+    labels.update(centroid_classifier.corrected_labels())
+    return {doc_id: detailed_label(label) for doc_id, label in labels.items()}
+
+
+def encode(texts):
+    model = semantic_search.get_embedding_model()
+    if not texts:
+        return np.zeros((0, 0), dtype='float32')
+    return np.vstack([semantic_search.generate_embeddings(texts[start:start + ENCODE_BATCH_SIZE], model,
+                                                          batch_size=ENCODE_BATCH_SIZE)
+                      for start in range(0, len(texts), ENCODE_BATCH_SIZE)])
+
+
+def document_examples(labels, model_version):
+    """(texts, embeddings, labels) for labelled documents, encoding and storing missing vectors."""
+    document_ids = sorted(labels)
+    stored_ids, stored = content_store.load_embeddings(model_version)
+    vectors = {doc_id: stored[i] for i, doc_id in enumerate(stored_ids) if doc_id in labels}
+    texts = dict(content_store.iter_document_texts(document_ids))
+
+    missing = [doc_id for doc_id in document_ids if doc_id not in vectors and texts.get(doc_id)]
+    if missing:
+        matrix = encode([texts[doc_id] for doc_id in missing])
+        content_store.save_embeddings(missing, model_version, matrix)
+        vectors.update(zip(missing, matrix))
+
+    kept = [doc_id for doc_id in document_ids if doc_id in vectors]
+    return ([texts.get(doc_id, '') for doc_id in kept],
+            np.vstack([vectors[doc_id] for doc_id in kept]) if kept else None,
+            [labels[doc_id] for doc_id in kept])
+
+
+def load_examples(include_uncorrected=False, csv_path=DATASET_CSV, jsonl_path=TRAINING_JSONL):
+    """(texts, embeddings, labels) from every source."""
+    model_version = semantic_search.get_model_version()
+    from_files = file_examples(csv_path, jsonl_path)
+    texts = [text for text, _ in from_files]
+    labels = [label for _, label in from_files]
+    parts = [encode(texts)] if texts else []
+
+    doc_texts, doc_matrix, doc_labels = document_examples(document_labels(include_uncorrected), model_version)
+    if doc_matrix is not None:
+        texts += doc_texts
+        labels += doc_labels
+        parts.append(doc_matrix)
+    embeddings = np.vstack(parts) if parts else np.zeros((0, 0), dtype='float32')
+    return texts, embeddings, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the embedding centroid classifier")
+    parser.add_argument('--include-uncorrected', action='store_true',
+                        help="Also learn from categories assigned by the pipeline")
+    parser.add_argument('--csv', default=DATASET_CSV, help="Labelled CSV with text,label columns ('' to skip)")
+    parser.add_argument('--jsonl', default=TRAINING_JSONL, help="Labelled JSONL with text and label ('' to skip)")
+    parser.add_argument('--temperature', type=float, default=centroid_classifier.TEMPERATURE)
+    parser.add_argument('--output', default=centroid_classifier.MODEL_PATH)
+    args = parser.parse_args()
+
+    database.init_db()
+    _, embeddings, labels = load_examples(args.include_uncorrected, args.csv, args.jsonl)
+    if not labels:
+        print("No labelled examples found.")
+        return
+    model = centroid_classifier.fit(embeddings, labels, semantic_search.get_model_version(), args.temperature)
+    path = model.save(args.output)
+    print(f"Trained on {len(labels)} examples ({model.dimension}-d vectors from {model.model_version}):")
+    for label, count in sorted(Counter(labels).items()):
+        print(f"  {label:20} {count}")
+    print(f"Saved {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# scripts/worker_memory.py
+"""
+Print the memory of every running Celery worker and its prefork children.
+With models preloaded in the parent the children's private memory should
+stay small; pss shows each process's share of the pages they have in common.
+
+    python scripts/worker_memory.py            # every celery worker on this host
+    python scripts/worker_memory.py 4242 4300  # selected worker parent pids
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+
+from modules import worker_bootstrap
+
+
+def _argv(pid):
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return f.read().decode('utf-8', 'replace').split('\0')
+    except OSError:
+        return []
+
+
+def _is_worker(pid):
+    # "celery -A celery_worker worker ..." or "python -m celery ... worker ..."
+    argv = _argv(pid)
+    return any(os.path.basename(arg) == 'celery' for arg in argv[:3]) and 'worker' in argv
+
+
+def worker_parents():
+    """Pids of celery worker processes whose parent is not itself a worker."""
+    workers = {int(pid) for pid in os.listdir('/proc') if pid.isdigit() and _is_worker(pid)}
+    children = {child for pid in workers for child in worker_bootstrap.child_pids(pid)}
+    return sorted(workers - children)
+
+
+def _mib(value):
+    return f"{value / 2**20:8.1f}"
+
+
+def report(parent_pid):
+    print(f"worker {parent_pid}: {' '.join(_argv(parent_pid)).strip()[:100]}")
+    print(f"  {'pid':>8} {'rss MiB':>8} {'pss MiB':>8} {'private':>8}")
+    usage = worker_bootstrap.memory_usage(parent_pid)
+    print(f"  {parent_pid:>8} {_mib(usage['rss'])} {_mib(usage['pss'])} {_mib(usage['private'])}  (parent)")
+    private = []
+    for pid in worker_bootstrap.child_pids(parent_pid):
+        usage = worker_bootstrap.memory_usage(pid)
+        private.append(usage['private'])
+        print(f"  {pid:>8} {_mib(usage['rss'])} {_mib(usage['pss'])} {_mib(usage['private'])}")
+    if private:
+        print(f"  private memory per added child: {sum(private) / len(private) / 2**20:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report memory per Celery worker child")
+    parser.add_argument('pids', nargs='*', type=int, help="Worker parent pids (default: all workers)")
+    args = parser.parse_args()
+
+    parents = args.pids or worker_parents()
+    if not parents:
+        print("No celery workers found.")
+        return
+    for pid in parents:
+        report(pid)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+// Dashboard "Load more": fetch the next keyset page as JSON and append it.
+// Without JavaScript the button is a plain link to the next page.
+document.addEventListener('DOMContentLoaded', () => {
+  const button = document.querySelector('#load-more');
+  if (!button) return;
+  const tableBody = document.querySelector('#document-table tbody');
+  const documentUrl = (id) => button.dataset.documentUrl.replace(/\/0$/, '/' + id);
+
+  const cell = (text) => {
+    const td = document.createElement('td');
+    td.textContent = text;
+    return td;
+  };
+
+  button.addEventListener('click', async (e) => {
+    e.preventDefault();
+    const url = new URL(button.dataset.apiUrl, window.location.origin);
+    url.searchParams.set('cursor', button.dataset.nextCursor);
+    button.classList.add('disabled');
+
+    const response = await fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+    if (!response.ok) {
+      button.classList.remove('disabled');
+      alert('Could not load more documents.');
+      return;
+    }
+    const page = await response.json();
+    for (const doc of page.documents) {
+      const row = document.createElement('tr');
+      row.appendChild(cell(doc.title || doc.filename));
+      row.appendChild(cell(doc.category));
+      row.appendChild(cell(doc.author || '-'));
+      row.appendChild(cell(doc.upload_date));
+      const action = document.createElement('td');
+      const link = document.createElement('a');
+      link.href = documentUrl(doc.id);
+      link.className = 'btn btn-primary btn-sm';
+      link.textContent = 'View';
+      action.appendChild(link);
+      row.appendChild(action);
+      tableBody.appendChild(row);
+    }
+
+    if (page.next_cursor) {
+      button.dataset.nextCursor = page.next_cursor;
+      button.classList.remove('disabled');
+    } else {
+      button.remove();
+    }
+  });
+});
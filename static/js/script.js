@@ -16,7 +16,6 @@ document.addEventListener('DOMContentLoaded', () => {
       alert('Please select a file.');
       return;
     }
-    const file = fileInput.files[0];
     const xhr = new XMLHttpRequest();
     xhr.open('POST', form.action, true);
     xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
@@ -38,7 +37,9 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
     const formData = new FormData();
-    formData.append(fileInput.name, file);
+    for (const file of fileInput.files) {
+      formData.append(fileInput.name, file);
+    }
     xhr.send(formData);
   });
 });
@@ -0,0 +1,18 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh, fully migrated database in tmp_path; yields its path."""
+    from modules import database
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'test.db'))
+    database.init_db()
+    yield database.DB_PATH
+    database.release_thread_connection()
+    database.get_pool().close_all()
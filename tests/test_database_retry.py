@@ -0,0 +1,87 @@
+# tests/test_database_retry.py
+import sqlite3
+
+import pytest
+
+from modules import database
+
+
+@pytest.fixture
+def conn(db, monkeypatch):
+    monkeypatch.setattr(database.time, 'sleep', lambda seconds: None)
+    return database.get_db_connection()
+
+
+def user_count(conn):
+    return conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+
+def busy_once(conn):
+    """A write that opens its own transaction and hits SQLITE_BUSY on the first call."""
+    calls = []
+
+    def write():
+        calls.append(1)
+        conn.execute("INSERT INTO users (username, password, role) VALUES (?, 'x', 'hr')", (f'user{len(calls)}',))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError('database is locked')
+        conn.commit()
+        return len(calls)
+    return write, calls
+
+
+def test_own_transaction_is_rolled_back_and_retried(conn):
+    write, calls = busy_once(conn)
+
+    assert database.run_with_retry(write) == 2
+    assert [row['username'] for row in conn.execute('SELECT username FROM users')] == ['user2']
+
+
+def test_busy_inside_the_callers_transaction_is_raised_not_retried(conn):
+    conn.execute("INSERT INTO users (username, password, role) VALUES ('caller', 'x', 'admin')")
+    write, calls = busy_once(conn)
+
+    with pytest.raises(sqlite3.OperationalError):
+        database.run_with_retry(write)
+
+    assert len(calls) == 1
+    assert conn.in_transaction
+    conn.commit()
+    assert user_count(conn) == 2
+
+
+def test_other_operational_errors_are_not_retried(conn):
+    calls = []
+
+    def broken():
+        calls.append(1)
+        conn.execute('SELECT * FROM no_such_table')
+
+    with pytest.raises(sqlite3.OperationalError):
+        database.run_with_retry(broken)
+    assert len(calls) == 1
+
+
+def test_gives_up_after_the_last_retry(conn):
+    calls = []
+
+    def always_busy():
+        calls.append(1)
+        raise sqlite3.OperationalError('database is locked')
+
+    with pytest.raises(sqlite3.OperationalError):
+        database.run_with_retry(always_busy, retries=2)
+    assert len(calls) == 3
+
+
+def test_decorated_write_on_the_callers_connection_is_not_retried(conn):
+    calls = []
+
+    @database.retry_on_busy
+    def write(conn=None):
+        calls.append(1)
+        raise sqlite3.OperationalError('database is locked')
+
+    with pytest.raises(sqlite3.OperationalError):
+        write(conn=conn)
+    assert len(calls) == 1
@@ -0,0 +1,66 @@
+# tests/test_document_listing.py
+import pytest
+
+from modules import database, document_listing
+
+
+def add_documents(rows):
+    """rows: (upload_date, category); returns the new ids in order."""
+    conn = database.get_db_connection()
+    ids = []
+    for upload_date, category in rows:
+        cursor = conn.execute('''
+            INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by, category)
+            VALUES ('f.txt', 'f.txt', '/tmp/f.txt', 'txt', ?, 1, ?)
+        ''', (upload_date, category))
+        ids.append(cursor.lastrowid)
+    conn.commit()
+    return ids
+
+
+def all_pages(**kwargs):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = document_listing.list_documents(cursor=cursor, **kwargs)
+        pages.append([row['id'] for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_ties_on_upload_date_are_split_by_id_across_pages(db):
+    # Five documents in the same second: the page boundary falls inside the tie
+    ids = add_documents([('2024-03-01 10:00:00', 'Invoice')] * 5)
+
+    pages = all_pages(limit=2)
+
+    assert pages == [ids[4:2:-1], ids[2:0:-1], ids[:1]]
+
+
+def test_full_last_page_has_no_next_cursor(db):
+    ids = add_documents([(f'2024-03-0{day} 10:00:00', 'Invoice') for day in range(1, 5)])
+
+    pages = all_pages(limit=2)
+
+    assert pages == [ids[:1:-1], ids[1::-1]]
+
+
+def test_categories_are_merged_newest_first(db):
+    ids = add_documents([('2024-03-01 10:00:00', 'Invoice'), ('2024-03-02 10:00:00', 'Contract'),
+                         ('2024-03-03 10:00:00', 'Resume'), ('2024-03-04 10:00:00', 'Invoice'),
+                         ('2024-03-04 10:00:00', 'Contract')])
+
+    pages = all_pages(categories=['Invoice', 'Contract'], limit=3)
+
+    assert pages == [[ids[4], ids[3], ids[1]], [ids[0]]]
+
+
+def test_month_filter_includes_its_first_and_excludes_the_next_month(db):
+    ids = add_documents([('2023-11-30 23:59:59', 'Invoice'), ('2023-12-01 00:00:00', 'Invoice'),
+                         ('2023-12-31 23:59:59', 'Invoice'), ('2024-01-01 00:00:00', 'Invoice')])
+
+    assert all_pages(month='2023-12') == [[ids[2], ids[1]]]
+
+
+def test_malformed_cursor_is_rejected(db):
+    with pytest.raises(ValueError):
+        document_listing.list_documents(cursor='not-a-cursor')
@@ -0,0 +1,63 @@
+# tests/test_index_write_lock.py
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip('faiss')
+pytest.importorskip('sentence_transformers')
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# A worker process: appends its documents one at a time, each a full load-add-replace cycle
+WRITER = """
+import sys
+import numpy as np
+from modules import semantic_search
+semantic_search.FAISS_INDEX_PATH, semantic_search.IDX_MAP_PATH = sys.argv[1], sys.argv[2]
+first, count = int(sys.argv[3]), int(sys.argv[4])
+for document_id in range(first, first + count):
+    semantic_search.add_to_index([document_id], np.full((1, 8), document_id, dtype='float32'))
+"""
+
+
+def test_two_processes_appending_keep_every_id(tmp_path):
+    index_path, id_map_path = str(tmp_path / 'faiss.index'), str(tmp_path / 'id_map.json')
+    count = 40
+    writers = [subprocess.Popen([sys.executable, '-c', WRITER, index_path, id_map_path, str(first), str(count)],
+                                cwd=ROOT)
+               for first in (1, 1001)]
+    for writer in writers:
+        assert writer.wait(timeout=120) == 0
+
+    with open(id_map_path) as f:
+        id_map = json.load(f)
+    expected = set(range(1, 1 + count)) | set(range(1001, 1001 + count))
+    assert set(id_map.values()) == expected
+    assert faiss.read_index(index_path).ntotal == len(expected)
+
+
+def test_concurrent_index_tasks_share_one_write(tmp_path, monkeypatch):
+    from modules import inference_broker, semantic_search
+    generation = {'index_path': str(tmp_path / 'faiss.index'), 'id_map_path': str(tmp_path / 'id_map.json')}
+    writes = []
+    add_to_index = semantic_search.add_to_index
+    monkeypatch.setattr(semantic_search, 'add_to_index',
+                        lambda document_ids, matrix, **kwargs: writes.append(len(document_ids)) or
+                        add_to_index(document_ids, matrix, **kwargs))
+    threads = [threading.Thread(target=inference_broker.add_to_index,
+                                args=(document_id, np.full(8, document_id, dtype='float32'), generation))
+               for document_id in range(1, 21)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    index, id_map = semantic_search.load_index(generation=generation)
+    assert sorted(id_map.values()) == list(range(1, 21))
+    assert index.ntotal == 20
+    assert sum(writes) == 20 and len(writes) < 20
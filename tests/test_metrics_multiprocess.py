@@ -0,0 +1,59 @@
+# tests/test_metrics_multiprocess.py
+import os
+import subprocess
+import sys
+
+from modules import metrics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# A worker process: one extract stage observed, exported when the process exits
+WORKER = """
+import sys
+from modules import metrics
+metrics.start_exporter(sys.argv[1], interval=60)
+stages = metrics.histogram('pipeline_stage_seconds', 'Duration of each processing stage by outcome',
+                           ['stage', 'outcome'])
+stages.labels(stage='extract', outcome='success').observe(0.2)
+metrics.gauge('worker_busy', 'Busy').set(1)
+"""
+
+
+def run_worker(directory):
+    subprocess.run([sys.executable, '-c', WORKER, str(directory)], cwd=ROOT, check=True, timeout=60)
+
+
+def test_stage_observed_in_worker_shows_up_in_scrape(tmp_path):
+    run_worker(tmp_path)
+    registry = metrics.Registry()
+    registry.histogram('pipeline_stage_seconds', 'Duration of each processing stage by outcome',
+                       ['stage', 'outcome']).labels(stage='extract', outcome='success').observe(0.1)
+
+    text = metrics.render_merged(str(tmp_path), registry)
+
+    assert 'pipeline_stage_seconds_count{stage="extract",outcome="success"} 2' in text
+    assert 'pipeline_stage_seconds_sum{stage="extract",outcome="success"} 0.30000000000000004' in text
+    # The worker has exited, so its gauge is gone
+    assert 'worker_busy' not in text
+
+
+def test_counters_sum_across_processes(tmp_path):
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c',
+                        "import sys; from modules import metrics; "
+                        "metrics.counter('jobs_total', 'Jobs', ['outcome']).labels(outcome='ok').inc(3); "
+                        "metrics.write_samples(sys.argv[1])", str(tmp_path)], cwd=ROOT, check=True, timeout=60)
+
+    text = metrics.render_merged(str(tmp_path), metrics.Registry())
+
+    assert 'jobs_total{outcome="ok"} 6.0' in text
+
+
+def test_live_process_gauges_get_a_pid_label(tmp_path):
+    registry = metrics.Registry()
+    registry.gauge('queue_depth', 'Depth').set(4)
+    metrics.write_samples(str(tmp_path), registry)
+
+    text = metrics.render_merged(str(tmp_path), registry)
+
+    assert f'queue_depth{{pid="{os.getpid()}"}} 4' in text
@@ -0,0 +1,72 @@
+# tests/test_migrations.py
+import sqlite3
+
+import pytest
+
+from modules import migrations
+
+LONG_TEXT = ' '.join(f"Clause {n} of the contract covers payment terms and delivery dates." for n in range(100))
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """A database migrated to version 6, the last one before summaries and access log actions changed."""
+    connection = sqlite3.connect(str(tmp_path / 'migrations.db'))
+    connection.row_factory = sqlite3.Row
+    migrations.migrate(connection, target=6)
+    yield connection
+    connection.close()
+
+
+def add_document(conn, summary):
+    return conn.execute('''
+        INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by, summary)
+        VALUES ('f.txt', 'f.txt', '/tmp/f.txt', 'txt', '2024-03-01 10:00:00', 1, ?)
+    ''', (summary,)).lastrowid
+
+
+def summaries(conn):
+    return {row['document_id']: row['summary'] for row in conn.execute('SELECT * FROM document_summaries')}
+
+
+def test_summaries_move_to_their_own_table(conn):
+    short = add_document(conn, 'A short summary.')
+    long = add_document(conn, LONG_TEXT)
+    empty = add_document(conn, None)
+    conn.commit()
+
+    assert migrations.migrate(conn, target=7) == [7]
+
+    moved = summaries(conn)
+    assert moved[short] == 'A short summary.'
+    assert empty not in moved
+    # DOCX uploads once stored the full text as the summary; it is re-summarized
+    assert 0 < len(moved[long]) <= migrations.SUMMARY_BACKFILL_MAX_CHARS
+    assert conn.execute('SELECT COUNT(*) FROM documents WHERE summary IS NOT NULL').fetchone()[0] == 0
+
+
+def test_access_logs_keep_every_row_and_accept_new_actions(conn):
+    conn.executemany('INSERT INTO access_logs (user_id, document_id, action, timestamp) VALUES (1, 1, ?, ?)',
+                     [('view', '2024-03-01 10:00:00'), (None, '2024-03-01 11:00:00'),
+                      ('search', '2024-03-01 12:00:00')])
+    conn.commit()
+
+    assert migrations.migrate(conn, target=8) == [7, 8]
+
+    rows = conn.execute('SELECT id, action, detail FROM access_logs ORDER BY id').fetchall()
+    assert [(row['id'], row['action'], row['detail']) for row in rows] == [
+        (1, 'view', None), (2, 'view', None), (3, 'search', None)]
+    conn.execute("INSERT INTO access_logs (user_id, document_id, action, timestamp, detail) "
+                 "VALUES (1, 1, 'process', '2024-03-02', 'pipeline')")
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO access_logs (user_id, action, timestamp) VALUES (1, 'delete', '2024-03-02')")
+    indexes = {row['name'] for row in conn.execute("PRAGMA index_list('access_logs')")}
+    assert {'idx_access_logs_user_timestamp', 'idx_access_logs_document_timestamp',
+            'idx_access_logs_timestamp'} <= indexes
+
+
+def test_migrating_again_applies_nothing(conn):
+    migrations.migrate(conn)
+
+    assert migrations.migrate(conn) == []
+    assert migrations.get_schema_version(conn) == migrations.LATEST_VERSION
@@ -0,0 +1,76 @@
+# tests/test_pipeline_state.py
+import pytest
+
+from modules import database, pipeline_state
+
+
+def add_documents(count):
+    conn = database.get_db_connection()
+    ids = [conn.execute('''
+        INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by)
+        VALUES ('f.txt', 'f.txt', '/tmp/f.txt', 'txt', '2024-03-01 10:00:00', 1)
+    ''').lastrowid for _ in range(count)]
+    conn.commit()
+    return ids
+
+
+def test_failed_attempt_is_recorded_and_counted(db):
+    doc_id, = add_documents(1)
+
+    pipeline_state.mark_started(doc_id, 'classify')
+    pipeline_state.mark_failed(doc_id, 'classify', RuntimeError('model unavailable'))
+    pipeline_state.mark_started(doc_id, 'classify')
+    pipeline_state.mark_done(doc_id, 'classify')
+
+    row = pipeline_state.stage_statuses(doc_id)['classify']
+    assert (row['status'], row['attempts'], row['error']) == ('done', 2, None)
+    assert pipeline_state.is_done(doc_id, 'classify')
+    assert not pipeline_state.is_done(doc_id, 'index')
+
+
+def test_failure_keeps_the_error_message(db):
+    doc_id, = add_documents(1)
+
+    pipeline_state.mark_started(doc_id, 'summarize')
+    pipeline_state.mark_failed(doc_id, 'summarize', RuntimeError('x' * 1000))
+
+    row = pipeline_state.stage_statuses(doc_id)['summarize']
+    assert row['status'] == 'failed'
+    assert row['error'].startswith('RuntimeError: x')
+    assert len(row['error']) == pipeline_state.ERROR_MAX_CHARS
+
+
+def test_incomplete_documents_lists_unfinished_ones_oldest_first(db):
+    done, failed, never_started, running = add_documents(4)
+    pipeline_state.mark_stages_done([done], pipeline_state.STAGE_NAMES)
+    pipeline_state.mark_failed(failed, 'index', RuntimeError('disk full'))
+    pipeline_state.mark_started(running, 'index')
+
+    assert pipeline_state.incomplete_documents() == [failed, never_started, running]
+    assert pipeline_state.incomplete_documents(limit=2) == [failed, never_started]
+    assert pipeline_state.incomplete_documents('extract') == [failed, never_started, running]
+
+
+def test_rerun_after_a_failure_resumes_at_the_failed_stage(db, monkeypatch):
+    tasks = pytest.importorskip('modules.tasks')
+    doc_id, = add_documents(1)
+    calls, failures = [], ['classify']
+
+    def work(stage):
+        def run(doc):
+            calls.append(stage)
+            if stage in failures:
+                failures.remove(stage)
+                raise RuntimeError(f'{stage} failed')
+        return run
+
+    monkeypatch.setattr(tasks, 'PIPELINE', tuple((stage, work(stage)) for stage in pipeline_state.STAGE_NAMES))
+
+    with pytest.raises(RuntimeError):
+        tasks.run_pipeline(doc_id)
+    assert tasks.run_pipeline(doc_id) == doc_id
+
+    assert calls == ['extract', 'classify', 'classify', 'summarize', 'index']
+    statuses = pipeline_state.stage_statuses(doc_id)
+    assert all(statuses[stage]['status'] == 'done' for stage in pipeline_state.STAGE_NAMES)
+    assert statuses['classify']['attempts'] == 2
@@ -0,0 +1,94 @@
+# tests/test_query_plans.py
+"""
+Every statement the data-access helpers run must be answered from an index,
+never a full table scan. The statements are captured from the helpers
+themselves (sqlite3 trace callback), so new queries are checked as soon as
+a helper runs them. Run after adding a query or a migration.
+"""
+import pytest
+
+from modules import (access_log, authz, centroid_classifier, content_store, database, document_listing,
+                     pipeline_state)
+
+# Statements that read a whole table by design (resume walks, training labels): marker -> the
+# one alias allowed to be scanned. Everything joined or correlated to it must still use an index.
+FULL_WALKS = {
+    'LEFT JOIN document_stages': 'SCAN d',
+    'LEFT JOIN document_embeddings': 'SCAN d',
+    'FROM document_corrections c WHERE': 'SCAN c',
+}
+
+
+@pytest.fixture
+def conn(db):
+    authz.invalidate_user(user_id=1, username='alice')
+    connection = database.get_db_connection()
+    yield connection
+    connection.set_trace_callback(None)
+
+
+def run_helpers():
+    cursor = document_listing.encode_cursor({'upload_date': '2024-01-01 00:00:00', 'id': 10})
+    hr = authz.filter_for_role('hr')
+
+    authz.get_user(1)
+    authz.get_user_by_username('alice')
+    authz.set_user_role(1, 'hr')
+    document_listing.list_documents(None, cursor=cursor)
+    document_listing.list_documents(['Invoice', 'Contract'], cursor=cursor, month='2024-01')
+    document_listing.facet_counts(None)
+    document_listing.facet_counts(hr)
+    document_listing.find_by_hash('ab' * 32)
+    document_listing.find_by_hash('ab' * 32, hr, 1)
+    access_log.query_logs(user_id=1, since='2024-01-01')
+    access_log.query_logs(document_id=1)
+    access_log.query_logs(before=('2024-01-01', 10))
+    content_store.get_document_text(1)
+    list(content_store.iter_document_texts([1, 2]))
+    list(content_store.iter_document_texts())
+    content_store.get_document_summary(1)
+    content_store.get_document_summaries([1, 2, 3])
+    content_store.get_embedding(1, 'v1')
+    content_store.get_embeddings([1, 2], 'v1')
+    content_store.load_embeddings('v1')
+    content_store.missing_embedding_ids('v1')
+    pipeline_state.is_done(1, 'index')
+    pipeline_state.stage_statuses(1)
+    pipeline_state.incomplete_documents('index', limit=10)
+    centroid_classifier.corrected_labels()
+
+
+def captured_statements(conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        run_helpers()
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in dict.fromkeys(statements)
+            if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE')]
+
+
+def full_scans(conn, sql):
+    """Plan lines that read a whole table without an index ("SCAN documents", not "... USING INDEX")."""
+    plan = [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()]
+    scans = [line for line in plan if line.startswith('SCAN ') and 'USING' not in line]
+    flat = ' '.join(sql.split())
+    allowed = {scan for marker, scan in FULL_WALKS.items() if marker in flat}
+    return [line for line in scans if line not in allowed]
+
+
+def test_helper_queries_use_indexes(conn):
+    statements = captured_statements(conn)
+    assert statements
+
+    failures = {' '.join(sql.split()): scans for sql in statements if (scans := full_scans(conn, sql))}
+
+    assert not failures
+
+
+def test_uploader_scoped_duplicate_lookup_is_checked(conn):
+    # The dedup lookup with a category filter is the query most likely to lose its index
+    statements = captured_statements(conn)
+
+    assert any('content_hash' in sql and 'uploaded_by' in sql for sql in statements)
@@ -0,0 +1,52 @@
+# tests/test_summarizer.py
+import numpy as np
+import pytest
+
+from modules import summarizer
+
+TEXT = (
+    "The invoice lists the amount due for consulting services. "
+    "Payment of the invoice amount is due within thirty days. "
+    "Our office cat enjoys sleeping near the window. "
+    "Late payment of the amount due adds a fee to the invoice. "
+    "The consulting services were delivered in March."
+)
+
+
+@pytest.mark.parametrize('method', summarizer.METHODS)
+def test_summary_keeps_document_order_and_drops_off_topic_sentence(method):
+    sentences = summarizer.split_sentences(TEXT)
+
+    summary = summarizer.extractive_summary(TEXT, num_sentences=3, method=method)
+
+    picked = [s for s in sentences if s in summary]
+    assert len(picked) == 3
+    assert summary == ' '.join(picked)
+    assert 'cat' not in summary
+
+
+def test_text_with_fewer_sentences_than_requested_is_returned_whole():
+    assert summarizer.extractive_summary("  One sentence. Two sentences.  ", num_sentences=3) == \
+        "One sentence. Two sentences."
+
+
+def test_stop_words_only_scores_zero():
+    scores = summarizer.rank_sentences(["The and to.", "Of a an."])
+
+    assert np.array_equal(scores, np.zeros(2))
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        summarizer.rank_sentences(["Invoice due."], method='lexrank')
+
+
+def test_textrank_ranks_only_the_candidates_on_long_input(monkeypatch):
+    monkeypatch.setattr(summarizer, 'TEXTRANK_MAX_SENTENCES', 3)
+    sentences = summarizer.split_sentences(TEXT)
+
+    scores = summarizer.rank_sentences(sentences, method='textrank')
+
+    assert len(scores) == len(sentences)
+    assert np.count_nonzero(scores) <= 3
+    assert scores[2] == 0
@@ -0,0 +1,86 @@
+# tests/test_training_export.py
+import argparse
+import glob
+import gzip
+import json
+import os
+
+import pytest
+
+from modules import content_store, database
+from scripts import create_training_data
+
+
+def add_document(category, text='Invoice 1042 for consulting services.'):
+    conn = database.get_db_connection()
+    doc_id = conn.execute('''
+        INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by, category)
+        VALUES ('f.txt', 'f.txt', '/tmp/f.txt', 'txt', '2024-03-01 10:00:00', 1, ?)
+    ''', (category,)).lastrowid
+    conn.commit()
+    content_store.save_document_text(doc_id, text)
+    return doc_id
+
+
+def run_export(output_dir, **options):
+    args = argparse.Namespace(output_dir=str(output_dir), full=False, corrected_only=False, page_size=2,
+                              shard_size=100, workers=1)
+    vars(args).update(options)
+    return create_training_data.export(args)
+
+
+def shard_records(output_dir):
+    """{shard name: [(document_id, label)]}"""
+    found = {}
+    for path in sorted(glob.glob(os.path.join(output_dir, 'part-*.jsonl.gz'))):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            found[os.path.basename(path)] = [(r['document_id'], r['label']) for r in map(json.loads, f)]
+    return found
+
+
+@pytest.fixture
+def output_dir(db, tmp_path):
+    return tmp_path / 'export'
+
+
+def test_second_run_exports_only_new_corrected_and_newly_labelled_documents(output_dir):
+    invoice, unlabelled, contract = add_document('Invoice'), add_document(None), add_document('Contract')
+    run_export(output_dir)
+
+    conn = database.get_db_connection()
+    conn.execute("UPDATE documents SET category = 'Resume' WHERE id = ?", (unlabelled,))
+    conn.execute("INSERT INTO document_corrections (document_id, old_category, corrected_category, corrected_by) "
+                 "VALUES (?, 'Invoice', 'Expense_Report', 1)", (invoice,))
+    conn.commit()
+    new = add_document('Invoice')
+    _, counters, shards, _ = run_export(output_dir)
+
+    assert shard_records(output_dir) == {
+        'part-00000.jsonl.gz': [(invoice, 'Invoice'), (contract, 'Contract')],
+        'part-00001.jsonl.gz': [(invoice, 'Expense_Report'), (unlabelled, 'Resume'), (new, 'Invoice')],
+    }
+    assert shards == ['part-00001.jsonl.gz'] and counters['corrected'] == 1
+    state = create_training_data.read_state(str(output_dir))
+    assert (state['last_document_id'], state['pending_document_ids'], state['next_shard']) == (new, [], 2)
+
+
+def test_unlabelled_documents_are_remembered_until_labelled(output_dir):
+    unlabelled = add_document(None)
+
+    _, counters, shards, _ = run_export(output_dir)
+    run_export(output_dir)
+
+    assert counters['unlabeled'] == 1 and shards == []
+    assert create_training_data.read_state(str(output_dir))['pending_document_ids'] == [unlabelled]
+
+
+def test_full_export_starts_over(output_dir):
+    first = add_document('Invoice')
+    run_export(output_dir)
+    second = add_document('Contract')
+
+    run_export(output_dir, full=True, shard_size=1)
+
+    assert shard_records(output_dir) == {'part-00000.jsonl.gz': [(first, 'Invoice')],
+                                         'part-00001.jsonl.gz': [(second, 'Contract')]}
+    assert not glob.glob(os.path.join(output_dir, '*.tmp'))
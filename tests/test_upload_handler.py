@@ -0,0 +1,129 @@
+# tests/test_upload_handler.py
+import io
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip('magic')
+pytest.importorskip('torch')
+pytest.importorskip('transformers')
+
+from werkzeug.datastructures import FileStorage
+
+from modules import authz, database, upload_handler
+
+TEXT = b"Invoice 1042 for consulting services is due within thirty days.\n" * 4
+
+
+@pytest.fixture
+def users(db, monkeypatch):
+    """{role: user id} for one user per role; queued documents are recorded instead of processed."""
+    conn = database.get_db_connection()
+    ids = {}
+    for role in ('admin', 'hr', 'finance'):
+        ids[role] = conn.execute("INSERT INTO users (username, password, role) VALUES (?, 'x', ?)",
+                                 (role, role)).lastrowid
+        authz.invalidate_user(user_id=ids[role], username=role)
+    conn.commit()
+    monkeypatch.setattr(upload_handler, 'enqueue_document', lambda doc_id, size: None)
+    return ids
+
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / 'uploads'
+    path.mkdir()
+    return str(path)
+
+
+def add_document(user_id, category, content_hash):
+    conn = database.get_db_connection()
+    doc_id = conn.execute('''
+        INSERT INTO documents (filename, original_filename, file_path, file_type, upload_date, uploaded_by, category, content_hash)
+        VALUES ('f.txt', 'f.txt', '/tmp/f.txt', 'txt', '2024-03-01 10:00:00', ?, ?, ?)
+    ''', (user_id, category, content_hash)).lastrowid
+    conn.commit()
+    return doc_id
+
+
+def zip_upload(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return FileStorage(stream=buffer, filename='batch.zip')
+
+
+def leftover_temp_files(folder):
+    return [name for name in os.listdir(folder) if name.endswith('.part')]
+
+
+def test_stream_over_the_limit_is_rejected_and_removed(tmp_path):
+    with pytest.raises(ValueError):
+        upload_handler.stream_to_temp(io.BytesIO(TEXT), str(tmp_path), max_bytes=10, chunk_size=4)
+
+    assert leftover_temp_files(tmp_path) == []
+
+
+def test_same_name_and_content_never_share_a_file(tmp_path):
+    paths = []
+    for _ in range(3):
+        temp_path, content_hash, _, _ = upload_handler.stream_to_temp(io.BytesIO(TEXT), str(tmp_path))
+        paths.append(upload_handler._store_upload(temp_path, str(tmp_path), 'invoice.txt', content_hash)[1])
+
+    assert len(set(paths)) == 3
+    assert all(os.path.exists(path) for path in paths)
+    assert leftover_temp_files(tmp_path) == []
+
+
+def test_duplicate_check_only_sees_documents_the_uploader_may_see(users):
+    content_hash = 'ab' * 32
+    add_document(users['admin'], 'Resume', content_hash)
+
+    finance = authz.filter_for_user(users['finance'])
+    hr = authz.filter_for_user(users['hr'])
+
+    assert upload_handler.find_document_by_hash(content_hash, finance, users['finance']) is None
+    assert upload_handler.find_document_by_hash(content_hash, hr, users['hr']) is not None
+
+
+def test_duplicate_is_found_for_its_own_uploader_outside_their_categories(users):
+    content_hash = 'cd' * 32
+    add_document(users['finance'], 'Resume', content_hash)
+
+    finance = authz.filter_for_user(users['finance'])
+
+    assert upload_handler.find_document_by_hash(content_hash, finance, users['finance']) is not None
+
+
+def test_archive_with_too_many_members_is_rejected(users, folder, monkeypatch):
+    monkeypatch.setattr(upload_handler, 'MAX_ARCHIVE_MEMBERS', 2)
+    upload = zip_upload([(f'{n}.txt', TEXT + bytes([65 + n])) for n in range(3)])
+
+    with pytest.raises(ValueError):
+        upload_handler.handle_archive_upload(upload, folder, users['admin'])
+
+    assert os.listdir(folder) == []
+
+
+def test_archive_stops_at_the_uncompressed_size_limit(users, folder, monkeypatch):
+    monkeypatch.setattr(upload_handler, 'MAX_ARCHIVE_UNCOMPRESSED_BYTES', len(TEXT) * 2 + 10)
+    upload = zip_upload([(f'{n}.txt', TEXT + bytes([65 + n])) for n in range(4)])
+
+    doc_ids, skipped = upload_handler.handle_archive_upload(upload, folder, users['admin'])
+
+    assert len(doc_ids) == 2
+    assert skipped == [('2.txt', 'archive size limit reached')]
+    assert leftover_temp_files(folder) == []
+
+
+def test_archive_skips_duplicate_and_unsupported_members(users, folder):
+    upload = zip_upload([('docs/a.txt', TEXT), ('b.txt', TEXT), ('c.exe', b'MZ'), ('../../d.txt', TEXT + b'd')])
+
+    doc_ids, skipped = upload_handler.handle_archive_upload(upload, folder, users['admin'])
+
+    assert len(doc_ids) == 2
+    assert [name for name, _ in skipped] == ['b.txt', 'c.exe']
+    assert sorted(os.listdir(folder)) == ['a.txt', 'd.txt']